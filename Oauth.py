@@ -1,15 +1,24 @@
-from flask import Flask, redirect, url_for, request, jsonify
+from flask import Flask, Response, g, redirect, url_for, request
 from google_auth_oauthlib.flow import Flow
-import uuid
-from db import DBSession
-from models import UserToken
 from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+from calendar_api import default_pool
+from token_refresher import TokenRefresher
+from credential_store import CredentialStore
+from calendar_watch import WatchManager
+from calendar_changes import CalendarChangeFeed
+from oauth_state import state_signer_for_client
+from db import ScopedSession, TokenWriteQueue
+from response_cache import ResponseCache, etag_matches
+from calendar_batch import NDJSON_MEDIA_TYPE, parse_batch_request, stream_batch
+from id_token_verifier import IDTokenVerifier
+from metrics import CONTENT_TYPE, HTTP_REQUEST_SECONDS, HTTP_REQUESTS_IN_FLIGHT, default_registry
 
 from datetime import datetime
+import atexit
+import functools
 import os, json
+import time
 import requests
-from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
 
 app = Flask(__name__)
@@ -20,36 +29,82 @@ SCOPES = [
     "https://www.googleapis.com/auth/userinfo.profile",
     "openid"
 ]
-state_map = {}  # To store state and session token mapping
 
 with open("credentials.json", "r") as f:
     credsjson = json.load(f)
 
 client_id = credsjson["web"]["client_id"]
 client_secret = credsjson["web"]["client_secret"]
+# Refreshed tokens are committed in batches instead of one transaction per request
+token_write_queue = TokenWriteQueue().start()
+atexit.register(token_write_queue.stop, 5)
+credential_store = CredentialStore(client_id, client_secret, write_queue=token_write_queue)
+# Notifications reach one worker; the feed carries them to every worker's caches and to the
+# agent process (see multi_user_calendar_service.start_change_listener). Polled in every process.
+change_feed = CalendarChangeFeed().start()
+atexit.register(change_feed.stop, 5)
+watch_manager = WatchManager(credential_store, change_feed=change_feed)
+# Serialized /calendar responses; dropped when a push notification reports a change
+response_cache = ResponseCache()
+watch_manager.add_listener(response_cache.invalidate)
+UPCOMING_QUERY = ("primary", 10)  # calendar, maxResults
+# Signed, expiring state: any worker can finish a login another one started
+state_signer = state_signer_for_client(client_secret)
+# Identifies users from the openid ID token, checked against Google's cached signing keys
+id_token_verifier = IDTokenVerifier(client_id)
 
 
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'  # 👈 allows http:// for localhost
 
+@app.before_request
+def start_request_metrics():
+    # Route template, not the raw path, so per-user URLs share one series
+    g.metrics_endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    g.metrics_started = time.perf_counter()
+    HTTP_REQUESTS_IN_FLIGHT.inc(endpoint=g.metrics_endpoint)
+
+def _finish_request_metrics(endpoint, method, status, started):
+    HTTP_REQUESTS_IN_FLIGHT.dec(endpoint=endpoint)
+    HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, method=method, status=status)
+
+@app.after_request
+def defer_request_metrics(response):
+    # Streamed bodies (/calendar/batch) are produced after teardown; time until the server closes the response
+    if "metrics_started" in g:
+        response.call_on_close(functools.partial(_finish_request_metrics, g.metrics_endpoint, request.method,
+                                                 response.status_code, g.pop("metrics_started")))
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exception=None):
+    # Only requests that raised before a response existed are still open here
+    if "metrics_started" in g:
+        _finish_request_metrics(g.metrics_endpoint, request.method, 500, g.pop("metrics_started"))
+
+@app.teardown_appcontext
+def remove_db_session(exception=None):
+    # Hand the request thread's session (if any) back to the pool
+    ScopedSession.remove()
+
 @app.route("/login")
 def login():
+    state = state_signer.issue()
+    # PKCE verifier derived from the state, so the callback can rebuild it on any worker
     flow = Flow.from_client_secrets_file(
         CLIENT_SECRETS_FILE,
-        scopes=SCOPES
+        scopes=SCOPES,
+        code_verifier=state_signer.code_verifier(state)
     )
     flow.redirect_uri = url_for("oauth2callback", _external=True)
 
     auth_url, state = flow.authorization_url(
         access_type="offline",
         include_granted_scopes="true",
-        prompt="consent"
+        prompt="consent",
+        state=state
     )
 
-    session_token = str(uuid.uuid4())
-    state_map[state] = session_token
-
     print("[LOGIN] Generated state:", state)
-    print("[LOGIN] Session token:", session_token)
 
     return redirect(auth_url)
 
@@ -61,13 +116,16 @@ def oauth2callback():
     print("[CALLBACK] state returned:", state)
     print("[CALLBACK] code returned:", code)
 
-    if state not in state_map:
+    valid, state_error = state_signer.verify(state)
+    if not valid:
+        print("[CALLBACK] rejected state:", state_error)
         return "Invalid or expired state. Please try logging in again.", 400
 
     flow = Flow.from_client_secrets_file(
         CLIENT_SECRETS_FILE,
         scopes=SCOPES,
-        state=state
+        state=state,
+        code_verifier=state_signer.code_verifier(state)
     )
     flow.redirect_uri = url_for("oauth2callback", _external=True)
 
@@ -82,81 +140,100 @@ def oauth2callback():
     if not creds.valid or creds.expired:
         creds.refresh(Request())
 
-    # ✅ Correct way to fetch user info
-    
-    headers = {"Authorization": f"Bearer {creds.token}"}
-    user_info_response = requests.get("https://www.googleapis.com/oauth2/v2/userinfo", headers=headers)
-    if user_info_response.status_code != 200:
-        return f"Failed to fetch user info: {user_info_response.text}", 401
+    # ✅ The openid scope returns an ID token: verify it locally instead of calling userinfo
+    if creds.id_token:
+        user_id, id_error = id_token_verifier.verify_email(creds.id_token)
+        if id_error:
+            return f"Failed to verify ID token: {id_error}", 401
+    else:
+        headers = {"Authorization": f"Bearer {creds.token}"}
+        user_info_response = requests.get("https://www.googleapis.com/oauth2/v2/userinfo", headers=headers)
+        if user_info_response.status_code != 200:
+            return f"Failed to fetch user info: {user_info_response.text}", 401
 
-    user_info = user_info_response.json()
-    user_id = user_info["email"]
+        user_info = user_info_response.json()
+        user_id = user_info["email"]
 
     # Save to DB
-    db_session = DBSession()
-    token_entry = db_session.query(UserToken).filter_by(user_id=user_id).first()
-    if not token_entry:
-        token_entry = UserToken(user_id=user_id)
-
-    token_entry.access_token = creds.token
-    token_entry.refresh_token = creds.refresh_token
-    token_entry.token_expiry = creds.expiry
-    token_entry.scopes = ",".join(creds.scopes)
-
-    db_session.add(token_entry)
-    db_session.commit()
+    credential_store.save(user_id, creds)
 
     print(f"[SUCCESS] Tokens stored for user: {user_id}")
+
+    # Get pushed calendar changes instead of polling (needs CALENDAR_WEBHOOK_URL)
+    if watch_manager.address:
+        _, watch_error = watch_manager.watch(user_id)
+        if watch_error:
+            print(f"[WATCH] {watch_error}")
     return f"OAuth completed for {user_id}. You can now use the API."
 
+def calendar_response(entry):
+    # no-cache: clients may keep the body but must revalidate with If-None-Match
+    headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("If-None-Match"), entry.etag):
+        response_cache.record_not_modified()
+        return Response(status=304, headers=headers)
+    return Response(entry.body, mimetype="application/json", headers=headers)
+
 @app.route("/calendar/<email>")
 def get_calendar_events(email):
-    db_session = DBSession()
-    token_entry = db_session.query(UserToken).filter_by(user_id=email).first()
-
-    if not token_entry:
+    # Unchanged since the last fetch: no credentials, service or API call needed
+    entry = response_cache.get(email, UPCOMING_QUERY)
+    if entry is not None:
+        return calendar_response(entry)
+    generation = response_cache.generation(email)
+
+    # Cached lookup; refreshes (under a per-user lock) only if the token has expired
+    creds, error = credential_store.get_valid(email)
+    if error:
+        return f"Failed to refresh token: {error}", 400
+
+    if not creds:
         return "No token found for this user. Please login first.", 404
 
-   
-    creds = Credentials(
-        token=token_entry.access_token,
-        refresh_token=token_entry.refresh_token,
-        token_uri="https://oauth2.googleapis.com/token",
-        client_id=client_id,
-        client_secret=client_secret,
-        scopes=token_entry.scopes.split(","),
-    )
-    print("[DEBUG] token:", creds.token)
-    print("[DEBUG] refresh_token:", creds.refresh_token)
-    print("[DEBUG] token_uri:", creds.token_uri)
-    print("[DEBUG] client_id:", creds.client_id)
-    print("[DEBUG] client_secret:", creds.client_secret)
-    # Refresh token if expired
-    if not creds.valid or creds.expired:
-        try:
-            creds.refresh(Request())
-            token_entry.access_token = creds.token
-            token_entry.token_expiry = creds.expiry
-            db_session.commit()
-            print(f"[INFO] Token refreshed for {email}")
-        except Exception as e:
-            return f"Failed to refresh token: {e}", 400
-
     try:
-        service = build("calendar", "v3", credentials=creds)
         now = datetime.utcnow().isoformat() + "Z"
-        events_result = service.events().list(
-            calendarId="primary",
-            timeMin=now,
-            maxResults=10,
-            singleEvents=True,
-            orderBy="startTime",
-        ).execute()
+        calendar_id, max_results = UPCOMING_QUERY
+        with default_pool.service(email, creds) as service:
+            events_result = service.events().list(
+                calendarId=calendar_id,
+                timeMin=now,
+                maxResults=max_results,
+                singleEvents=True,
+                orderBy="startTime",
+            ).execute()
 
         events = events_result.get("items", [])
-        return jsonify(events)
+        return calendar_response(response_cache.put(email, UPCOMING_QUERY, events, generation))
     except Exception as e:
         return f"Failed to fetch calendar events: {e}", 500
 
+@app.route("/calendar/batch", methods=["POST"])
+def get_calendar_events_batch():
+    # {"emails": [...], "time_min": ..., "time_max": ...} -> one NDJSON line per user as each completes
+    batch, error = parse_batch_request(request.get_json(silent=True))
+    if error:
+        return error, 400
+
+    try:
+        lines = stream_batch(credential_store, batch["emails"], batch["start"], batch["end"], batch["max_results"])
+    except Exception as e:
+        return f"Failed to load tokens: {e}", 500
+    return Response(lines, mimetype=NDJSON_MEDIA_TYPE)
+
+@app.route("/metrics")
+def metrics():
+    # Prometheus scrape target; same metric names as MultiUserCalendarService
+    return Response(default_registry.render(), content_type=CONTENT_TYPE)
+
+@app.route("/notifications", methods=["POST"])
+def calendar_notification():
+    # Push notification from a watch channel; everything is in the X-Goog-* headers
+    status, message = watch_manager.handle_notification(request.headers)
+    return message, status
+
 if __name__ == "__main__":
+    # Keep stored tokens fresh in the background (only in the reloader's serving process)
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        TokenRefresher(client_id, client_secret, write_queue=token_write_queue).start()
+        watch_manager.start()
     app.run(port=5000, debug=True)
@@ -0,0 +1,216 @@
+"""
+Asyncio Google Calendar client for ScheduleAI.
+Lets async callers (the ADK runner, ASGI handlers) read calendars without
+blocking the event loop, over a pooled httpx connection set. httpx pools
+belong to the loop that opened them, so each running event loop gets its
+own; callers may use asyncio.run() as often as they like.
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+from urllib.parse import quote
+import httpx
+from google.auth.transport.requests import Request
+from compact_event import COMPACT_EVENT_FIELDS, parse_events
+from calendar_api import PAGE_SIZE, api_method_name, default_transfer_stats, event_list_fields
+from metrics import CALENDAR_REQUEST_SECONDS, CALENDAR_REQUESTS_IN_FLIGHT, TOKEN_REFRESH_SECONDS, record_error, timed
+from request_scheduler import RETRY_STATUSES, default_scheduler, is_rate_limited
+
+DEFAULT_API_ENDPOINT = "https://www.googleapis.com/calendar/v3/"
+MAX_CONNECTIONS = int(os.environ.get("CALENDAR_ASYNC_MAX_CONNECTIONS", "100"))
+HTTP_TIMEOUT_SECONDS = 30
+# Google only gzips responses for clients whose User-Agent contains "gzip"
+USER_AGENT = "ScheduleAI-calendar (gzip)"
+
+
+class AsyncCalendarClient:
+    """Non-blocking Calendar events client sharing one httpx connection pool."""
+
+    def __init__(self, api_endpoint=None, max_connections=MAX_CONNECTIONS, timeout=HTTP_TIMEOUT_SECONDS,
+                 scheduler=None, transport=None):
+        """
+        Initialize the client. An httpx client is created on first use in each event loop.
+
+        Args:
+            api_endpoint (str, optional): API base URL. Defaults to CALENDAR_API_ENDPOINT or Google.
+            max_connections (int, optional): Connection pool size
+            timeout (float, optional): Per-request timeout in seconds
+            scheduler (RequestScheduler, optional): Paces and retries requests. Defaults
+                to the shared scheduler.
+            transport (httpx.AsyncBaseTransport, optional): Transport for the httpx
+                clients, e.g. httpx.MockTransport in tests
+        """
+        self.api_endpoint = api_endpoint or os.environ.get("CALENDAR_API_ENDPOINT") or DEFAULT_API_ENDPOINT
+        if not self.api_endpoint.endswith('/'):
+            self.api_endpoint += '/'
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.scheduler = scheduler or default_scheduler
+        self.transport = transport
+        self._clients = weakref.WeakKeyDictionary()  # event loop -> httpx.AsyncClient
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.get(loop)
+            if client is not None and not client.is_closed:
+                return client
+            # Connections of loops that have since closed died with them; drop their clients
+            for closed in [other for other in self._clients if other.is_closed()]:
+                del self._clients[closed]
+            client = self._clients[loop] = httpx.AsyncClient(
+                base_url=self.api_endpoint,
+                timeout=self.timeout,
+                transport=self.transport,
+                headers={'User-Agent': USER_AGENT, 'Accept-Encoding': 'gzip'},
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return client
+
+    async def _ensure_valid(self, creds, force=False):
+        """Refresh credentials off the event loop when expired (or when forced)."""
+        if (force or not creds.valid) and creds.refresh_token:
+            with timed(TOKEN_REFRESH_SECONDS, 'token_refresh', source='inline'):
+                await asyncio.to_thread(creds.refresh, Request())
+
+    async def _get(self, key, path, params, creds):
+        """GET through the request scheduler, backing off on rate limits and server errors."""
+        api_method = api_method_name(path)
+        with CALENDAR_REQUESTS_IN_FLIGHT.track_inprogress(), \
+                timed(CALENDAR_REQUEST_SECONDS, api_method, method=api_method):
+            response = await self._get_paced(key, path, params, creds)
+        if response.status_code >= 400:
+            record_error(api_method, f"http_{response.status_code}")
+        return response
+
+    async def _get_paced(self, key, path, params, creds):
+        attempt = 0
+        while True:
+            await self.scheduler.acquire_async(key)
+            response = await self._get_client().get(
+                path, params=params, headers={'Authorization': f"Bearer {creds.token}"})
+            default_transfer_stats.record(
+                'fields' in params,
+                response.headers.get('content-encoding', 'identity'),
+                response.num_bytes_downloaded,
+                len(response.content),
+            )
+            status = response.status_code
+            if status not in RETRY_STATUSES and not is_rate_limited(status, response.content):
+                return response
+            if attempt >= self.scheduler.max_retries:
+                if status in (403, 429):
+                    self.scheduler.record_rate_limited()
+                return response
+
+            delay = self.scheduler.backoff_delay(attempt, response.headers.get('retry-after'))
+            self.scheduler.record_backoff(delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def list_events(self, creds, start_date, end_date, calendar_id='primary', user_id=None,
+                          fields=COMPACT_EVENT_FIELDS):
+        """
+        List single events in a window, ordered by start time, following every page.
+
+        Args:
+            creds (Credentials): Google credentials for the calendar owner
+            start_date (datetime): Start of the window (naive UTC)
+            end_date (datetime): End of the window (naive UTC)
+            calendar_id (str, optional): Calendar to read. Defaults to 'primary'.
+            user_id (str, optional): Calendar owner, for per-user request quotas
+            fields (iterable, optional): Event fields to download. Defaults to what
+                CompactEvent reads; None downloads full resources.
+
+        Returns:
+            tuple: (list of CompactEvent, error_message)
+        """
+        params = {
+            'timeMin': start_date.isoformat() + 'Z',
+            'timeMax': end_date.isoformat() + 'Z',
+            'singleEvents': 'true',
+            'orderBy': 'startTime',
+            'maxResults': str(PAGE_SIZE),
+        }
+        if fields:
+            params['fields'] = event_list_fields(fields)
+
+        items, error = await self._list(creds, calendar_id, params, user_id)
+        if error:
+            return None, error
+        return parse_events(items), None
+
+    async def list_upcoming_events(self, creds, time_min, max_results=10, calendar_id='primary', user_id=None,
+                                   time_max=None):
+        """
+        List the next single events from a point in time, as full event resources.
+
+        Args:
+            creds (Credentials): Google credentials for the calendar owner
+            time_min (datetime): Earliest end time (naive UTC)
+            max_results (int, optional): Number of events. Defaults to 10.
+            calendar_id (str, optional): Calendar to read. Defaults to 'primary'.
+            user_id (str, optional): Calendar owner, for per-user request quotas
+            time_max (datetime, optional): Latest start time (naive UTC)
+
+        Returns:
+            tuple: (list of event dicts, error_message)
+        """
+        params = {
+            'timeMin': time_min.isoformat() + 'Z',
+            'maxResults': str(max_results),
+            'singleEvents': 'true',
+            'orderBy': 'startTime',
+        }
+        if time_max is not None:
+            params['timeMax'] = time_max.isoformat() + 'Z'
+        # Only the first max_results are wanted, so stop after one page
+        return await self._list(creds, calendar_id, params, user_id, all_pages=False)
+
+    async def _list(self, creds, calendar_id, params, user_id, all_pages=True):
+        """Run events().list, following nextPageToken unless all_pages is False, and return (items, error_message)."""
+        path = f"calendars/{quote(calendar_id, safe='')}/events"
+        items = []
+
+        try:
+            key = user_id or ''
+            await self._ensure_valid(creds)
+            while True:
+                response = await self._get(key, path, params, creds)
+
+                # Token revoked or expired early: refresh once and retry the page
+                if response.status_code == 401 and creds.refresh_token:
+                    await self._ensure_valid(creds, force=True)
+                    response = await self._get(key, path, params, creds)
+
+                if response.status_code != 200:
+                    return None, f"Google Calendar API error: <HttpError {response.status_code}: {response.text}>"
+
+                result = response.json()
+                items.extend(result.get('items', []))
+                page_token = result.get('nextPageToken')
+                if not all_pages or not page_token:
+                    return items, None
+                params = {**params, 'pageToken': page_token}
+
+        except httpx.HTTPError as e:
+            return None, f"Calendar request failed: {str(e)}"
+        except Exception as e:
+            return None, f"Unexpected error: {str(e)}"
+
+    async def aclose(self):
+        """Close the running event loop's pooled connections."""
+        with self._lock:
+            client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+# Shared client used by the async calendar tools
+default_async_client = AsyncCalendarClient()
@@ -0,0 +1,240 @@
+"""
+Asyncio credential store for ScheduleAI.
+
+Same UserToken rows and caching as CredentialStore, but reads and writes go
+through an async SQLAlchemy session and token refreshes through a pooled
+httpx client, so ASGI handlers never block the event loop.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+import httpx
+from google.oauth2.credentials import Credentials
+from sqlalchemy import select
+from credential_store import TOKEN_URI, apply_credentials, credentials_from_row
+from db import create_async_session_factory
+from metrics import DB_QUERY_SECONDS, TOKEN_REFRESH_SECONDS, timed
+from models import UserToken
+
+
+class AsyncCredentialStore:
+    """Non-blocking UserToken-backed credential store with per-user refresh locks."""
+
+    def __init__(self, client_id, client_secret, session_factory=None, token_uri=TOKEN_URI, http_client=None):
+        """
+        Initialize the store.
+
+        Args:
+            client_id (str): OAuth client id used to refresh stored tokens
+            client_secret (str): OAuth client secret
+            session_factory (async_sessionmaker, optional): Async session factory.
+                Defaults to db.create_async_session_factory().
+            token_uri (str, optional): OAuth token endpoint
+            http_client (httpx.AsyncClient, optional): Pooled client for refreshes.
+                Defaults to a client owned by the store.
+        """
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.session_factory = session_factory or create_async_session_factory()
+        self.token_uri = token_uri
+        self._owns_client = http_client is None
+        self.http_client = http_client or httpx.AsyncClient(timeout=30)
+        self._cache = {}  # user_id -> Credentials
+        self._locks = {}  # user_id -> asyncio.Lock
+
+    def refresh_lock(self, user_id):
+        """
+        Get the lock that serializes refreshes and writes for a user.
+
+        Args:
+            user_id (str): Unique user identifier
+
+        Returns:
+            asyncio.Lock: Per-user lock
+        """
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks[user_id] = asyncio.Lock()
+        return lock
+
+    async def _load(self, user_id):
+        """Read a user's credentials from the database, bypassing the cache."""
+        async with self.session_factory() as session:
+            with timed(DB_QUERY_SECONDS, 'token_load', operation='token_load'):
+                row = await session.get(UserToken, user_id)
+            if row is None:
+                return None
+            return credentials_from_row(row, self.client_id, self.client_secret, self.token_uri)
+
+    async def get(self, user_id):
+        """
+        Get a user's credentials, from memory when cached.
+
+        Args:
+            user_id (str): Unique user identifier
+
+        Returns:
+            Credentials or None: Stored credentials (possibly expired)
+        """
+        creds = self._cache.get(user_id)
+        if creds is not None:
+            return creds
+
+        creds = await self._load(user_id)
+        if creds is not None:
+            self._cache[user_id] = creds
+        return creds
+
+    async def get_many(self, user_ids):
+        """
+        Get several users' credentials, loading every uncached one in a single query.
+
+        Args:
+            user_ids (iterable): Unique user identifiers
+
+        Returns:
+            dict: user_id -> Credentials (possibly expired) for users that have them
+        """
+        found = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            creds = self._cache.get(user_id)
+            if creds is not None:
+                found[user_id] = creds
+            else:
+                missing.append(user_id)
+
+        if missing:
+            async with self.session_factory() as session:
+                with timed(DB_QUERY_SECONDS, 'token_load_many', operation='token_load_many'):
+                    rows = (await session.scalars(select(UserToken).where(UserToken.user_id.in_(missing)))).all()
+                for row in rows:
+                    creds = credentials_from_row(row, self.client_id, self.client_secret, self.token_uri)
+                    self._cache[row.user_id] = found[row.user_id] = creds
+        return found
+
+    async def get_valid(self, user_id):
+        """
+        Get a user's credentials, refreshing them under the user's lock if expired.
+
+        Args:
+            user_id (str): Unique user identifier
+
+        Returns:
+            tuple: (credentials, error_message); (None, None) if the user has no credentials
+        """
+        creds = await self.get(user_id)
+        if creds is None or creds.valid:
+            return creds, None
+
+        async with self.refresh_lock(user_id):
+            # Another task may have refreshed while we waited
+            creds = self._cache.get(user_id) or creds
+            if creds.valid:
+                return creds, None
+
+            # The background refresher (or another worker) may already have stored a fresh token
+            reloaded = await self._load(user_id)
+            if reloaded is not None and reloaded.valid:
+                self._cache[user_id] = reloaded
+                return reloaded, None
+
+            if not creds.refresh_token:
+                return None, f"Stored credentials for user {user_id} expired and cannot be refreshed"
+
+            try:
+                creds = await self.refresh(creds)
+            except Exception as e:
+                return None, f"Failed to refresh credentials for user {user_id}: {str(e)}"
+
+            await self._write(user_id, creds)
+            return creds, None
+
+    async def refresh(self, creds):
+        """
+        Exchange a refresh token for a new access token.
+
+        Args:
+            creds (Credentials): Credentials with a refresh token
+
+        Returns:
+            Credentials: New credentials
+
+        Raises:
+            httpx.HTTPError: When the token endpoint cannot be reached
+            ValueError: When the token endpoint rejects the refresh
+        """
+        with timed(TOKEN_REFRESH_SECONDS, 'token_refresh', source='inline'):
+            response = await self.http_client.post(self.token_uri, data={
+                "grant_type": "refresh_token",
+                "refresh_token": creds.refresh_token,
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+            })
+            if response.status_code != 200:
+                raise ValueError(f"token endpoint returned {response.status_code}: {response.text}")
+        return self.credentials_from_token_response(response.json(), creds.refresh_token, creds.scopes)
+
+    def credentials_from_token_response(self, token, refresh_token=None, scopes=None):
+        """
+        Build Credentials from a token endpoint response.
+
+        Args:
+            token (dict): Token endpoint JSON
+            refresh_token (str, optional): Refresh token to keep if the response has none
+            scopes (list, optional): Scopes to keep if the response has none
+
+        Returns:
+            Credentials: New credentials
+        """
+        expiry = None
+        if token.get("expires_in"):
+            expiry = datetime.utcnow() + timedelta(seconds=int(token["expires_in"]))
+        return Credentials(
+            token=token["access_token"],
+            # Google may rotate the refresh token
+            refresh_token=token.get("refresh_token") or refresh_token,
+            id_token=token.get("id_token"),
+            token_uri=self.token_uri,
+            client_id=self.client_id,
+            client_secret=self.client_secret,
+            scopes=token["scope"].split() if token.get("scope") else scopes,
+            expiry=expiry,
+        )
+
+    async def save(self, user_id, creds):
+        """
+        Store credentials for a user.
+
+        Args:
+            user_id (str): Unique user identifier
+            creds (Credentials): Credentials to store
+        """
+        async with self.refresh_lock(user_id):
+            await self._write(user_id, creds)
+
+    async def _write(self, user_id, creds):
+        async with self.session_factory() as session:
+            with timed(DB_QUERY_SECONDS, 'token_write', operation='token_write'):
+                row = await session.get(UserToken, user_id) or UserToken(user_id=user_id)
+                apply_credentials(row, creds)
+                session.add(row)
+                await session.commit()
+        self._cache[user_id] = creds
+
+    def invalidate(self, user_id=None):
+        """
+        Drop cached credentials so the next lookup re-reads the database.
+
+        Args:
+            user_id (str, optional): User to drop. Defaults to everyone.
+        """
+        if user_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(user_id, None)
+
+    async def aclose(self):
+        """Close the refresh client if the store created it."""
+        if self._owns_client:
+            await self.http_client.aclose()
@@ -0,0 +1,562 @@
+"""
+Google Calendar API client helpers shared by the ScheduleAI calendar services.
+
+Service objects are built from a discovery document that is loaded and parsed
+once per process, and pooled per credential so their keep-alive HTTP
+connections are reused across requests.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import contextvars
+from datetime import timedelta, timezone
+import json
+import os
+import queue
+import threading
+import time
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+import httplib2
+from compact_event import COMPACT_EVENT_FIELDS, parse_events
+from metrics import CALENDAR_BUILD_SECONDS, CALENDAR_REQUEST_SECONDS, CALENDAR_REQUESTS_IN_FLIGHT, record_error, timed
+from request_scheduler import ScheduledHttp, default_scheduler
+
+# Override the API base URL, e.g. "http://127.0.0.1:8089/calendar/v3/" for a local fake server
+CALENDAR_API_ENDPOINT = os.environ.get("CALENDAR_API_ENDPOINT")
+HTTP_TIMEOUT_SECONDS = 30
+POOL_IDLE_TIMEOUT_SECONDS = float(os.environ.get("CALENDAR_POOL_IDLE_TIMEOUT", "300"))
+PAGE_SIZE = 250  # events().list maxResults per page
+# All-day events are parsed as UTC midnight; their end in the calendar's own zone is at most this far off
+ALL_DAY_MARGIN_SECONDS = 14 * 3600
+WINDOW_CHUNK_DAYS = 30  # sub-window length for long-range streaming reads
+
+_discovery_document = None
+_discovery_lock = threading.Lock()
+
+
+def get_discovery_document():
+    """
+    Get the Calendar v3 discovery document, parsed once per process.
+
+    Returns:
+        dict: Parsed discovery document
+    """
+    global _discovery_document
+    if _discovery_document is None:
+        with _discovery_lock:
+            if _discovery_document is None:
+                _discovery_document = json.loads(get_static_doc('calendar', 'v3'))
+    return _discovery_document
+
+
+def event_list_fields(event_fields):
+    """
+    Build a partial-response mask for events().list.
+
+    Args:
+        event_fields (iterable): Event resource fields the caller reads
+
+    Returns:
+        str: e.g. "nextPageToken,nextSyncToken,items(id,start,summary)"
+    """
+    return f"nextPageToken,nextSyncToken,items({','.join(event_fields)})"
+
+
+class TransferStats:
+    """Payload byte counters per kind of request (field mask, content encoding)."""
+
+    def __init__(self):
+        self._counters = {}  # (masked, encoding) -> [requests, wire_bytes, body_bytes]
+        self._lock = threading.Lock()
+
+    def record(self, masked, encoding, wire_bytes, body_bytes):
+        """
+        Record one response.
+
+        Args:
+            masked (bool): Request carried a fields= mask
+            encoding (str): Content encoding on the wire, e.g. 'gzip' or 'identity'
+            wire_bytes (int): Body bytes received on the wire
+            body_bytes (int): Body bytes after decompression
+        """
+        with self._lock:
+            counter = self._counters.setdefault((masked, encoding), [0, 0, 0])
+            counter[0] += 1
+            counter[1] += wire_bytes
+            counter[2] += body_bytes
+
+    def stats(self):
+        """
+        Get byte counters.
+
+        Returns:
+            dict: "<full|masked>/<encoding>" -> requests, wire and body bytes in total
+                and per request
+        """
+        with self._lock:
+            result = {}
+            for (masked, encoding), (requests, wire, body) in sorted(self._counters.items()):
+                result[f"{'masked' if masked else 'full'}/{encoding}"] = {
+                    "requests": requests,
+                    "wire_bytes": wire,
+                    "body_bytes": body,
+                    "wire_bytes_per_request": wire / requests,
+                    "body_bytes_per_request": body / requests,
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+# Shared byte counters for all Calendar responses in the process
+default_transfer_stats = TransferStats()
+
+_wire = threading.local()
+
+
+class _CountingResponseMixin:
+    """Counts raw (still compressed) response bytes read on the current thread."""
+
+    def getresponse(self):
+        response = super().getresponse()
+        read = response.read
+
+        def counting_read(*args, **kwargs):
+            data = read(*args, **kwargs)
+            _wire.bytes = getattr(_wire, 'bytes', 0) + len(data)
+            return data
+
+        response.read = counting_read
+        return response
+
+
+class _CountingHTTPConnection(_CountingResponseMixin, httplib2.HTTPConnectionWithTimeout):
+    pass
+
+
+class _CountingHTTPSConnection(_CountingResponseMixin, httplib2.HTTPSConnectionWithTimeout):
+    pass
+
+
+_COUNTING_CONNECTIONS = {"http": _CountingHTTPConnection, "https": _CountingHTTPSConnection}
+
+
+def api_method_name(uri, method="GET"):
+    """
+    Name the Calendar API method a request URL calls, for metric labels.
+
+    Args:
+        uri (str): Request URL (query string allowed)
+        method (str, optional): HTTP method
+
+    Returns:
+        str: e.g. 'events.list', 'calendars.get', 'batch' or 'other'
+    """
+    path = '/' + uri.split('?', 1)[0].strip('/')
+    if path.endswith('/batch') or '/batch/' in path:
+        return 'batch'
+    if path.endswith('/freeBusy'):
+        return 'freebusy.query'
+    if path.endswith('/channels/stop'):
+        return 'channels.stop'
+    if path.endswith('/events/watch'):
+        return 'events.watch'
+    if path.endswith('/events'):
+        return 'events.list' if method == 'GET' else 'events.insert'
+    if '/events/' in path:
+        return 'events.get' if method == 'GET' else 'events.update'
+    if '/calendars/' in path and method == 'GET':
+        return 'calendars.get'
+    return 'other'
+
+
+class InstrumentedHttp(ScheduledHttp):
+    """
+    Scheduled transport that records wire and decoded payload bytes per response,
+    and request latency, in-flight requests and errors by API method.
+    """
+
+    def __init__(self, scheduler, key, transfer_stats=None, paced=True, **kwargs):
+        super().__init__(scheduler, key, paced=paced, **kwargs)
+        self.transfer_stats = transfer_stats or default_transfer_stats
+
+    def request(self, uri, method="GET", body=None, headers=None, *args, **kwargs):
+        if not kwargs.get('connection_type') and len(args) < 2:
+            kwargs['connection_type'] = _COUNTING_CONNECTIONS.get(uri.split(':', 1)[0].lower())
+        _wire.bytes = 0
+        api_method = api_method_name(uri, method)
+        with CALENDAR_REQUESTS_IN_FLIGHT.track_inprogress(), \
+                timed(CALENDAR_REQUEST_SECONDS, api_method, method=api_method):
+            response, content = super().request(uri, method, body, headers, *args, **kwargs)
+        if response.status >= 400:
+            record_error(api_method, f"http_{response.status}")
+        self.transfer_stats.record(
+            'fields=' in uri,
+            response.get('-content-encoding', response.get('content-encoding', 'identity')),
+            _wire.bytes,
+            len(content or b''),
+        )
+        return response, content
+
+
+def new_http(creds=None, key=None, scheduler=None, paced=True):
+    """
+    Create an HTTP transport, authorized with creds when given. Requests are
+    paced and retried by the request scheduler, and payload bytes are recorded
+    in default_transfer_stats. Responses are gzip-compressed: httplib2 sends
+    Accept-Encoding and the API client adds "(gzip)" to the User-Agent, which
+    Google requires before it compresses.
+
+    Args:
+        creds (Credentials, optional): Google credentials
+        key (str, optional): User the requests are made for, for per-user quotas
+        scheduler (RequestScheduler, optional): Defaults to the shared scheduler
+        paced (bool, optional): Take a scheduler token per request; False for batch
+            transports whose parts are charged by the caller. Defaults to True.
+
+    Returns:
+        httplib2.Http or AuthorizedHttp: Transport
+    """
+    http = InstrumentedHttp(scheduler or default_scheduler, key or '', paced=paced, timeout=HTTP_TIMEOUT_SECONDS)
+    return AuthorizedHttp(creds, http=http) if creds is not None else http
+
+
+def build_calendar_service(creds, http=None):
+    """
+    Build a Calendar v3 service object for a set of credentials.
+
+    Args:
+        creds (Credentials): Authorized Google credentials, or None when http is given
+        http (httplib2.Http, optional): Transport to use instead of authorizing with creds,
+            e.g. an unauthenticated one for batches whose requests carry their own auth
+
+    Returns:
+        Resource: Calendar API service object
+    """
+    client_options = {"api_endpoint": CALENDAR_API_ENDPOINT} if CALENDAR_API_ENDPOINT else None
+    with timed(CALENDAR_BUILD_SECONDS, 'build'):
+        return build_from_document(
+            get_discovery_document(),
+            http=http if http is not None else new_http(creds),
+            client_options=client_options,
+        )
+
+
+class _PooledService:
+    """A service object and its transport, checked out by one caller at a time."""
+
+    def __init__(self, service, http):
+        self.service = service
+        self.http = http
+        self.last_used = time.monotonic()
+        self.uses = 0
+
+
+class CalendarServicePool:
+    """Per-credential pool of Calendar service objects with idle eviction."""
+
+    def __init__(self, idle_timeout=POOL_IDLE_TIMEOUT_SECONDS, max_idle_per_key=4, scheduler=None):
+        """
+        Initialize the pool.
+
+        Args:
+            idle_timeout (float): Seconds an unused service is kept before eviction
+            max_idle_per_key (int): Idle services kept per credential key
+            scheduler (RequestScheduler, optional): Paces the pool's requests. Defaults
+                to the shared scheduler.
+        """
+        self.idle_timeout = idle_timeout
+        self.max_idle_per_key = max_idle_per_key
+        self.scheduler = scheduler or default_scheduler
+        self._idle = {}  # key -> [_PooledService, ...]
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.reuses = 0
+        self.evictions = 0
+        self.build_seconds = 0.0
+        self.cold_request_seconds = 0.0  # first request on a new transport (connect + TLS)
+        self.warm_request_seconds = 0.0  # requests on a kept-alive transport
+
+    @contextmanager
+    def service(self, key, creds):
+        """
+        Check out a service object for a credential, building one if none is idle.
+
+        The service is returned to the pool when the block exits, so it must not be
+        shared with other threads while checked out.
+
+        Args:
+            key (str): Credential identity, e.g. the user id
+            creds (Credentials or None): Current credentials for the key; None gives an
+                unauthenticated, unpaced transport for batch requests, whose parts the
+                caller charges with scheduler.acquire()
+
+        Yields:
+            Resource: Calendar API service object
+        """
+        entry = self._checkout(key)
+        if entry is None:
+            started = time.perf_counter()
+            http = new_http(creds, key, self.scheduler, paced=creds is not None)
+            entry = _PooledService(build_calendar_service(creds, http=http), http)
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.builds += 1
+                self.build_seconds += elapsed
+        elif creds is not None:
+            # Credentials may have been refreshed or reloaded since the last checkout
+            entry.http.credentials = creds
+
+        started = time.perf_counter()
+        try:
+            yield entry.service
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                if entry.uses == 0:
+                    self.cold_request_seconds += elapsed
+                else:
+                    self.warm_request_seconds += elapsed
+            entry.uses += 1
+            self._checkin(key, entry)
+
+    def _checkout(self, key):
+        with self._lock:
+            self._evict_idle_locked()
+            idle = self._idle.get(key)
+            if not idle:
+                return None
+            self.reuses += 1
+            return idle.pop()
+
+    def _checkin(self, key, entry):
+        entry.last_used = time.monotonic()
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_key:
+                idle.append(entry)
+            else:
+                self.evictions += 1
+
+    def _evict_idle_locked(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        for key in list(self._idle):
+            fresh = [entry for entry in self._idle[key] if entry.last_used > cutoff]
+            self.evictions += len(self._idle[key]) - len(fresh)
+            if fresh:
+                self._idle[key] = fresh
+            else:
+                del self._idle[key]
+
+    def discard(self, key):
+        """
+        Drop pooled services for a credential, e.g. after access is revoked.
+
+        Args:
+            key (str): Credential identity
+        """
+        with self._lock:
+            self.evictions += len(self._idle.pop(key, []))
+
+    def stats(self):
+        """
+        Get pool counters and the estimated time saved per request.
+
+        The saving per reused checkout is the mean build time plus the extra time
+        the first request on a new transport takes (connection and TLS setup).
+
+        Returns:
+            dict: builds, reuses, evictions, idle count and timing estimates in seconds
+        """
+        with self._lock:
+            checkouts = self.builds + self.reuses
+            mean_build = self.build_seconds / self.builds if self.builds else 0.0
+            mean_cold = self.cold_request_seconds / self.builds if self.builds else 0.0
+            mean_warm = self.warm_request_seconds / self.reuses if self.reuses else 0.0
+            saved_per_reuse = mean_build + max(0.0, mean_cold - mean_warm) if self.reuses else 0.0
+            return {
+                "builds": self.builds,
+                "reuses": self.reuses,
+                "evictions": self.evictions,
+                "idle": sum(len(idle) for idle in self._idle.values()),
+                "mean_build_seconds": mean_build,
+                "mean_cold_request_seconds": mean_cold,
+                "mean_warm_request_seconds": mean_warm,
+                "saved_seconds_total": saved_per_reuse * self.reuses,
+                "saved_seconds_per_request": saved_per_reuse * self.reuses / checkouts if checkouts else 0.0,
+            }
+
+
+# Shared pool used by the calendar services and the OAuth web service
+default_pool = CalendarServicePool()
+
+
+class CalendarAccessError(Exception):
+    """Raised by streaming reads when a calendar cannot be accessed."""
+
+
+def iter_event_pages(service, start_date, end_date, calendar_id='primary', page_size=PAGE_SIZE,
+                     fields=COMPACT_EVENT_FIELDS):
+    """
+    List single events in a window page by page, following nextPageToken.
+
+    Args:
+        service (Resource): Calendar API service object
+        start_date (datetime): Start of the window (naive UTC)
+        end_date (datetime): End of the window (naive UTC)
+        calendar_id (str, optional): Calendar to read. Defaults to 'primary'.
+        page_size (int, optional): maxResults per page
+        fields (iterable, optional): Event fields to download. Defaults to what
+            CompactEvent reads; None downloads full resources.
+
+    Yields:
+        list: CompactEvent objects of one page, in start-time order
+    """
+    page_token = None
+    while True:
+        result = service.events().list(
+            calendarId=calendar_id,
+            timeMin=start_date.isoformat() + 'Z',
+            timeMax=end_date.isoformat() + 'Z',
+            singleEvents=True,
+            orderBy='startTime',
+            maxResults=page_size,
+            pageToken=page_token,
+            fields=event_list_fields(fields) if fields else None,
+        ).execute()
+        yield parse_events(result.get('items', []))
+
+        page_token = result.get('nextPageToken')
+        if not page_token:
+            return
+
+
+def split_window(start_date, end_date, chunk):
+    """
+    Split [start_date, end_date) into consecutive sub-windows of at most `chunk`.
+
+    Args:
+        start_date (datetime): Window start
+        end_date (datetime): Window end
+        chunk (timedelta): Maximum sub-window length
+
+    Returns:
+        list: (start, end) tuples
+    """
+    windows = []
+    cursor = start_date
+    while cursor < end_date:
+        windows.append((cursor, min(cursor + chunk, end_date)))
+        cursor += chunk
+    return windows
+
+
+def _produce_pages(pool, key, creds, window, calendar_id, fields, pages, cancelled):
+    """Fetch one sub-window's pages into a bounded queue, ending with a sentinel."""
+
+    def put(item):
+        # Give up if the consumer has gone away instead of blocking on a full queue
+        while not cancelled.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    try:
+        with pool.service(key, creds) as service:
+            for page in iter_event_pages(service, window[0], window[1], calendar_id, fields=fields):
+                if not put(page):
+                    return
+        put(_END_OF_WINDOW)
+    except Exception as e:
+        put(e)
+
+
+_END_OF_WINDOW = object()
+
+
+def iter_events(pool, key, creds, start_date, end_date, calendar_id='primary',
+                chunk=timedelta(days=WINDOW_CHUNK_DAYS), max_workers=4, prefetch_pages=2,
+                fields=COMPACT_EVENT_FIELDS):
+    """
+    Stream a window's events in start-time order with bounded memory.
+
+    Long windows are split into sub-windows fetched concurrently (each on its own
+    pooled service). An event still running at a sub-window's end is listed by the
+    next one too and is dropped there by id, so the k-way merge of the sorted
+    streams reduces to draining them in order while up to max_workers later
+    sub-windows prefetch at most prefetch_pages pages each.
+
+    Args:
+        pool (CalendarServicePool): Pool to check services out of
+        key (str): Credential identity for the pool
+        creds (Credentials): Credentials for the calendar owner
+        start_date (datetime): Start of the window (naive UTC)
+        end_date (datetime): End of the window (naive UTC)
+        calendar_id (str, optional): Calendar to read. Defaults to 'primary'.
+        chunk (timedelta, optional): Sub-window length. Defaults to 30 days.
+        max_workers (int, optional): Sub-windows fetched concurrently
+        prefetch_pages (int, optional): Pages buffered per sub-window
+        fields (iterable, optional): Event fields to download, see iter_event_pages()
+
+    Yields:
+        CompactEvent: Parsed events
+
+    Raises:
+        HttpError: When the API rejects a page request
+    """
+    windows = split_window(start_date, end_date, chunk)
+    if len(windows) <= 1:
+        with pool.service(key, creds) as service:
+            for page in iter_event_pages(service, start_date, end_date, calendar_id, fields=fields):
+                yield from page
+        return
+
+    cancelled = threading.Event()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        queues = []
+
+        def submit_next():
+            window = windows[len(queues)]
+            pages = queue.Queue(maxsize=prefetch_pages)
+            # Run in the caller's context so producers keep its request priority
+            executor.submit(contextvars.copy_context().run, _produce_pages,
+                            pool, key, creds, window, calendar_id, fields, pages, cancelled)
+            queues.append(pages)
+
+        try:
+            for _ in range(min(max_workers, len(windows))):
+                submit_next()
+
+            carried = set()  # ids the previous sub-window yielded that this one may list again
+            for index, window in enumerate(windows):
+                window_end = window[1].replace(tzinfo=timezone.utc).timestamp()
+                spanning = set()
+                pages = queues[index]
+                while True:
+                    page = pages.get()
+                    if page is _END_OF_WINDOW:
+                        break
+                    if isinstance(page, Exception):
+                        raise page
+                    for event in page:
+                        if event.id in carried:
+                            continue
+                        # By id, not start: an all-day event's UTC-midnight start is not where
+                        # the API split it, which is in the calendar's zone
+                        if event.end + (ALL_DAY_MARGIN_SECONDS if event.all_day else 0) > window_end:
+                            spanning.add(event.id)
+                        yield event
+                carried = spanning
+
+                if len(queues) < len(windows):
+                    submit_next()
+        finally:
+            # Stops producers if the caller closes the stream early or a page fails
+            cancelled.set()
@@ -0,0 +1,593 @@
+"""
+Calendar backends for ScheduleAI.
+
+The calendar services read events through a CalendarBackend, so the same
+scheduling code can run against Google Calendar, local .ics files, or a
+deterministic synthetic generator that needs no network or credentials:
+
+    service = MultiUserCalendarService(backend=SyntheticCalendarBackend(events_per_day=8))
+
+Every backend returns CompactEvent objects in start-time order for a window
+given as naive UTC datetimes, and raises CalendarAccessError when a calendar
+cannot be read.
+"""
+
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+import hashlib
+from pathlib import Path
+import random
+import re
+import threading
+import time
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from compact_event import CompactEvent
+from calendar_api import CalendarAccessError, default_pool, iter_event_pages, iter_events
+from recurrence import expand_partitioned, instance_id, partition_events
+from async_calendar_client import default_async_client
+
+
+class CalendarBackend:
+    """Source of calendar events for the calendar services."""
+
+    # Whether callers must authenticate the user and pass Google credentials
+    requires_credentials = False
+
+    def list_events(self, user_id, start_date, end_date, creds=None, calendar_id='primary'):
+        """
+        List the events that overlap a window.
+
+        Args:
+            user_id (str): Unique user identifier
+            start_date (datetime): Start of the window (naive UTC)
+            end_date (datetime): End of the window (naive UTC)
+            creds (Credentials, optional): User credentials, for backends that need them
+            calendar_id (str, optional): Calendar to read. Defaults to 'primary'.
+
+        Returns:
+            list: CompactEvent objects in start-time order
+
+        Raises:
+            CalendarAccessError: If the calendar cannot be read
+        """
+        raise NotImplementedError
+
+    def iter_events(self, user_id, start_date, end_date, creds=None, calendar_id='primary',
+                    chunk_days=30, max_workers=4):
+        """
+        Stream the events that overlap a window in start-time order.
+
+        Args:
+            chunk_days (int, optional): Sub-window length for backends that fetch in chunks
+            max_workers (int, optional): Sub-windows fetched concurrently
+
+        Yields:
+            CompactEvent: Calendar events
+
+        Raises:
+            CalendarAccessError: If the calendar cannot be read
+        """
+        yield from self.list_events(user_id, start_date, end_date, creds, calendar_id)
+
+    async def list_events_async(self, user_id, start_date, end_date, creds=None, calendar_id='primary'):
+        """
+        Async version of list_events(). Runs list_events() in a worker thread unless overridden.
+
+        Returns:
+            list: CompactEvent objects in start-time order
+
+        Raises:
+            CalendarAccessError: If the calendar cannot be read
+        """
+        return await asyncio.to_thread(self.list_events, user_id, start_date, end_date, creds, calendar_id)
+
+    def get_timezone(self, user_id, creds=None, calendar_id='primary'):
+        """
+        Look up a calendar's IANA timezone.
+
+        Returns:
+            str or None: e.g. 'Europe/Berlin', or None when the backend does not know it
+        """
+        return None
+
+
+class GoogleCalendarBackend(CalendarBackend):
+    """Reads events from the Google Calendar API."""
+
+    requires_credentials = True
+
+    def __init__(self, service_pool=None, event_mirror=None, recurrence_expander=None, async_client=None):
+        """
+        Initialize the backend.
+
+        Args:
+            service_pool (CalendarServicePool, optional): Defaults to the shared pool
+            event_mirror (CalendarMirror, optional): Local mirror synced with sync
+                tokens; when set, windows are answered locally after a delta sync.
+            recurrence_expander (RecurrenceExpander, optional): When set, recurring
+                events are expanded locally from cached masters instead of by the API.
+            async_client (AsyncCalendarClient, optional): Client for list_events_async().
+                Defaults to the shared client.
+        """
+        self.service_pool = service_pool if service_pool is not None else default_pool
+        self.event_mirror = event_mirror
+        self.recurrence_expander = recurrence_expander
+        self.async_client = async_client if async_client is not None else default_async_client
+
+    @property
+    def reads_per_user(self):
+        """True when reads go through the mirror or expander, which cannot be batched."""
+        return self.event_mirror is not None or self.recurrence_expander is not None
+
+    def list_events(self, user_id, start_date, end_date, creds=None, calendar_id='primary'):
+        """
+        List a window's events, through the mirror or expander when configured.
+
+        Raises:
+            CalendarAccessError: If the mirror cannot sync
+            HttpError: When the API rejects a request
+        """
+        # Reuse a pooled service instead of building one per call
+        with self.service_pool.service(user_id, creds) as service:
+            # Sync deltas into the local mirror and answer from it
+            if self.event_mirror is not None:
+                events, error = self.event_mirror.get_events(user_id, service, start_date, end_date, calendar_id)
+                if error:
+                    raise CalendarAccessError(error)
+                return events
+
+            # Expand recurring events locally from cached masters
+            if self.recurrence_expander is not None:
+                return self.recurrence_expander.get_events(user_id, service, start_date, end_date, calendar_id)
+
+            # Call the Calendar API, following every page of results
+            return [
+                event for page in iter_event_pages(service, start_date, end_date, calendar_id)
+                for event in page
+            ]
+
+    def iter_events(self, user_id, start_date, end_date, creds=None, calendar_id='primary',
+                    chunk_days=30, max_workers=4):
+        """
+        Stream a window's events; long ranges are fetched as concurrent sub-windows.
+
+        Raises:
+            CalendarAccessError: If the mirror cannot sync
+            HttpError: When the API rejects a request
+        """
+        if self.event_mirror is not None:
+            with self.service_pool.service(user_id, creds) as service:
+                _, error = self.event_mirror.sync(user_id, service, calendar_id)
+            if error:
+                raise CalendarAccessError(error)
+            yield from self.event_mirror.query(user_id, start_date, end_date, calendar_id)
+            return
+
+        if self.recurrence_expander is not None:
+            yield from self.list_events(user_id, start_date, end_date, creds, calendar_id)
+            return
+
+        yield from iter_events(
+            self.service_pool, user_id, creds, start_date, end_date, calendar_id,
+            chunk=timedelta(days=chunk_days), max_workers=max_workers)
+
+    async def list_events_async(self, user_id, start_date, end_date, creds=None, calendar_id='primary'):
+        """
+        List a window's events through the shared httpx client. With an event mirror or
+        recurrence expander configured the blocking path runs in a worker thread instead.
+
+        Raises:
+            CalendarAccessError: If the calendar cannot be read
+        """
+        # Mirror sync and local expansion use the blocking client; keep them off the event loop
+        if self.reads_per_user:
+            return await super().list_events_async(user_id, start_date, end_date, creds, calendar_id)
+
+        events, error = await self.async_client.list_events(creds, start_date, end_date, calendar_id, user_id=user_id)
+        if error:
+            raise CalendarAccessError(error)
+        return events
+
+    def get_timezone(self, user_id, creds=None, calendar_id='primary'):
+        """
+        Look up a calendar's timezone setting.
+
+        Raises:
+            HttpError: When the API rejects the request
+        """
+        with self.service_pool.service(user_id, creds) as service:
+            return service.calendars().get(calendarId=calendar_id, fields='timeZone').execute().get('timeZone')
+
+
+_ICS_ESCAPES = re.compile(r'\\([\\;,nN])')
+_ICS_DURATION = re.compile(r'([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$')
+
+
+def _ics_unescape(value):
+    return _ICS_ESCAPES.sub(lambda m: '\n' if m.group(1) in 'nN' else m.group(1), value)
+
+
+def _ics_split(line):
+    """Split a content line into (NAME, {PARAM: value}, value), honoring quoted parameters."""
+    in_quotes = False
+    for index, char in enumerate(line):
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char == ':' and not in_quotes:
+            head, value = line[:index], line[index + 1:]
+            break
+    else:
+        return None
+
+    name, *params = head.split(';')
+    parsed = {}
+    for param in params:
+        key, _, param_value = param.partition('=')
+        parsed[key.upper()] = param_value.strip('"')
+    return name.upper(), parsed, value
+
+
+def _ics_time(params, value):
+    """Convert a DTSTART/DTEND/RECURRENCE-ID value into an API time object."""
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        return {'date': f"{value[:4]}-{value[4:6]}-{value[6:8]}"}
+
+    parsed = datetime.strptime(value.rstrip('Z'), '%Y%m%dT%H%M%S')
+    if value.endswith('Z'):
+        return {'dateTime': parsed.replace(tzinfo=timezone.utc).isoformat()}
+    tzid = params.get('TZID')
+    if tzid:
+        try:
+            return {'dateTime': parsed.replace(tzinfo=ZoneInfo(tzid)).isoformat(), 'timeZone': tzid}
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+    # Floating times are read as UTC
+    return {'dateTime': parsed.replace(tzinfo=timezone.utc).isoformat()}
+
+
+def _ics_duration(value):
+    match = _ICS_DURATION.match(value)
+    if not match:
+        return None
+    weeks, days, hours, minutes, seconds = (int(part or 0) for part in match.groups()[1:])
+    delta = timedelta(weeks=weeks, days=days, hours=hours, minutes=minutes, seconds=seconds)
+    return -delta if match.group(1) == '-' else delta
+
+
+def _ics_shift(time_obj, delta):
+    if 'date' in time_obj:
+        return {'date': (date.fromisoformat(time_obj['date']) + delta).isoformat()}
+    shifted = dict(time_obj)
+    shifted['dateTime'] = (datetime.fromisoformat(time_obj['dateTime']) + delta).isoformat()
+    return shifted
+
+
+def _ics_to_resource(props, raw):
+    """Build an API-shaped event resource from one VEVENT's properties."""
+    uid = props.get('UID', [(None, hashlib.sha1(raw.encode()).hexdigest())])[0][1]
+    if 'DTSTART' not in props:
+        return None
+    start = _ics_time(*props['DTSTART'][0])
+
+    if 'DTEND' in props:
+        end = _ics_time(*props['DTEND'][0])
+    elif 'DURATION' in props and _ics_duration(props['DURATION'][0][1]) is not None:
+        end = _ics_shift(start, _ics_duration(props['DURATION'][0][1]))
+    else:
+        # RFC 5545: all-day events last one day, timed events are instantaneous
+        end = _ics_shift(start, timedelta(days=1)) if 'date' in start else dict(start)
+
+    status = props.get('STATUS', [(None, 'CONFIRMED')])[0][1].lower()
+    resource = {
+        'id': uid,
+        # Changes to the VEVENT text change the etag, so cached schedule lines are redrawn
+        'etag': '"%s"' % hashlib.sha1(raw.encode()).hexdigest()[:16],
+        'status': status if status in ('tentative', 'cancelled') else 'confirmed',
+        'start': start,
+        'end': end,
+    }
+    if 'SUMMARY' in props:
+        resource['summary'] = _ics_unescape(props['SUMMARY'][0][1])
+    if 'LOCATION' in props:
+        resource['location'] = _ics_unescape(props['LOCATION'][0][1])
+    if props.get('TRANSP', [(None, '')])[0][1].upper() == 'TRANSPARENT':
+        resource['transparency'] = 'transparent'
+
+    recurrence = [line for name in ('RRULE', 'RDATE', 'EXDATE', 'EXRULE') for line in props.get(f'_{name}', [])]
+    if recurrence:
+        resource['recurrence'] = recurrence
+    elif 'RECURRENCE-ID' in props:
+        original = _ics_time(*props['RECURRENCE-ID'][0])
+        resource['recurringEventId'] = uid
+        resource['originalStartTime'] = original
+        if 'date' in original:
+            original_start = datetime.fromisoformat(original['date'])
+        else:
+            original_start = datetime.fromisoformat(original['dateTime'])
+        resource['id'] = instance_id(uid, original_start, 'date' in original)
+    return resource
+
+
+def parse_ics(text):
+    """
+    Parse the VEVENTs of an iCalendar document into Calendar API event resources.
+
+    Recurring events keep their RRULE/RDATE/EXDATE lines in 'recurrence', and
+    overridden instances (RECURRENCE-ID) become exceptions with recurringEventId,
+    so the result can be expanded with recurrence.expand_events().
+
+    Args:
+        text (str): iCalendar text
+
+    Returns:
+        list: Event resources
+    """
+    # Unfold continuation lines
+    lines = re.sub(r'\r?\n[ \t]', '', text).splitlines()
+
+    resources = []
+    props = None
+    raw = []
+    nested = 0
+    for line in lines:
+        upper = line.upper()
+        if upper == 'BEGIN:VEVENT':
+            props, raw, nested = {}, [], 0
+            continue
+        if props is None:
+            continue
+        if upper == 'END:VEVENT':
+            resource = _ics_to_resource(props, "\n".join(raw))
+            if resource is not None:
+                resources.append(resource)
+            props = None
+            continue
+        # Nested components (VALARM) are skipped along with their properties
+        if upper.startswith('BEGIN:'):
+            nested += 1
+            continue
+        if upper.startswith('END:'):
+            nested -= 1
+            continue
+        if nested:
+            continue
+
+        raw.append(line)
+        split = _ics_split(line)
+        if split is None:
+            continue
+        name, params, value = split
+        props.setdefault(name, []).append((params, value))
+        if name in ('RRULE', 'RDATE', 'EXDATE', 'EXRULE'):
+            # dateutil reads these lines verbatim, parameters included
+            props.setdefault(f'_{name}', []).append(line)
+    return resources
+
+
+class ICSCalendarBackend(CalendarBackend):
+    """Reads events from iCalendar files, for offline runs and fixtures."""
+
+    def __init__(self, path):
+        """
+        Initialize the backend.
+
+        Args:
+            path (str or Path): One .ics file shared by every user, or a directory of
+                <user_id>.ics files
+        """
+        self.path = Path(path)
+        self._files = {}  # file path -> (mtime, series, singles, exceptions)
+        self._lock = threading.Lock()
+
+    def _file_for(self, user_id, calendar_id):
+        if not self.path.is_dir():
+            return self.path
+        if calendar_id != 'primary':
+            return self.path / user_id / f"{calendar_id}.ics"
+        return self.path / f"{user_id}.ics"
+
+    def _load(self, path):
+        """Parse a file once, and again only after it changes on disk."""
+        try:
+            mtime = path.stat().st_mtime_ns
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is not None and entry[0] == mtime:
+                return entry[1:]
+
+        partitioned = partition_events(parse_ics(path.read_text(encoding='utf-8')))
+        with self._lock:
+            self._files[path] = (mtime,) + partitioned
+        return partitioned
+
+    def list_events(self, user_id, start_date, end_date, creds=None, calendar_id='primary'):
+        """
+        List a window's events, expanding recurring events locally.
+
+        Raises:
+            CalendarAccessError: If the user's calendar file is missing or unreadable
+        """
+        path = self._file_for(user_id, calendar_id)
+        try:
+            partitioned = self._load(path)
+        except (OSError, UnicodeDecodeError, ValueError) as e:
+            raise CalendarAccessError(f"Failed to read calendar file {path}: {str(e)}") from e
+        if partitioned is None:
+            raise CalendarAccessError(f"No calendar file for user {user_id} at {path}")
+        return expand_partitioned(*partitioned, start_date, end_date)
+
+
+_SYNTHETIC_TITLES = (
+    "Standup", "1:1", "Design review", "Sprint planning", "Customer call", "Interview",
+    "Lunch", "Focus time", "Retro", "All hands", "Sync", "Roadmap review", "Demo",
+    "Hiring debrief", "Coffee chat", "Incident review",
+)
+_SYNTHETIC_LOCATIONS = (None, None, None, "Room 4A", "Room 2B", "Zoom", "Google Meet", "Cafe")
+_SYNTHETIC_DURATIONS = (15, 30, 30, 30, 45, 60, 60, 90)
+# Minutes east of UTC for the users' home zones
+_SYNTHETIC_OFFSETS = (-480, -420, -300, -240, 0, 60, 120, 330, 480, 540, 600)
+
+
+class SyntheticCalendarBackend(CalendarBackend):
+    """
+    Generates realistic, deterministic calendars for any number of users.
+
+    Each user gets a home timezone, a busyness factor and a few recurring meetings
+    derived from the seed and user id; each day's events are derived from the seed,
+    user id and date. The same user and window always give the same events, so
+    results are cacheable and comparable between runs, and nothing is stored.
+    """
+
+    def __init__(self, seed=0, events_per_day=6, recurring_per_user=3, all_day_ratio=0.05,
+                 workday=(8, 18), weekend_factor=0.1, offsets=_SYNTHETIC_OFFSETS, latency=0.0):
+        """
+        Initialize the generator.
+
+        Args:
+            seed (int, optional): Seed shared by all generated calendars
+            events_per_day (float, optional): Average one-off events per workday
+            recurring_per_user (int, optional): Maximum recurring meetings per user
+            all_day_ratio (float, optional): Chance of an all-day event on a given day
+            workday (tuple, optional): (first hour, last hour) of the local working day
+            weekend_factor (float, optional): Weekend density relative to workdays
+            offsets (tuple, optional): UTC offsets in minutes users are spread across
+            latency (float, optional): Seconds each list call sleeps, to model a remote backend
+        """
+        self.seed = seed
+        self.events_per_day = events_per_day
+        self.recurring_per_user = recurring_per_user
+        self.all_day_ratio = all_day_ratio
+        self.workday = workday
+        self.weekend_factor = weekend_factor
+        self.offsets = offsets
+        self.latency = latency
+
+    def user_profile(self, user_id):
+        """
+        Get the generated traits of a user.
+
+        Args:
+            user_id (str): Unique user identifier
+
+        Returns:
+            dict: 'utc_offset' in minutes, 'busyness' factor, and 'recurring' meetings as
+                (title, weekdays, start minute, duration) tuples
+        """
+        rng = random.Random(f"{self.seed}:{user_id}")
+        first_hour, last_hour = self.workday
+        recurring = []
+        for index in range(rng.randint(0, self.recurring_per_user)):
+            weekdays = (0, 1, 2, 3, 4) if index == 0 else tuple(sorted(rng.sample(range(5), rng.randint(1, 2))))
+            start_minute = rng.randrange(first_hour * 4, last_hour * 4 - 2) * 15
+            recurring.append((rng.choice(_SYNTHETIC_TITLES), weekdays, start_minute, rng.choice((15, 30, 60))))
+        return {
+            'utc_offset': rng.choice(self.offsets),
+            'busyness': rng.uniform(0.5, 1.5),
+            'recurring': recurring,
+        }
+
+    def _day_events(self, user_id, profile, day):
+        """Generate one local day of a user's calendar."""
+        offset = profile['utc_offset']
+        # Epoch of local midnight
+        midnight = int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp()) - offset * 60
+        day_key = day.strftime('%Y%m%d')
+        weekend = day.weekday() >= 5
+        events = []
+
+        for index, (title, weekdays, start_minute, duration) in enumerate(profile['recurring']):
+            if day.weekday() in weekdays:
+                start = midnight + start_minute * 60
+                events.append(CompactEvent(
+                    f"{user_id}-r{index}_{datetime.fromtimestamp(start, timezone.utc).strftime('%Y%m%dT%H%M%SZ')}",
+                    f'"{self.seed}-r{index}"', start, start + duration * 60, offset, False,
+                    title, _SYNTHETIC_LOCATIONS[index % len(_SYNTHETIC_LOCATIONS)], 'confirmed'))
+
+        rng = random.Random(f"{self.seed}:{user_id}:{day_key}")
+        if rng.random() < self.all_day_ratio:
+            utc_midnight = midnight + offset * 60
+            events.append(CompactEvent(
+                f"{user_id}-a{day_key}", f'"{self.seed}"', utc_midnight, utc_midnight + 86400, 0, True,
+                rng.choice(("Out of office", "Conference", "Company holiday", "Travel")),
+                None, 'confirmed', True))
+
+        density = self.events_per_day * profile['busyness'] * (self.weekend_factor if weekend else 1)
+        count = int(density) + (rng.random() < density - int(density))
+        first_hour, last_hour = self.workday
+        for index in range(count):
+            start = midnight + rng.randrange(first_hour * 4, last_hour * 4) * 900
+            duration = rng.choice(_SYNTHETIC_DURATIONS)
+            events.append(CompactEvent(
+                f"{user_id}-{day_key}-{index}", f'"{self.seed}"', start, start + duration * 60, offset, False,
+                rng.choice(_SYNTHETIC_TITLES), rng.choice(_SYNTHETIC_LOCATIONS),
+                'tentative' if rng.random() < 0.1 else 'confirmed', rng.random() < 0.05))
+        return events
+
+    def list_events(self, user_id, start_date, end_date, creds=None, calendar_id='primary'):
+        """List a window's generated events."""
+        if self.latency:
+            time.sleep(self.latency)
+        profile = self.user_profile(f"{user_id}/{calendar_id}" if calendar_id != 'primary' else user_id)
+        start_epoch = int(start_date.replace(tzinfo=timezone.utc).timestamp())
+        end_epoch = int(end_date.replace(tzinfo=timezone.utc).timestamp())
+
+        # Local days touching the window, plus one for events crossing midnight
+        local = timezone(timedelta(minutes=profile['utc_offset']))
+        day = datetime.fromtimestamp(start_epoch, local).date() - timedelta(days=1)
+        last_day = datetime.fromtimestamp(end_epoch, local).date()
+
+        events = []
+        while day <= last_day:
+            events.extend(
+                event for event in self._day_events(user_id, profile, day)
+                if event.start < end_epoch and event.end > start_epoch
+            )
+            day += timedelta(days=1)
+        events.sort(key=lambda event: event.start)
+        return events
+
+
+def _benchmark(n_users=100_000, days=1, max_workers=8):
+    """
+    Measure scheduler throughput without network: generate, fetch through the
+    multi-user service and format one window for n_users synthetic users.
+
+    Run from the repository root with the services importable:
+
+        PYTHONPATH=.:scheduler_agent_v1 python calendar_backends.py [n_users]
+    """
+    from event_cache import EventCache
+    from multi_user_calendar_service import MultiUserCalendarService
+    from free_busy import index_for
+
+    backend = SyntheticCalendarBackend(seed=1)
+    user_ids = [f"user{i}@example.com" for i in range(n_users)]
+    start_date = datetime(2026, 3, 2)
+    end_date = start_date + timedelta(days=days)
+
+    started = time.perf_counter()
+    events = sum(len(backend.list_events(user_id, start_date, end_date)) for user_id in user_ids)
+    generate = time.perf_counter() - started
+    print(f"backend:  {n_users / generate:,.0f} users/s ({events / n_users:.1f} events/user)")
+
+    service = MultiUserCalendarService(backend=backend, event_cache=EventCache(max_entries=n_users))
+    window = (start_date, end_date)
+    for label in ("cold", "cached"):
+        started = time.perf_counter()
+        errors = 0
+        for user_id, user_events, error in service.get_schedules_bulk(user_ids, window, max_workers=max_workers):
+            if error:
+                errors += 1
+                continue
+            service._format_user_schedule(user_id, user_events, None)
+            index_for(user_events)
+        elapsed = time.perf_counter() - started
+        print(f"service ({label}): {n_users / elapsed:,.0f} users/s fetched, formatted and indexed, "
+              f"{errors} errors, {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    import sys
+    _benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,213 @@
+"""
+Batch calendar reads for ScheduleAI's /calendar/batch endpoint.
+
+Loads every requested user's stored token in one query, fetches their
+events concurrently with bounded parallelism, and yields one NDJSON line
+per user as soon as that user completes, so a dashboard showing many
+people needs one HTTP request instead of one per person.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import contextvars
+from datetime import datetime, timedelta, timezone
+import json
+import os
+from calendar_api import default_pool
+
+BATCH_MAX_EMAILS = int(os.environ.get("CALENDAR_BATCH_MAX_EMAILS", "500"))
+BATCH_MAX_WORKERS = int(os.environ.get("CALENDAR_BATCH_MAX_WORKERS", "16"))
+BATCH_DEFAULT_RESULTS = 250
+BATCH_MAX_RESULTS = 2500  # events.list maximum page size
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _parse_time(value):
+    """Parse an ISO 8601 timestamp into naive UTC."""
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_batch_request(payload):
+    """
+    Validate a /calendar/batch request body.
+
+    Args:
+        payload (dict): {"emails": [...], "time_min": ISO time, "time_max": ISO time,
+            "max_results": int}; times default to now and a day later
+
+    Returns:
+        tuple: (dict with 'emails', 'start', 'end', 'max_results'; error_message)
+    """
+    if not isinstance(payload, dict):
+        return None, "Request body must be a JSON object"
+
+    emails = payload.get("emails")
+    if not isinstance(emails, list) or not emails or not all(isinstance(e, str) and e for e in emails):
+        return None, "'emails' must be a non-empty list of email addresses"
+    emails = list(dict.fromkeys(emails))
+    if len(emails) > BATCH_MAX_EMAILS:
+        return None, f"At most {BATCH_MAX_EMAILS} emails per batch"
+
+    try:
+        start = _parse_time(payload["time_min"]) if payload.get("time_min") else datetime.utcnow()
+        end = _parse_time(payload["time_max"]) if payload.get("time_max") else start + timedelta(days=1)
+    except ValueError as e:
+        return None, f"Invalid time range: {str(e)}"
+    if end <= start:
+        return None, "'time_max' must be after 'time_min'"
+
+    try:
+        max_results = int(payload.get("max_results", BATCH_DEFAULT_RESULTS))
+    except (TypeError, ValueError):
+        return None, "'max_results' must be an integer"
+    if not 1 <= max_results <= BATCH_MAX_RESULTS:
+        return None, f"'max_results' must be between 1 and {BATCH_MAX_RESULTS}"
+
+    return {"emails": emails, "start": start, "end": end, "max_results": max_results}, None
+
+
+def ndjson_line(result):
+    """
+    Encode one per-user result as an NDJSON line.
+
+    Args:
+        result (dict): Per-user result
+
+    Returns:
+        bytes: JSON followed by a newline
+    """
+    return json.dumps(result, separators=(",", ":")).encode() + b"\n"
+
+
+def _missing(email):
+    return {"email": email, "status": 404, "error": "No token found for this user. Please login first."}
+
+
+def _fetch_user(credential_store, service_pool, email, start, end, max_results):
+    """Fetch one user's events; returns the result line as a dict."""
+    # Cache hit after get_many(); refreshes (under the user's lock) only if expired
+    creds, error = credential_store.get_valid(email)
+    if error:
+        return {"email": email, "status": 400, "error": f"Failed to refresh token: {error}"}
+    if not creds:
+        return _missing(email)
+
+    try:
+        with service_pool.service(email, creds) as service:
+            result = service.events().list(
+                calendarId="primary",
+                timeMin=start.isoformat() + "Z",
+                timeMax=end.isoformat() + "Z",
+                maxResults=max_results,
+                singleEvents=True,
+                orderBy="startTime",
+            ).execute()
+    except Exception as e:
+        return {"email": email, "status": 500, "error": f"Failed to fetch calendar events: {e}"}
+    return {"email": email, "status": 200, "events": result.get("items", [])}
+
+
+def stream_batch(credential_store, emails, start, end, max_results=BATCH_DEFAULT_RESULTS,
+                 service_pool=None, max_workers=BATCH_MAX_WORKERS):
+    """
+    Load the users' tokens, then return a generator of NDJSON lines in completion order.
+
+    Tokens are loaded before the first line is produced, so a database error
+    surfaces before the response starts.
+
+    Args:
+        credential_store (CredentialStore): Source of user credentials
+        emails (list): Users to fetch
+        start (datetime): Start of the window (naive UTC)
+        end (datetime): End of the window (naive UTC)
+        max_results (int, optional): Events per user
+        service_pool (CalendarServicePool, optional): Defaults to the shared pool
+        max_workers (int, optional): Users fetched concurrently
+
+    Returns:
+        generator: bytes lines, one per user
+    """
+    found = credential_store.get_many(emails)
+    service_pool = service_pool if service_pool is not None else default_pool
+
+    def lines():
+        # Users without a token need no worker
+        for email in emails:
+            if email not in found:
+                yield ndjson_line(_missing(email))
+
+        wanted = [email for email in emails if email in found]
+        if not wanted:
+            return
+        executor = ThreadPoolExecutor(max_workers=min(max_workers, len(wanted)), thread_name_prefix="calendar-batch")
+        try:
+            futures = [
+                executor.submit(contextvars.copy_context().run, _fetch_user,
+                                credential_store, service_pool, email, start, end, max_results)
+                for email in wanted
+            ]
+            for future in as_completed(futures):
+                yield ndjson_line(future.result())
+        finally:
+            # Client went away: skip users not started yet
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    return lines()
+
+
+async def _fetch_user_async(credential_store, calendar_client, semaphore, email, start, end, max_results):
+    async with semaphore:
+        creds, error = await credential_store.get_valid(email)
+        if error:
+            return {"email": email, "status": 400, "error": f"Failed to refresh token: {error}"}
+        if not creds:
+            return _missing(email)
+
+        events, error = await calendar_client.list_upcoming_events(
+            creds, start, max_results, user_id=email, time_max=end)
+    if error:
+        return {"email": email, "status": 500, "error": f"Failed to fetch calendar events: {error}"}
+    return {"email": email, "status": 200, "events": events}
+
+
+async def stream_batch_async(credential_store, calendar_client, emails, start, end,
+                             max_results=BATCH_DEFAULT_RESULTS, max_concurrency=BATCH_MAX_WORKERS):
+    """
+    Async counterpart of stream_batch() for the ASGI service.
+
+    Args:
+        credential_store (AsyncCredentialStore): Source of user credentials
+        calendar_client (AsyncCalendarClient): Calendar client
+        emails (list): Users to fetch
+        start (datetime): Start of the window (naive UTC)
+        end (datetime): End of the window (naive UTC)
+        max_results (int, optional): Events per user
+        max_concurrency (int, optional): Users fetched concurrently
+
+    Returns:
+        async generator: bytes lines, one per user
+    """
+    found = await credential_store.get_many(emails)
+
+    async def lines():
+        for email in emails:
+            if email not in found:
+                yield ndjson_line(_missing(email))
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+        tasks = [
+            asyncio.ensure_future(_fetch_user_async(
+                credential_store, calendar_client, semaphore, email, start, end, max_results))
+            for email in emails if email in found
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield ndjson_line(await next_done)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return lines()
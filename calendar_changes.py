@@ -0,0 +1,169 @@
+"""
+Cross-process calendar change feed for ScheduleAI.
+
+A push notification reaches one web worker, but every worker and the agent
+process keep their own in-memory caches (events, recurrence masters,
+rendered responses). WatchManager publishes each change to the
+CalendarChange table; every process polls the table and hands new changes
+to its listeners, so a cache anywhere is stale for at most one poll
+interval after Google reports the change.
+"""
+
+from datetime import datetime, timedelta
+import os
+import threading
+import time
+from sqlalchemy import func
+from db import DBSession, session_scope
+from models import CalendarChange
+
+POLL_SECONDS = float(os.environ.get("CALENDAR_CHANGES_POLL_SECONDS", "1"))
+RETENTION = timedelta(hours=1)  # longer than any process should fall behind
+PRUNE_SECONDS = 60
+
+
+class CalendarChangeFeed:
+    """Publishes calendar changes to the database and delivers other processes' changes."""
+
+    def __init__(self, session_factory=DBSession, interval=POLL_SECONDS, retention=RETENTION):
+        """
+        Initialize the feed.
+
+        Args:
+            session_factory (callable, optional): SQLAlchemy session factory. Defaults to db.DBSession.
+            interval (float, optional): Seconds between polls
+            retention (timedelta, optional): Age after which published changes are deleted
+        """
+        self.session_factory = session_factory
+        self.interval = interval
+        self.retention = retention
+        self._listeners = []
+        self._position = None  # highest change id seen; None until the first poll
+        self._published = set()  # ids this process published and already delivered
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_pruned = 0.0
+        self.published = 0
+        self.received = 0
+
+    def add_listener(self, callback):
+        """
+        Call callback(user_id, calendar_id) for every change, from any process,
+        e.g. EventCache.invalidate or ResponseCache.invalidate.
+
+        Args:
+            callback (callable): Change listener
+        """
+        self._listeners.append(callback)
+
+    def publish(self, user_id, calendar_id='primary'):
+        """
+        Record a change for every process and deliver it to this process's listeners now.
+
+        Args:
+            user_id (str): Unique user identifier
+            calendar_id (str, optional): Changed calendar
+        """
+        with session_scope(self.session_factory) as session:
+            change = CalendarChange(user_id=user_id, calendar_id=calendar_id, changed_at=datetime.utcnow())
+            session.add(change)
+            session.flush()
+            # Before the commit, so a concurrent poll cannot deliver it a second time
+            with self._lock:
+                self._published.add(change.id)
+                self.published += 1
+        self._deliver(user_id, calendar_id)
+
+    def _deliver(self, user_id, calendar_id):
+        for callback in self._listeners:
+            try:
+                callback(user_id, calendar_id)
+            except Exception as e:
+                print(f"[CHANGES] listener failed for {user_id}: {e}")
+
+    def poll_once(self):
+        """
+        Deliver changes published since the last poll by other processes.
+
+        The first poll only records the current position: a process that just
+        started has nothing cached to invalidate.
+
+        Returns:
+            int: Changes delivered
+        """
+        session = self.session_factory()
+        try:
+            if self._position is None:
+                self._position = session.query(func.max(CalendarChange.id)).scalar() or 0
+                return 0
+            rows = (
+                session.query(CalendarChange.id, CalendarChange.user_id, CalendarChange.calendar_id)
+                # Ids commit in order on SQLite; elsewhere a late commit is still bounded by cache TTLs
+                .filter(CalendarChange.id > self._position)
+                .order_by(CalendarChange.id)
+                .all()
+            )
+        finally:
+            session.close()
+
+        delivered = 0
+        for change_id, user_id, calendar_id in rows:
+            self._position = change_id
+            with self._lock:
+                if change_id in self._published:
+                    self._published.discard(change_id)
+                    continue
+                self.received += 1
+            self._deliver(user_id, calendar_id)
+            delivered += 1
+        return delivered
+
+    def prune(self, now=None):
+        """
+        Delete changes older than the retention period.
+
+        Args:
+            now (datetime, optional): Current naive UTC time
+
+        Returns:
+            int: Rows deleted
+        """
+        cutoff = (now or datetime.utcnow()) - self.retention
+        with session_scope(self.session_factory) as session:
+            return session.query(CalendarChange).filter(CalendarChange.changed_at < cutoff).delete()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+                if time.monotonic() - self._last_pruned >= PRUNE_SECONDS:
+                    self._last_pruned = time.monotonic()
+                    self.prune()
+            except Exception as e:
+                print(f"[CHANGES] poll failed: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        """
+        Poll for changes on a daemon thread.
+
+        Returns:
+            CalendarChangeFeed: self
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="calendar-changes", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """
+        Stop the polling thread.
+
+        Args:
+            timeout (float, optional): Seconds to wait for it to exit
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -0,0 +1,247 @@
+"""
+Persistent local event mirror kept up to date with Calendar sync tokens.
+Range queries are answered from the CalendarEvent table; only changed events
+cross the network after the initial full sync.
+"""
+
+from datetime import datetime, timedelta, timezone
+import json
+import threading
+from googleapiclient.errors import HttpError
+from compact_event import COMPACT_EVENT_FIELDS, CompactEvent
+from calendar_api import event_list_fields
+from db import DBSession
+from models import CalendarEvent, CalendarSyncState
+
+SYNC_PAGE_SIZE = 2500  # API maximum for events().list
+
+
+def _to_utc_naive(value):
+    """
+    Convert an API start/end object to a naive UTC datetime.
+
+    Args:
+        value (dict): Event 'start' or 'end' object with 'dateTime' or 'date'
+
+    Returns:
+        tuple: (datetime, is_all_day)
+    """
+    if 'dateTime' in value:
+        parsed = datetime.fromisoformat(value['dateTime'].replace('Z', '+00:00'))
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed, False
+    return datetime.fromisoformat(value['date']), True
+
+
+class CalendarMirror:
+    """Local SQLite mirror of users' calendars, synced incrementally."""
+
+    def __init__(self, session_factory=DBSession, initial_window_days=None):
+        """
+        Initialize the mirror.
+
+        Args:
+            session_factory (callable, optional): SQLAlchemy session factory. Defaults to db.DBSession.
+            initial_window_days (int, optional): Limit the first full sync to events
+                ending after this many days ago. Defaults to the whole calendar.
+        """
+        self.session_factory = session_factory
+        self.initial_window_days = initial_window_days
+        self._locks = {}  # user_id -> threading.Lock
+        self._lock = threading.Lock()
+
+    def sync_lock(self, user_id):
+        """
+        Get the lock that serializes syncs of a user's calendars.
+
+        Args:
+            user_id (str): Unique user identifier
+
+        Returns:
+            threading.Lock: Per-user lock
+        """
+        with self._lock:
+            lock = self._locks.get(user_id)
+            if lock is None:
+                lock = self._locks[user_id] = threading.Lock()
+            return lock
+
+    def sync(self, user_id, service, calendar_id='primary'):
+        """
+        Pull changes since the last sync into the mirror.
+
+        Runs a full sync when no sync token is stored, or when Google reports the
+        stored token as expired (HTTP 410). Syncs of the same user are serialized,
+        so concurrent callers (a push notification and a request, say) do not
+        upsert the same rows at once or store an older sync token last.
+
+        Args:
+            user_id (str): Unique user identifier
+            service (Resource): Calendar API service object authorized for the user
+            calendar_id (str, optional): Calendar to sync. Defaults to 'primary'.
+
+        Returns:
+            tuple: (changed_event_count, error_message)
+        """
+        with self.sync_lock(user_id):
+            return self._sync_locked(user_id, service, calendar_id)
+
+    def _sync_locked(self, user_id, service, calendar_id):
+        session = self.session_factory()
+        try:
+            state = session.get(CalendarSyncState, (user_id, calendar_id))
+            if state is None:
+                state = CalendarSyncState(user_id=user_id, calendar_id=calendar_id)
+
+            try:
+                changed, sync_token = self._pull(session, user_id, service, calendar_id, state.sync_token)
+            except HttpError as error:
+                if error.resp.status != 410 or not state.sync_token:
+                    raise
+                # Sync token invalidated by Google: wipe and do a full sync
+                session.rollback()
+                self._clear(session, user_id, calendar_id)
+                state.sync_token = None
+                changed, sync_token = self._pull(session, user_id, service, calendar_id, None)
+
+            state.sync_token = sync_token
+            state.last_synced = datetime.utcnow()
+            session.merge(state)
+            session.commit()
+            return changed, None
+
+        except HttpError as error:
+            session.rollback()
+            return 0, f"Google Calendar API error for user {user_id}: {error}"
+        except Exception as e:
+            session.rollback()
+            return 0, f"Event mirror sync failed for user {user_id}: {str(e)}"
+        finally:
+            session.close()
+
+    def _pull(self, session, user_id, service, calendar_id, sync_token):
+        """
+        Page through events().list and apply every item to the session.
+
+        Returns:
+            tuple: (changed_event_count, next_sync_token)
+        """
+        params = {
+            'calendarId': calendar_id,
+            'singleEvents': True,
+            'maxResults': SYNC_PAGE_SIZE,
+            # Only what queries parse back into CompactEvent is stored
+            'fields': event_list_fields(COMPACT_EVENT_FIELDS),
+        }
+        if sync_token:
+            params['syncToken'] = sync_token
+        elif self.initial_window_days is not None:
+            time_min = datetime.utcnow() - timedelta(days=self.initial_window_days)
+            params['timeMin'] = time_min.isoformat() + 'Z'
+
+        changed = 0
+        page_token = None
+        while True:
+            if page_token:
+                params['pageToken'] = page_token
+            result = service.events().list(**params).execute()
+
+            for item in result.get('items', []):
+                self._apply(session, user_id, calendar_id, item)
+                changed += 1
+
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                return changed, result.get('nextSyncToken')
+
+    def _apply(self, session, user_id, calendar_id, item):
+        """Upsert or delete one event resource."""
+        key = (user_id, calendar_id, item['id'])
+        if item.get('status') == 'cancelled':
+            row = session.get(CalendarEvent, key)
+            if row is not None:
+                session.delete(row)
+            return
+
+        start_time, all_day = _to_utc_naive(item['start'])
+        end_time, _ = _to_utc_naive(item.get('end', item['start']))
+        session.merge(CalendarEvent(
+            user_id=user_id,
+            calendar_id=calendar_id,
+            event_id=item['id'],
+            start_time=start_time,
+            end_time=end_time,
+            all_day=all_day,
+            etag=item.get('etag'),
+            payload=json.dumps(item),
+        ))
+
+    def _clear(self, session, user_id, calendar_id):
+        """Remove all mirrored events for a calendar ahead of a full resync."""
+        session.query(CalendarEvent).filter_by(user_id=user_id, calendar_id=calendar_id).delete()
+
+    def query(self, user_id, start_date, end_date, calendar_id='primary'):
+        """
+        Get mirrored events overlapping a window, ordered by start time.
+
+        Args:
+            user_id (str): Unique user identifier
+            start_date (datetime): Start of the window (naive UTC)
+            end_date (datetime): End of the window (naive UTC)
+            calendar_id (str, optional): Calendar to read. Defaults to 'primary'.
+
+        Returns:
+            list: CompactEvent objects parsed from the stored event resources
+        """
+        session = self.session_factory()
+        try:
+            rows = (
+                session.query(CalendarEvent.payload)
+                .filter(
+                    CalendarEvent.user_id == user_id,
+                    CalendarEvent.calendar_id == calendar_id,
+                    CalendarEvent.start_time < end_date,
+                    CalendarEvent.end_time > start_date,
+                )
+                .order_by(CalendarEvent.start_time)
+                .all()
+            )
+            return [CompactEvent.from_api(json.loads(payload)) for (payload,) in rows]
+        finally:
+            session.close()
+
+    def get_events(self, user_id, service, start_date, end_date, calendar_id='primary'):
+        """
+        Sync a calendar and answer a window query from the mirror.
+
+        Args:
+            user_id (str): Unique user identifier
+            service (Resource): Calendar API service object authorized for the user
+            start_date (datetime): Start of the window (naive UTC)
+            end_date (datetime): End of the window (naive UTC)
+            calendar_id (str, optional): Calendar to read. Defaults to 'primary'.
+
+        Returns:
+            tuple: (events_list, error_message)
+        """
+        _, error = self.sync(user_id, service, calendar_id)
+        if error:
+            return None, error
+        return self.query(user_id, start_date, end_date, calendar_id), None
+
+    def forget_user(self, user_id):
+        """
+        Delete all mirrored events and sync state for a user.
+
+        Args:
+            user_id (str): Unique user identifier
+        """
+        with self.sync_lock(user_id):
+            session = self.session_factory()
+            try:
+                session.query(CalendarEvent).filter_by(user_id=user_id).delete()
+                session.query(CalendarSyncState).filter_by(user_id=user_id).delete()
+                session.commit()
+            finally:
+                session.close()
@@ -0,0 +1,339 @@
+"""
+Calendar push-notification channels for ScheduleAI.
+
+Opens events.watch channels per user, turns incoming webhook notifications
+into invalidation of only that user's cached events (and an incremental
+mirror re-sync), and renews channels in the background before they expire.
+With a CalendarChangeFeed, invalidation also reaches the caches of other
+workers and of the agent process.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import hmac
+import os
+import random
+import secrets
+import threading
+import uuid
+from db import DBSession
+from models import WatchChannel
+from calendar_api import default_pool
+from event_cache import default_cache
+from request_scheduler import BACKGROUND, request_priority
+
+# Public HTTPS URL Google posts notifications to, e.g. "https://example.com/notifications"
+WEBHOOK_URL = os.environ.get("CALENDAR_WEBHOOK_URL")
+CHANNEL_TTL_SECONDS = 7 * 24 * 3600  # API maximum for event channels
+
+
+class WatchManager:
+    """Opens, renews and dispatches Calendar push-notification channels."""
+
+    def __init__(self, credential_store, address=WEBHOOK_URL, session_factory=DBSession,
+                 event_cache=None, event_mirror=None, service_pool=None, change_feed=None,
+                 ttl=CHANNEL_TTL_SECONDS, renew_before=timedelta(hours=1),
+                 interval=300, jitter=0.2, max_workers=4):
+        """
+        Initialize the manager.
+
+        Args:
+            credential_store (CredentialStore): Source of user credentials
+            address (str, optional): Webhook URL. Defaults to CALENDAR_WEBHOOK_URL.
+            session_factory (callable, optional): SQLAlchemy session factory. Defaults to db.DBSession.
+            event_cache (EventCache, optional): Cache to invalidate. Defaults to the shared cache.
+            event_mirror (CalendarMirror, optional): Mirror to re-sync on changes
+            service_pool (CalendarServicePool, optional): Defaults to the shared pool
+            change_feed (CalendarChangeFeed, optional): Publish changes here so every
+                process invalidates its caches, not only this one
+            ttl (int, optional): Requested channel lifetime in seconds
+            renew_before (timedelta, optional): Renew channels expiring within this window
+            interval (float, optional): Seconds between renewal scans
+            jitter (float, optional): Fraction of the interval to randomize each sleep by
+            max_workers (int, optional): Concurrent background re-syncs
+        """
+        self.credential_store = credential_store
+        self.address = address
+        self.session_factory = session_factory
+        self.event_cache = event_cache if event_cache is not None else default_cache
+        self.event_mirror = event_mirror
+        self.service_pool = service_pool if service_pool is not None else default_pool
+        self.ttl = ttl
+        self.renew_before = renew_before
+        self.interval = interval
+        self.jitter = jitter
+        self.change_feed = change_feed
+        self._listeners = []
+        if change_feed is not None:
+            # Changes from any process (including this one) arrive through the feed
+            change_feed.add_listener(self._apply)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="watch-sync")
+        self._stop = threading.Event()
+        self._thread = None
+        self.notifications = 0
+        self.invalidations = 0
+
+    def add_listener(self, callback):
+        """
+        Call callback(user_id, calendar_id) whenever a calendar changes,
+        e.g. RecurrenceExpander.invalidate.
+
+        Args:
+            callback (callable): Change listener
+        """
+        self._listeners.append(callback)
+
+    def watch(self, user_id, calendar_id='primary'):
+        """
+        Open a notification channel for a user's calendar.
+
+        Args:
+            user_id (str): Unique user identifier
+            calendar_id (str, optional): Calendar to watch. Defaults to 'primary'.
+
+        Returns:
+            tuple: (channel_id, error_message)
+        """
+        if not self.address:
+            return None, "No webhook address configured (set CALENDAR_WEBHOOK_URL)"
+
+        creds, error = self.credential_store.get_valid(user_id)
+        if error:
+            return None, error
+        if not creds:
+            return None, f"No stored credentials for user {user_id}"
+
+        channel_id = str(uuid.uuid4())
+        token = secrets.token_urlsafe(24)
+        try:
+            with self.service_pool.service(user_id, creds) as service:
+                result = service.events().watch(calendarId=calendar_id, body={
+                    'id': channel_id,
+                    'type': 'web_hook',
+                    'address': self.address,
+                    'token': token,
+                    'params': {'ttl': str(int(self.ttl))},
+                }).execute()
+        except Exception as e:
+            return None, f"Failed to open watch channel for user {user_id}: {str(e)}"
+
+        if result.get('expiration'):
+            expiration = datetime.utcfromtimestamp(int(result['expiration']) / 1000)
+        else:
+            expiration = datetime.utcnow() + timedelta(seconds=self.ttl)
+
+        session = self.session_factory()
+        try:
+            session.add(WatchChannel(
+                channel_id=channel_id,
+                user_id=user_id,
+                calendar_id=calendar_id,
+                resource_id=result['resourceId'],
+                token=token,
+                expiration=expiration,
+            ))
+            session.commit()
+        finally:
+            session.close()
+        return channel_id, None
+
+    def stop_channel(self, channel_id):
+        """
+        Stop a channel and forget it. Failures to reach the API are ignored,
+        since an unstopped channel simply expires.
+
+        Args:
+            channel_id (str): Channel to stop
+
+        Returns:
+            bool: True if the channel was known
+        """
+        session = self.session_factory()
+        try:
+            channel = session.get(WatchChannel, channel_id)
+            if channel is None:
+                return False
+            user_id, resource_id = channel.user_id, channel.resource_id
+            session.delete(channel)
+            session.commit()
+        finally:
+            session.close()
+
+        creds = self.credential_store.get(user_id)
+        if creds is not None:
+            try:
+                with self.service_pool.service(user_id, creds) as service:
+                    service.channels().stop(body={'id': channel_id, 'resourceId': resource_id}).execute()
+            except Exception as e:
+                print(f"[WATCH] failed to stop channel {channel_id}: {e}")
+        return True
+
+    def unwatch_user(self, user_id):
+        """
+        Stop all of a user's channels, e.g. when access is revoked.
+
+        Args:
+            user_id (str): Unique user identifier
+        """
+        session = self.session_factory()
+        try:
+            channel_ids = [row.channel_id for row in session.query(WatchChannel.channel_id).filter_by(user_id=user_id)]
+        finally:
+            session.close()
+        for channel_id in channel_ids:
+            self.stop_channel(channel_id)
+
+    def handle_notification(self, headers):
+        """
+        Handle one push notification from the webhook.
+
+        Args:
+            headers (Mapping): Request headers (X-Goog-Channel-ID, X-Goog-Channel-Token,
+                X-Goog-Resource-ID, X-Goog-Resource-State)
+
+        Returns:
+            tuple: (http_status, message)
+        """
+        channel_id = headers.get('X-Goog-Channel-ID')
+        session = self.session_factory()
+        try:
+            channel = session.get(WatchChannel, channel_id) if channel_id else None
+            if channel is None:
+                return 404, "Unknown channel"
+            user_id, calendar_id = channel.user_id, channel.calendar_id
+            expected_token, resource_id = channel.token, channel.resource_id
+        finally:
+            session.close()
+
+        # Bytes, since compare_digest() rejects non-ASCII str
+        if not hmac.compare_digest(headers.get('X-Goog-Channel-Token', '').encode(), expected_token.encode()) \
+                or headers.get('X-Goog-Resource-ID') != resource_id:
+            return 403, "Channel token mismatch"
+
+        # 'sync' only confirms the channel was opened
+        state = headers.get('X-Goog-Resource-State')
+        if state == 'sync':
+            return 200, "Channel confirmed"
+
+        self.notifications += 1
+        self.invalidate(user_id, calendar_id)
+        return 200, f"Invalidated events for {user_id}"
+
+    def invalidate(self, user_id, calendar_id='primary'):
+        """
+        Drop a changed calendar's cached events and re-sync its mirror in the background.
+
+        Args:
+            user_id (str): Unique user identifier
+            calendar_id (str, optional): Changed calendar
+        """
+        self.invalidations += 1
+        if self.change_feed is not None:
+            self.change_feed.publish(user_id, calendar_id)
+        else:
+            self._apply(user_id, calendar_id)
+        if self.event_mirror is not None:
+            self._executor.submit(self._resync, user_id, calendar_id)
+
+    def _apply(self, user_id, calendar_id):
+        """Invalidate this process's cache and listeners for a changed calendar."""
+        self.event_cache.invalidate(user_id, calendar_id)
+        for callback in self._listeners:
+            try:
+                callback(user_id, calendar_id)
+            except Exception as e:
+                print(f"[WATCH] listener failed for {user_id}: {e}")
+
+    def _resync(self, user_id, calendar_id):
+        with request_priority(BACKGROUND):
+            self._resync_now(user_id, calendar_id)
+
+    def _resync_now(self, user_id, calendar_id):
+        creds, error = self.credential_store.get_valid(user_id)
+        if error or not creds:
+            print(f"[WATCH] cannot re-sync {user_id}: {error or 'no credentials'}")
+            return
+        with self.service_pool.service(user_id, creds) as service:
+            _, error = self.event_mirror.sync(user_id, service, calendar_id)
+        if error:
+            print(f"[WATCH] re-sync failed for {user_id}: {error}")
+
+    def due_channels(self, now=None):
+        """
+        Get channels expiring within the renewal window.
+
+        Args:
+            now (datetime, optional): Current naive UTC time
+
+        Returns:
+            list: (channel_id, user_id, calendar_id) tuples
+        """
+        cutoff = (now or datetime.utcnow()) + self.renew_before
+        session = self.session_factory()
+        try:
+            return [
+                tuple(row) for row in
+                session.query(WatchChannel.channel_id, WatchChannel.user_id, WatchChannel.calendar_id)
+                .filter(WatchChannel.expiration <= cutoff)
+                .all()
+            ]
+        finally:
+            session.close()
+
+    def renew_once(self, now=None):
+        """
+        Replace channels that are about to expire. The new channel is opened
+        before the old one is stopped so no notification is missed.
+
+        Args:
+            now (datetime, optional): Current naive UTC time
+
+        Returns:
+            dict: 'renewed' count, 'failed' count and 'errors' messages
+        """
+        result = {"renewed": 0, "failed": 0, "errors": []}
+        for channel_id, user_id, calendar_id in self.due_channels(now):
+            _, error = self.watch(user_id, calendar_id)
+            if error:
+                result["failed"] += 1
+                result["errors"].append(error)
+                continue
+            self.stop_channel(channel_id)
+            result["renewed"] += 1
+        return result
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with request_priority(BACKGROUND):
+                    result = self.renew_once()
+                if result["renewed"] or result["failed"]:
+                    print(f"[WATCH] renewed={result['renewed']} failed={result['failed']}")
+            except Exception as e:
+                print(f"[WATCH] renewal scan failed: {e}")
+            delay = self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+            self._stop.wait(delay)
+
+    def start(self):
+        """
+        Run channel renewal on a daemon thread.
+
+        Returns:
+            WatchManager: self
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="watch-renewal", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """
+        Stop the renewal thread.
+
+        Args:
+            timeout (float, optional): Seconds to wait for it to exit
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
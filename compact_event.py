@@ -0,0 +1,272 @@
+"""
+Compact calendar event representation for ScheduleAI.
+
+Google API event resources carry every field as nested dicts and strings.
+CompactEvent keeps only what the scheduler uses, parsed once at fetch time:
+epoch start/end, the original UTC offset for display, interned summary and
+location, and flags. It also answers the dict-style lookups ('start',
+'summary', .get(...)) that older callers make on raw events.
+"""
+
+from datetime import datetime, timedelta, timezone
+import json
+import sys
+import time
+import tracemalloc
+
+# Event resource fields CompactEvent reads; request only these with a fields= mask
+COMPACT_EVENT_FIELDS = ('id', 'etag', 'status', 'start', 'end', 'summary', 'location', 'transparency')
+
+_UTC_OFFSETS = {}  # offset minutes -> timezone, shared by all events
+
+
+def _offset_timezone(minutes):
+    tz = _UTC_OFFSETS.get(minutes)
+    if tz is None:
+        tz = _UTC_OFFSETS[minutes] = timezone(timedelta(minutes=minutes))
+    return tz
+
+
+def _intern(value):
+    return sys.intern(value) if value else None
+
+
+def _parse_time(value):
+    """
+    Parse an API start/end object.
+
+    Returns:
+        tuple: (epoch_seconds, utc_offset_minutes, is_all_day)
+    """
+    if 'dateTime' in value:
+        parsed = datetime.fromisoformat(value['dateTime'].replace('Z', '+00:00'))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return int(parsed.timestamp()), int(parsed.utcoffset().total_seconds()) // 60, False
+    # All-day dates are stored as their UTC midnight; interval() resolves them in a zone
+    parsed = datetime.fromisoformat(value['date']).replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp()), 0, True
+
+
+def all_day_epoch(epoch, tz):
+    """
+    Resolve an all-day boundary, stored as the date's UTC midnight, to midnight in a zone.
+
+    Args:
+        epoch (int): UTC midnight of the date, epoch seconds
+        tz (tzinfo): Zone the date is a day in
+
+    Returns:
+        int: Epoch seconds of the date's midnight in tz
+    """
+    day = datetime.fromtimestamp(epoch, timezone.utc)
+    return int(datetime(day.year, day.month, day.day, tzinfo=tz).timestamp())
+
+
+class CompactEvent:
+    """Slotted, parsed-once calendar event."""
+
+    __slots__ = ('id', 'etag', 'start', 'end', 'utc_offset', 'all_day',
+                 'summary', 'location', 'status', 'transparent')
+
+    def __init__(self, id, etag, start, end, utc_offset=0, all_day=False,
+                 summary=None, location=None, status=None, transparent=False):
+        """
+        Initialize an event.
+
+        Args:
+            id (str): Event id
+            etag (str): Event etag
+            start (int): Start, epoch seconds
+            end (int): End, epoch seconds
+            utc_offset (int, optional): Offset of the original start time, in minutes
+            all_day (bool, optional): All-day event
+            summary (str, optional): Title
+            location (str, optional): Location
+            status (str, optional): 'confirmed', 'tentative' or 'cancelled'
+            transparent (bool, optional): Shown as available rather than busy
+        """
+        self.id = id
+        self.etag = etag
+        self.start = start
+        self.end = end
+        self.utc_offset = utc_offset
+        self.all_day = all_day
+        self.summary = _intern(summary)
+        self.location = _intern(location)
+        self.status = _intern(status)
+        self.transparent = transparent
+
+    @classmethod
+    def from_api(cls, item):
+        """
+        Parse an event resource from the Calendar API.
+
+        Args:
+            item (dict): Event resource
+
+        Returns:
+            CompactEvent or None: Parsed event, or None if it has no start time
+                (e.g. a cancelled instance listed without one)
+        """
+        if isinstance(item, cls):
+            return item
+        if not item.get('start'):
+            return None
+        start, utc_offset, all_day = _parse_time(item['start'])
+        end = _parse_time(item['end'])[0] if item.get('end') else start
+        return cls(
+            item.get('id'),
+            item.get('etag'),
+            start,
+            end,
+            utc_offset,
+            all_day,
+            item.get('summary'),
+            item.get('location'),
+            item.get('status'),
+            item.get('transparency') == 'transparent',
+        )
+
+    def interval(self, tz=None):
+        """
+        Get the start and end in epoch seconds, with all-day dates resolved in a zone.
+
+        Args:
+            tz (tzinfo, optional): Zone of the calendar's days. Defaults to UTC.
+
+        Returns:
+            tuple: (start_epoch, end_epoch)
+        """
+        if self.all_day and tz is not None:
+            return all_day_epoch(self.start, tz), all_day_epoch(self.end, tz)
+        return self.start, self.end
+
+    @property
+    def busy(self):
+        """True if the event blocks time."""
+        return self.status != 'cancelled' and not self.transparent
+
+    def start_datetime(self):
+        """
+        Get the start as an aware datetime in the event's original UTC offset.
+
+        Returns:
+            datetime: Start time
+        """
+        return datetime.fromtimestamp(self.start, _offset_timezone(self.utc_offset))
+
+    def _time_dict(self, epoch):
+        if self.all_day:
+            return {'date': datetime.fromtimestamp(epoch, timezone.utc).date().isoformat()}
+        moment = datetime.fromtimestamp(epoch, _offset_timezone(self.utc_offset))
+        return {'dateTime': moment.isoformat()}
+
+    def to_dict(self):
+        """
+        Render the event in Calendar API shape (only the kept fields).
+
+        Returns:
+            dict: Event resource
+        """
+        item = {'id': self.id, 'start': self._time_dict(self.start), 'end': self._time_dict(self.end)}
+        for key in ('etag', 'summary', 'location', 'status'):
+            value = getattr(self, key)
+            if value is not None:
+                item[key] = value
+        if self.transparent:
+            item['transparency'] = 'transparent'
+        return item
+
+    # Dict-style access for callers written against raw API events
+    def get(self, key, default=None):
+        if key in ('start', 'end'):
+            return self._time_dict(getattr(self, key))
+        if key == 'transparency':
+            return 'transparent' if self.transparent else default
+        if key in ('id', 'etag', 'summary', 'location', 'status'):
+            value = getattr(self, key)
+            return default if value is None else value
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __repr__(self):
+        return f"CompactEvent(id={self.id!r}, start={self.start}, end={self.end}, summary={self.summary!r})"
+
+
+def parse_events(items):
+    """
+    Parse a list of API event resources.
+
+    Args:
+        items (list): Event resources (already-parsed events are passed through)
+
+    Returns:
+        list: CompactEvent objects; items without a start time are skipped
+    """
+    events = map(CompactEvent.from_api, items)
+    return [event for event in events if event is not None]
+
+
+def _sample_event(i):
+    """A realistic event resource as returned by events().list."""
+    start = datetime(2026, 3, 2, 9, tzinfo=timezone(timedelta(hours=-5))) + timedelta(minutes=30 * i)
+    return {
+        'kind': 'calendar#event',
+        'etag': f'"33{i:011d}000"',
+        'id': f'e{i:08d}abcdefghij',
+        'status': 'confirmed',
+        'htmlLink': f'https://www.google.com/calendar/event?eid=ZTA{i:08d}',
+        'created': '2026-01-10T12:00:00.000Z',
+        'updated': '2026-01-11T08:30:00.000Z',
+        'summary': ['Standup', '1:1', 'Design review', 'Lunch', 'Focus time'][i % 5],
+        'description': 'Agenda:\n- updates\n- blockers\n' * 3,
+        'location': ['Room 4A', 'Zoom', '', 'Cafe', 'Room 2B'][i % 5],
+        'creator': {'email': 'organizer@example.com', 'self': True},
+        'organizer': {'email': 'organizer@example.com', 'self': True},
+        'start': {'dateTime': start.isoformat(), 'timeZone': 'America/New_York'},
+        'end': {'dateTime': (start + timedelta(minutes=30)).isoformat(), 'timeZone': 'America/New_York'},
+        'iCalUID': f'e{i:08d}@google.com',
+        'sequence': 0,
+        'attendees': [{'email': f'person{j}@example.com', 'responseStatus': 'accepted'} for j in range(4)],
+        'reminders': {'useDefault': True},
+        'eventType': 'default',
+    }
+
+
+def _measure(build):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    objects = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return objects, size
+
+
+def _benchmark(n_events=20000):
+    """Compare bytes per event for raw API dicts and CompactEvent."""
+    payload = json.dumps({'items': [_sample_event(i) for i in range(n_events)]})
+
+    raw, raw_bytes = _measure(lambda: json.loads(payload)['items'])
+    started = time.perf_counter()
+    compact, compact_bytes = _measure(lambda: parse_events(raw))
+    parse_seconds = time.perf_counter() - started
+
+    print(f"{n_events} events")
+    print(f"  raw API dicts: {raw_bytes / n_events:8.0f} bytes/event")
+    print(f"  CompactEvent:  {compact_bytes / n_events:8.0f} bytes/event ({raw_bytes / max(compact_bytes, 1):.1f}x smaller)")
+    print(f"  parse cost:    {parse_seconds / n_events * 1e6:8.1f} us/event")
+    return raw, compact
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -0,0 +1,397 @@
+"""
+Shared OAuth credential store for ScheduleAI.
+
+Credentials live in the UserToken table as their authorized-user JSON fields
+(token, refresh token, expiry, scopes) instead of per-user pickle files.
+Lookups are served from an in-memory read-through LRU cache, and refreshes
+are serialized per user so concurrent requests do not race on the same token.
+"""
+
+import argparse
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+import hashlib
+import json
+import os
+from pathlib import Path
+import pickle
+import threading
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from db import DBSession, token_update_values
+from metrics import DB_QUERY_SECONDS, TOKEN_REFRESH_SECONDS, timed
+from models import UserToken
+
+TOKEN_URI = "https://oauth2.googleapis.com/token"
+CACHE_SIZE = int(os.environ.get("CREDENTIAL_CACHE_SIZE", "10000"))
+
+
+def legacy_token_hash(user_id):
+    """
+    Get the hash used to name a user's legacy token_<hash>.pickle file.
+
+    Args:
+        user_id (str): Unique user identifier
+
+    Returns:
+        str: 16-character hex digest
+    """
+    return hashlib.sha256(user_id.encode()).hexdigest()[:16]
+
+
+def credentials_from_row(row, client_id, client_secret, token_uri=TOKEN_URI):
+    """
+    Build Credentials from a UserToken row.
+
+    Args:
+        row (UserToken): Stored token row
+        client_id (str): OAuth client id used to refresh the token
+        client_secret (str): OAuth client secret
+        token_uri (str, optional): OAuth token endpoint
+
+    Returns:
+        Credentials: Stored credentials (possibly expired)
+    """
+    # Not from_authorized_user_info(): it always replaces token_uri with Google's endpoint
+    return Credentials(
+        token=row.access_token,
+        refresh_token=row.refresh_token or None,
+        token_uri=token_uri,
+        client_id=client_id,
+        client_secret=client_secret,
+        scopes=row.scopes.split(",") if row.scopes else None,
+        expiry=row.token_expiry or datetime.utcnow(),
+    )
+
+
+def apply_credentials(row, creds):
+    """
+    Copy credentials onto a UserToken row, keeping a stored refresh token if creds has none.
+
+    Args:
+        row (UserToken): Row to update
+        creds (Credentials): Credentials to store
+    """
+    row.access_token = creds.token or ""
+    row.refresh_token = creds.refresh_token or row.refresh_token or ""
+    # Unknown expiry: mark as due so the refresher picks it up
+    row.token_expiry = creds.expiry or datetime.utcnow()
+    row.scopes = ",".join(creds.scopes or [])
+
+
+class CredentialStore:
+    """UserToken-backed credential store with a read-through cache and per-user locks."""
+
+    def __init__(self, client_id, client_secret, session_factory=DBSession, token_uri=TOKEN_URI,
+                 write_queue=None, cache_size=CACHE_SIZE):
+        """
+        Initialize the store.
+
+        Args:
+            client_id (str): OAuth client id used to refresh stored tokens
+            client_secret (str): OAuth client secret
+            session_factory (callable, optional): SQLAlchemy session factory. Defaults to db.DBSession.
+            token_uri (str, optional): OAuth token endpoint
+            write_queue (TokenWriteQueue, optional): Batch refreshed-token writes through
+                this queue instead of committing each one inline
+            cache_size (int, optional): Users whose credentials are kept in memory
+        """
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.session_factory = session_factory
+        self.token_uri = token_uri
+        self.write_queue = write_queue
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # user_id -> Credentials, least recently used first
+        self._locks = {}  # user_id -> [threading.Lock, holders and waiters]; only while in use
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_client_secrets_file(cls, path, **kwargs):
+        """
+        Create a store using the client from a Google client secrets file.
+
+        Args:
+            path (str): Path to credentials.json ('web' or 'installed' client)
+            **kwargs: Passed to the constructor
+
+        Returns:
+            CredentialStore: New store
+        """
+        with open(path, "r") as f:
+            secrets = json.load(f)
+        client = secrets.get("web") or secrets.get("installed")
+        return cls(client["client_id"], client["client_secret"], **kwargs)
+
+    @contextmanager
+    def refresh_lock(self, user_id):
+        """
+        Hold the lock that serializes refreshes and writes for a user. The lock
+        is dropped once nobody holds or waits for it.
+
+        Args:
+            user_id (str): Unique user identifier
+        """
+        with self._lock:
+            entry = self._locks.get(user_id)
+            if entry is None:
+                entry = self._locks[user_id] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[user_id]
+
+    def _cached(self, user_id):
+        with self._lock:
+            creds = self._cache.get(user_id)
+            if creds is not None:
+                self._cache.move_to_end(user_id)
+            return creds
+
+    def _remember(self, user_id, creds):
+        with self._lock:
+            self._cache[user_id] = creds
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _load(self, user_id):
+        """Read a user's credentials from the database, bypassing the cache."""
+        session = self.session_factory()
+        try:
+            with timed(DB_QUERY_SECONDS, 'token_load', operation='token_load'):
+                row = session.get(UserToken, user_id)
+            if row is None:
+                return None
+            return credentials_from_row(row, self.client_id, self.client_secret, self.token_uri)
+        finally:
+            session.close()
+
+    def get(self, user_id):
+        """
+        Get a user's credentials, from memory when cached.
+
+        Args:
+            user_id (str): Unique user identifier
+
+        Returns:
+            Credentials or None: Stored credentials (possibly expired)
+        """
+        creds = self._cached(user_id)
+        if creds is not None:
+            return creds
+
+        creds = self._load(user_id)
+        if creds is not None:
+            self._remember(user_id, creds)
+        return creds
+
+    def get_many(self, user_ids):
+        """
+        Get several users' credentials, loading every uncached one in a single query.
+
+        Args:
+            user_ids (iterable): Unique user identifiers
+
+        Returns:
+            dict: user_id -> Credentials (possibly expired) for users that have them
+        """
+        found = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            creds = self._cached(user_id)
+            if creds is not None:
+                found[user_id] = creds
+            else:
+                missing.append(user_id)
+
+        if missing:
+            session = self.session_factory()
+            try:
+                with timed(DB_QUERY_SECONDS, 'token_load_many', operation='token_load_many'):
+                    rows = session.query(UserToken).filter(UserToken.user_id.in_(missing)).all()
+                for row in rows:
+                    creds = credentials_from_row(row, self.client_id, self.client_secret, self.token_uri)
+                    found[row.user_id] = creds
+                    self._remember(row.user_id, creds)
+            finally:
+                session.close()
+        return found
+
+    def get_valid(self, user_id):
+        """
+        Get a user's credentials, refreshing them under the user's lock if expired.
+
+        Before refreshing, the row is re-read in case another process (e.g. the
+        background TokenRefresher) already stored a fresh token.
+
+        Args:
+            user_id (str): Unique user identifier
+
+        Returns:
+            tuple: (credentials, error_message); (None, None) if the user has no credentials
+        """
+        creds = self.get(user_id)
+        if creds is None or creds.valid:
+            return creds, None
+
+        with self.refresh_lock(user_id):
+            # Another thread may have refreshed while we waited
+            creds = self._cached(user_id) or creds
+            if creds.valid:
+                return creds, None
+
+            reloaded = self._load(user_id)
+            if reloaded is not None and reloaded.valid:
+                self._remember(user_id, reloaded)
+                return reloaded, None
+
+            if not creds.refresh_token:
+                return None, f"Stored credentials for user {user_id} expired and cannot be refreshed"
+
+            try:
+                with timed(TOKEN_REFRESH_SECONDS, 'token_refresh', source='inline'):
+                    creds.refresh(Request())
+            except Exception as e:
+                return None, f"Failed to refresh credentials for user {user_id}: {str(e)}"
+
+            if self.write_queue is not None:
+                # The row exists (we loaded it); serve the new token now and persist it with the next batch
+                self._remember(user_id, creds)
+                self.write_queue.put(token_update_values(user_id, creds))
+            else:
+                self._write(user_id, creds)
+            return creds, None
+
+    def save(self, user_id, creds):
+        """
+        Store credentials for a user.
+
+        Args:
+            user_id (str): Unique user identifier
+            creds (Credentials): Credentials to store
+        """
+        with self.refresh_lock(user_id):
+            self._write(user_id, creds)
+
+    def _write(self, user_id, creds):
+        session = self.session_factory()
+        try:
+            with timed(DB_QUERY_SECONDS, 'token_write', operation='token_write'):
+                row = session.get(UserToken, user_id) or UserToken(user_id=user_id)
+                apply_credentials(row, creds)
+                session.add(row)
+                session.commit()
+        finally:
+            session.close()
+        self._remember(user_id, creds)
+
+    def delete(self, user_id):
+        """
+        Remove a user's stored credentials.
+
+        Args:
+            user_id (str): Unique user identifier
+
+        Returns:
+            bool: True if a row was deleted
+        """
+        with self.refresh_lock(user_id):
+            self.invalidate(user_id)
+            session = self.session_factory()
+            try:
+                deleted = session.query(UserToken).filter_by(user_id=user_id).delete()
+                session.commit()
+                return bool(deleted)
+            finally:
+                session.close()
+
+    def invalidate(self, user_id=None):
+        """
+        Drop cached credentials so the next lookup re-reads the database.
+
+        Args:
+            user_id (str, optional): User to drop. Defaults to everyone.
+        """
+        with self._lock:
+            if user_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(user_id, None)
+
+
+def migrate_pickle_tokens(store, tokens_dir, user_ids, delete=False):
+    """
+    Import legacy token_<hash>.pickle files into a credential store.
+
+    Pickle files are named by a hash of the user id, so the ids to migrate
+    must be supplied; files that match none of them are reported. Stored
+    tokens are refreshed with the store's client, so tokens issued to a
+    different client (e.g. the old installed-app client) are refused rather
+    than stored and left to fail with unauthorized_client; those users have
+    to log in again.
+
+    Args:
+        store (CredentialStore): Destination store
+        tokens_dir (str): Directory holding token_<hash>.pickle files
+        user_ids (iterable): Known user identifiers
+        delete (bool, optional): Remove each pickle file after importing it
+
+    Returns:
+        dict: 'migrated' user ids, 'unmatched' file names and 'failed' messages
+    """
+    by_hash = {legacy_token_hash(user_id): user_id for user_id in user_ids}
+    report = {"migrated": [], "unmatched": [], "failed": []}
+
+    for path in sorted(Path(tokens_dir).glob("token_*.pickle")):
+        user_id = by_hash.get(path.stem[len("token_"):])
+        if user_id is None:
+            report["unmatched"].append(path.name)
+            continue
+        try:
+            with open(path, 'rb') as token:
+                creds = pickle.load(token)
+            issued_to = getattr(creds, 'client_id', None)
+            if issued_to != store.client_id:
+                report["failed"].append(
+                    f"{path.name} ({user_id}): issued to client {issued_to}, not {store.client_id}; "
+                    f"the user must log in again")
+                continue
+            store.save(user_id, creds)
+            if delete:
+                path.unlink()
+            report["migrated"].append(user_id)
+        except Exception as e:
+            report["failed"].append(f"{path.name} ({user_id}): {str(e)}")
+
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import legacy pickle tokens into the UserToken table.")
+    parser.add_argument("--tokens-dir", default="scheduler_agent_v1/user_tokens")
+    parser.add_argument("--client-secrets", default="credentials.json")
+    parser.add_argument("--users-file", help="File with one user id per line")
+    parser.add_argument("--delete", action="store_true", help="Delete pickle files once imported")
+    parser.add_argument("users", nargs="*", help="User ids to migrate")
+    args = parser.parse_args()
+
+    user_ids = list(args.users)
+    if args.users_file:
+        with open(args.users_file) as f:
+            user_ids += [line.strip() for line in f if line.strip()]
+
+    report = migrate_pickle_tokens(
+        CredentialStore.from_client_secrets_file(args.client_secrets),
+        args.tokens_dir, user_ids, delete=args.delete)
+    print(f"Migrated {len(report['migrated'])} users")
+    for name in report["unmatched"]:
+        print(f"  no user id for {name}")
+    for message in report["failed"]:
+        print(f"  failed: {message}")
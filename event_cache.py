@@ -0,0 +1,308 @@
+"""
+Shared in-process calendar event cache for ScheduleAI.
+Caches event lists per (user, calendar, time window) with a TTL, LRU eviction
+and coalescing of concurrent fetches for the same key.
+"""
+
+import asyncio
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL_SECONDS = float(os.environ.get("CALENDAR_CACHE_TTL", "300"))
+DEFAULT_MAX_ENTRIES = int(os.environ.get("CALENDAR_CACHE_MAX_ENTRIES", "1024"))
+
+
+def make_cache_key(user_id, calendar_id, start_date, end_date):
+    """
+    Build the cache key for an event window.
+
+    Args:
+        user_id (str): Unique user identifier
+        calendar_id (str): Calendar identifier, e.g. 'primary'
+        start_date (datetime): Start of the window
+        end_date (datetime): End of the window
+
+    Returns:
+        tuple: Hashable cache key
+    """
+    return (user_id, calendar_id, start_date.isoformat(), end_date.isoformat())
+
+
+class _InFlight:
+    """A fetch in progress that other callers for the same key wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = (None, None)
+
+
+class EventCache:
+    """Thread-safe TTL + LRU cache of calendar event lists."""
+
+    def __init__(self, ttl=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        Initialize the cache.
+
+        Args:
+            ttl (float): Seconds an entry stays fresh
+            max_entries (int): Maximum number of cached windows before LRU eviction
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, events)
+        self._in_flight = {}
+        self._async_in_flight = {}  # key -> asyncio.Task, for get_or_fetch_async()
+        # Invalidation stamps, so a fetch that raced an invalidate() is not cached;
+        # users without one share _floor, and the map is reset when it outgrows the cache
+        self._counter = itertools.count(1)
+        self._generations = {}  # user_id -> stamp of the last invalidation
+        self._floor = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    def generation(self, user_id):
+        """
+        Get a user's invalidation stamp; pass it to put() so events fetched
+        before an invalidate() are not cached.
+
+        Args:
+            user_id (str): Unique user identifier
+
+        Returns:
+            int: Current generation
+        """
+        with self._lock:
+            return self._generations.get(user_id, self._floor)
+
+    def get(self, key):
+        """
+        Return cached events for a key, or None if missing or expired.
+
+        Args:
+            key (tuple): Cache key from make_cache_key()
+
+        Returns:
+            list or None: Cached events
+        """
+        with self._lock:
+            return self._get_locked(key)
+
+    def lookup(self, key):
+        """
+        Like get(), but counted in the hit/miss stats and paired with the user's
+        generation, for callers that fetch misses themselves and put() them later.
+
+        Args:
+            key (tuple): Cache key from make_cache_key()
+
+        Returns:
+            tuple: (cached events or None, generation to pass to put())
+        """
+        with self._lock:
+            events = self._get_locked(key)
+            if events is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return events, self._generations.get(key[0], self._floor)
+
+    def _get_locked(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, events = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return events
+
+    def put(self, key, events, ttl=None, generation=None):
+        """
+        Store events for a key, evicting least recently used entries if full.
+
+        Args:
+            key (tuple): Cache key from make_cache_key()
+            events (list): Events to cache
+            ttl (float, optional): Seconds this entry stays fresh. Defaults to the cache TTL.
+            generation (int, optional): generation() taken before the fetch; the
+                entry is not stored if the user was invalidated since
+        """
+        with self._lock:
+            self._put_locked(key, events, ttl, generation)
+
+    def _put_locked(self, key, events, ttl=None, generation=None):
+        if generation is not None and generation != self._generations.get(key[0], self._floor):
+            return
+        if ttl is None:
+            ttl = self.ttl
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, events)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_fetch(self, key, fetch):
+        """
+        Return cached events or call fetch() once for all concurrent callers.
+
+        Only successful results (no error message) are cached; errors are
+        handed to every caller that waited on the same fetch.
+
+        Args:
+            key (tuple): Cache key from make_cache_key()
+            fetch (callable): Zero-argument callable returning (events, error_message)
+
+        Returns:
+            tuple: (events_list, error_message)
+        """
+        with self._lock:
+            events = self._get_locked(key)
+            if events is not None:
+                self.hits += 1
+                return events, None
+
+            in_flight = self._in_flight.get(key)
+            if in_flight is None:
+                self.misses += 1
+                in_flight = self._in_flight[key] = _InFlight()
+                generation = self._generations.get(key[0], self._floor)
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            in_flight.done.wait()
+            return in_flight.result
+
+        try:
+            in_flight.result = fetch()
+        except Exception as e:
+            in_flight.result = (None, f"Unexpected error: {str(e)}")
+        finally:
+            with self._lock:
+                events, error = in_flight.result
+                if error is None and events is not None:
+                    self._put_locked(key, events, generation=generation)
+                if self._in_flight.get(key) is in_flight:
+                    del self._in_flight[key]
+            in_flight.done.set()
+
+        return in_flight.result
+
+    async def get_or_fetch_async(self, key, fetch):
+        """
+        Async counterpart of get_or_fetch() that never blocks the event loop.
+
+        Concurrent coroutines for the same key await one fetch. Coalescing is per
+        event loop; threads using get_or_fetch() share the cached results.
+
+        Args:
+            key (tuple): Cache key from make_cache_key()
+            fetch (callable): Zero-argument coroutine function returning (events, error_message)
+
+        Returns:
+            tuple: (events_list, error_message)
+        """
+        with self._lock:
+            events = self._get_locked(key)
+            if events is not None:
+                self.hits += 1
+                return events, None
+
+            in_flight = self._async_in_flight.get(key)
+            if in_flight is not None and in_flight.get_loop() is asyncio.get_running_loop():
+                self.coalesced += 1
+            else:
+                self.misses += 1
+                generation = self._generations.get(key[0], self._floor)
+                in_flight = self._async_in_flight[key] = asyncio.get_running_loop().create_task(
+                    self._fill_async(key, fetch, generation))
+
+        # The fetch runs in its own task: a caller that is cancelled stops waiting
+        # without cancelling the fetch the other callers are waiting on
+        return await asyncio.shield(in_flight)
+
+    async def _fill_async(self, key, fetch, generation):
+        try:
+            result = await fetch()
+        except Exception as e:
+            result = (None, f"Unexpected error: {str(e)}")
+        finally:
+            with self._lock:
+                if self._async_in_flight.get(key) is asyncio.current_task():
+                    del self._async_in_flight[key]
+        events, error = result
+        if error is None and events is not None:
+            self.put(key, events, generation=generation)
+        return result
+
+    def invalidate(self, user_id=None, calendar_id=None):
+        """
+        Drop cached entries for a user (and optionally one calendar), or everything.
+
+        Args:
+            user_id (str, optional): User whose entries to drop. Defaults to all users.
+            calendar_id (str, optional): Restrict to this calendar
+
+        Returns:
+            int: Number of entries removed
+        """
+        with self._lock:
+            if user_id is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                self._in_flight.clear()
+                self._async_in_flight.clear()
+                self._generations.clear()
+                self._floor = next(self._counter)
+                return removed
+
+            if len(self._generations) >= self.max_entries:
+                # Raising the floor invalidates every in-flight fill, not just this user's
+                self._generations.clear()
+                self._floor = next(self._counter)
+            self._generations[user_id] = next(self._counter)
+
+            def matches(key):
+                return key[0] == user_id and (calendar_id is None or key[1] == calendar_id)
+
+            # Later callers must not join a fetch that started before the change
+            for in_flight in (self._in_flight, self._async_in_flight):
+                for key in [key for key in in_flight if matches(key)]:
+                    del in_flight[key]
+            stale = [key for key in self._entries if matches(key)]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def stats(self):
+        """
+        Get cache counters.
+
+        Returns:
+            dict: hits, misses, evictions, coalesced waits, current size and hit ratio
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "coalesced": self.coalesced,
+                "size": len(self._entries),
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Shared instance used by the calendar services
+default_cache = EventCache()
@@ -0,0 +1,428 @@
+"""
+Local fake of the Google Calendar events API for offline development and testing.
+
+Serves events().list with paging, time windows and sync tokens, so the calendar
+services can be pointed at it through CALENDAR_API_ENDPOINT. Watch channels
+are supported too: writes post push notifications to registered webhooks.
+It also stands in for Google's OAuth token, userinfo and JWKS endpoints
+(token_uri, userinfo_url, jwks_url), issuing tokens for codes from
+issue_code(); code exchanges return an RS256 ID token signed with a key
+generated per server.
+Like Google, it honors fields= masks and gzips responses for clients whose
+User-Agent contains "gzip".
+
+    server = FakeCalendarServer().start()
+    os.environ["CALENDAR_API_ENDPOINT"] = server.endpoint
+"""
+
+import base64
+from datetime import datetime, timezone
+import gzip
+import itertools
+import logging
+import threading
+import time
+import uuid
+from zoneinfo import ZoneInfo
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from flask import Flask, request, jsonify
+from google.auth import crypt, jwt
+import requests
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+
+def _event_bounds(event, tz=timezone.utc):
+    """Return (start, end) of an event as aware datetimes; all-day dates are midnights in tz."""
+    bounds = []
+    for field in ('start', 'end'):
+        value = event.get(field, event['start'])
+        if 'dateTime' in value:
+            parsed = datetime.fromisoformat(value['dateTime'].replace('Z', '+00:00'))
+        else:
+            parsed = datetime.fromisoformat(value['date'])
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=tz)
+        bounds.append(parsed)
+    return bounds
+
+
+def _parse_rfc3339(value):
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _parse_fields(spec):
+    """Parse a fields mask like "a,items(b,c)" into {'a': None, 'items': {'b': None, 'c': None}}."""
+    def parse(pos):
+        fields, name = {}, ''
+        while pos < len(spec):
+            char = spec[pos]
+            if char == '(':
+                fields[name.strip()], pos = parse(pos + 1)
+                name = None
+            elif char == ')':
+                break
+            elif char == ',':
+                if name:
+                    fields[name.strip()] = None
+                name = ''
+            else:
+                name = (name or '') + char
+            pos += 1
+        if name:
+            fields[name.strip()] = None
+        return fields, pos
+
+    return parse(0)[0]
+
+
+def _apply_fields(value, fields):
+    """Project a JSON value onto a parsed fields mask."""
+    if isinstance(value, list):
+        return [_apply_fields(item, fields) for item in value]
+    return {
+        key: value[key] if sub is None else _apply_fields(value[key], sub)
+        for key, sub in fields.items() if key in value
+    }
+
+
+class _KeepAliveHandler(WSGIRequestHandler):
+    # HTTP/1.1 lets pooled clients reuse connections, as they would with Google
+    protocol_version = "HTTP/1.1"
+
+
+class FakeCalendarServer:
+    """In-memory Calendar API stand-in running on a background thread."""
+
+    def __init__(self, host="127.0.0.1", port=0, page_size=250):
+        """
+        Initialize the fake server.
+
+        Args:
+            host (str, optional): Interface to bind. Defaults to 127.0.0.1.
+            port (int, optional): Port to bind; 0 picks a free port.
+            page_size (int, optional): Default page size when maxResults is absent
+        """
+        self.page_size = page_size
+        self.calendars = {}  # calendar_id -> {event_id: (version, event)}
+        self.channels = {}  # channel_id -> watch request body plus resourceId and calendar
+        self.time_zones = {}  # calendar_id -> IANA zone returned by calendars().get; defaults to UTC
+        self.auth_codes = {}  # authorization code -> email
+        self.access_tokens = {}  # access token -> email
+        self.refresh_tokens = {}  # refresh token -> email
+        self.signing_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.signing_key_id = uuid.uuid4().hex
+        self.request_count = 0
+        self.notifications_sent = 0
+        self._injected_errors = []  # (status, reason) returned by the next list requests
+        self._versions = itertools.count(1)
+        self._lock = threading.Lock()
+        self.app = self._create_app()
+        self._server = make_server(host, port, self.app, threaded=True, request_handler=_KeepAliveHandler)
+        self._thread = None
+
+    @property
+    def endpoint(self):
+        """Base URL to use as the Calendar API endpoint."""
+        return f"http://{self._server.host}:{self._server.port}/calendar/v3/"
+
+    @property
+    def token_uri(self):
+        """URL of the fake OAuth token endpoint."""
+        return f"http://{self._server.host}:{self._server.port}/token"
+
+    @property
+    def userinfo_url(self):
+        """URL of the fake userinfo endpoint."""
+        return f"http://{self._server.host}:{self._server.port}/oauth2/v2/userinfo"
+
+    @property
+    def jwks_url(self):
+        """URL of the fake ID-token signing keys (JWKS)."""
+        return f"http://{self._server.host}:{self._server.port}/oauth2/v3/certs"
+
+    @property
+    def issuer(self):
+        """'iss' of the ID tokens this server signs, as Google's."""
+        return "https://accounts.google.com"
+
+    def jwks(self):
+        """
+        Get the public signing key as a JWKS key set.
+
+        Returns:
+            dict: {"keys": [RSA JWK]}
+        """
+        def b64(number):
+            raw = number.to_bytes((number.bit_length() + 7) // 8, "big")
+            return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+        numbers = self.signing_key.public_key().public_numbers()
+        return {"keys": [{"kty": "RSA", "alg": "RS256", "use": "sig", "kid": self.signing_key_id,
+                          "n": b64(numbers.n), "e": b64(numbers.e)}]}
+
+    def id_token(self, email, audience, lifetime=3600, **claims):
+        """
+        Sign an ID token as Google would return from a code exchange.
+
+        Args:
+            email (str): User the token identifies
+            audience (str): OAuth client id
+            lifetime (int, optional): Seconds until the token expires
+            **claims: Extra or overriding claims
+
+        Returns:
+            str: Compact RS256 JWT
+        """
+        now = int(time.time())
+        pem = self.signing_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                             serialization.NoEncryption())
+        signer = crypt.RSASigner.from_string(pem, key_id=self.signing_key_id)
+        payload = {"iss": self.issuer, "aud": audience, "sub": str(abs(hash(email))), "email": email,
+                   "email_verified": True, "iat": now, "exp": now + lifetime}
+        payload.update(claims)
+        return jwt.encode(signer, payload).decode("ascii")
+
+    def issue_code(self, email):
+        """
+        Create an authorization code, as Google would after the consent screen.
+
+        Args:
+            email (str): Account the code is for
+
+        Returns:
+            str: Code to pass to the OAuth callback
+        """
+        code = uuid.uuid4().hex
+        with self._lock:
+            self.auth_codes[code] = email
+        return code
+
+    def start(self):
+        """Serve requests on a daemon thread and return self."""
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Shut the server down."""
+        self._server.shutdown()
+
+    def put_event(self, event, calendar_id='primary'):
+        """
+        Insert or replace an event, bumping its version.
+
+        Args:
+            event (dict): Event resource; 'id' and 'etag' are filled in if missing
+            calendar_id (str, optional): Calendar to write. Defaults to 'primary'.
+
+        Returns:
+            dict: The stored event
+        """
+        with self._lock:
+            version = next(self._versions)
+            event = dict(event)
+            event.setdefault('id', uuid.uuid4().hex)
+            event['etag'] = f'"{version}"'
+            event.setdefault('status', 'confirmed')
+            self.calendars.setdefault(calendar_id, {})[event['id']] = (version, event)
+        self.notify(calendar_id)
+        return event
+
+    def delete_event(self, event_id, calendar_id='primary'):
+        """
+        Mark an event cancelled so it shows up as a tombstone in deltas.
+
+        Args:
+            event_id (str): Event to delete
+            calendar_id (str, optional): Calendar to write. Defaults to 'primary'.
+        """
+        with self._lock:
+            version = next(self._versions)
+            _, event = self.calendars[calendar_id][event_id]
+            tombstone = {'id': event_id, 'status': 'cancelled', 'etag': f'"{version}"',
+                         'start': event['start'], 'end': event.get('end', event['start'])}
+            self.calendars[calendar_id][event_id] = (version, tombstone)
+        self.notify(calendar_id)
+
+    def notify(self, calendar_id='primary', state='exists'):
+        """
+        Post a push notification to every channel watching a calendar.
+
+        Args:
+            calendar_id (str, optional): Changed calendar. Defaults to 'primary'.
+            state (str, optional): X-Goog-Resource-State value. Defaults to 'exists'.
+
+        Returns:
+            list: HTTP status per channel (None when the webhook was unreachable)
+        """
+        with self._lock:
+            channels = [dict(channel) for channel in self.channels.values() if channel['calendarId'] == calendar_id]
+            for channel in self.channels.values():
+                if channel['calendarId'] == calendar_id:
+                    channel['messageNumber'] += 1
+
+        statuses = []
+        for channel in channels:
+            headers = {
+                'X-Goog-Channel-ID': channel['id'],
+                'X-Goog-Channel-Token': channel.get('token', ''),
+                'X-Goog-Resource-ID': channel['resourceId'],
+                'X-Goog-Resource-State': state,
+                'X-Goog-Message-Number': str(channel['messageNumber'] + 1),
+            }
+            try:
+                statuses.append(requests.post(channel['address'], headers=headers, timeout=5).status_code)
+            except requests.RequestException:
+                statuses.append(None)
+            self.notifications_sent += 1
+        return statuses
+
+    def inject_errors(self, count, status=429, reason='rateLimitExceeded'):
+        """
+        Make the next `count` list requests fail, e.g. to exercise rate-limit backoff.
+
+        Args:
+            count (int): Requests to fail
+            status (int, optional): HTTP status. Defaults to 429.
+            reason (str, optional): Error reason. Defaults to 'rateLimitExceeded'.
+        """
+        with self._lock:
+            self._injected_errors.extend([(status, reason)] * count)
+
+    def _create_app(self):
+        app = Flask(__name__)
+
+        @app.route("/calendar/v3/calendars/<calendar_id>/events")
+        def list_events(calendar_id):
+            with self._lock:
+                self.request_count += 1
+                injected = self._injected_errors.pop(0) if self._injected_errors else None
+                stored = list(self.calendars.get(calendar_id, {}).values())
+                current_version = next(self._versions)
+
+            if injected is not None:
+                status, reason = injected
+                return jsonify({"error": {"code": status, "message": reason,
+                                          "errors": [{"reason": reason, "domain": "usageLimits"}]}}), status
+
+            sync_token = request.args.get('syncToken')
+            if sync_token is not None:
+                if not sync_token.isdigit() or int(sync_token) >= current_version:
+                    return jsonify({"error": {"code": 410, "message": "Sync token is no longer valid"}}), 410
+                since = int(sync_token)
+                items = [event for version, event in stored if version > since]
+            else:
+                items = [event for _, event in stored if event.get('status') != 'cancelled']
+                # As Google does, all-day events cover their dates in the calendar's zone
+                tz = ZoneInfo(self.time_zones.get(calendar_id, "UTC"))
+                if 'timeMin' in request.args:
+                    time_min = _parse_rfc3339(request.args['timeMin'])
+                    items = [e for e in items if _event_bounds(e, tz)[1] > time_min]
+                if 'timeMax' in request.args:
+                    time_max = _parse_rfc3339(request.args['timeMax'])
+                    items = [e for e in items if _event_bounds(e, tz)[0] < time_max]
+
+            items.sort(key=lambda e: _event_bounds(e)[0])
+
+            offset = int(request.args.get('pageToken', 0))
+            limit = int(request.args.get('maxResults', self.page_size))
+            page = items[offset:offset + limit]
+
+            body = {"kind": "calendar#events", "timeZone": self.time_zones.get(calendar_id, "UTC"), "items": page}
+            if offset + limit < len(items):
+                body["nextPageToken"] = str(offset + limit)
+            else:
+                body["nextSyncToken"] = str(current_version)
+            if request.args.get('fields'):
+                body = _apply_fields(body, _parse_fields(request.args['fields']))
+            return jsonify(body)
+
+        @app.route("/token", methods=["POST"])
+        def token():
+            with self._lock:
+                self.request_count += 1
+                if request.form.get('grant_type') == 'authorization_code':
+                    email = self.auth_codes.pop(request.form.get('code'), None)
+                else:
+                    email = self.refresh_tokens.get(request.form.get('refresh_token'))
+                if email is None:
+                    return jsonify({"error": "invalid_grant"}), 400
+                body = {"access_token": uuid.uuid4().hex, "expires_in": 3600, "token_type": "Bearer",
+                        "scope": "https://www.googleapis.com/auth/calendar.readonly openid email"}
+                self.access_tokens[body['access_token']] = email
+                if request.form.get('grant_type') == 'authorization_code':
+                    body['refresh_token'] = uuid.uuid4().hex
+                    self.refresh_tokens[body['refresh_token']] = email
+            if request.form.get('grant_type') == 'authorization_code':
+                # Clients authenticate in the form or with HTTP Basic, as Google allows
+                client_id = request.form.get('client_id') or (request.authorization.username if request.authorization else None)
+                body['id_token'] = self.id_token(email, client_id)
+            return jsonify(body)
+
+        @app.route("/oauth2/v3/certs")
+        def certs():
+            with self._lock:
+                self.request_count += 1
+            response = jsonify(self.jwks())
+            response.headers['Cache-Control'] = 'public, max-age=21600'
+            return response
+
+        @app.route("/oauth2/v2/userinfo")
+        def userinfo():
+            token = request.headers.get('Authorization', '').removeprefix('Bearer ')
+            with self._lock:
+                self.request_count += 1
+                email = self.access_tokens.get(token)
+            if email is None:
+                return jsonify({"error": {"code": 401, "message": "Invalid Credentials"}}), 401
+            return jsonify({"id": str(abs(hash(email))), "email": email, "verified_email": True})
+
+        @app.route("/calendar/v3/calendars/<calendar_id>")
+        def get_calendar(calendar_id):
+            with self._lock:
+                self.request_count += 1
+            body = {"kind": "calendar#calendar", "id": calendar_id,
+                    "timeZone": self.time_zones.get(calendar_id, "UTC")}
+            if request.args.get('fields'):
+                body = _apply_fields(body, _parse_fields(request.args['fields']))
+            return jsonify(body)
+
+        @app.route("/calendar/v3/calendars/<calendar_id>/events/watch", methods=["POST"])
+        def watch_events(calendar_id):
+            body = request.get_json()
+            ttl = int(body.get('params', {}).get('ttl', 604800))
+            channel = dict(body, calendarId=calendar_id, resourceId=uuid.uuid4().hex, messageNumber=0,
+                           expiration=str(int((time.time() + ttl) * 1000)))
+            with self._lock:
+                self.request_count += 1
+                self.channels[body['id']] = channel
+            return jsonify({"kind": "api#channel", "id": body['id'], "resourceId": channel['resourceId'],
+                            "expiration": channel['expiration']})
+
+        @app.route("/calendar/v3/channels/stop", methods=["POST"])
+        def stop_channel():
+            body = request.get_json()
+            with self._lock:
+                self.request_count += 1
+                self.channels.pop(body['id'], None)
+            return "", 204
+
+        @app.after_request
+        def compress(response):
+            if ('gzip' in request.headers.get('Accept-Encoding', '')
+                    and 'gzip' in request.headers.get('User-Agent', '')
+                    and response.status_code == 200 and response.mimetype == 'application/json'):
+                response.set_data(gzip.compress(response.get_data()))
+                response.headers['Content-Encoding'] = 'gzip'
+            return response
+
+        return app
+
+
+if __name__ == "__main__":
+    server = FakeCalendarServer(port=8089)
+    print(f"Fake Calendar API listening on {server.endpoint}")
+    server._server.serve_forever()
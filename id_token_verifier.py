@@ -0,0 +1,214 @@
+"""
+Local Google ID-token verification for ScheduleAI.
+
+The OAuth callback learns the user's email from the ID token that comes
+back with the openid scope instead of calling the userinfo endpoint. The
+token's RS256 signature is checked against Google's JWKS key set, which is
+cached for the max-age Google sends and refetched early only when a token
+names a key id we have not seen (key rotation), at most once a minute.
+
+Everything network-facing is injectable (fetch, clock), so verification can
+be exercised with locally generated keys.
+"""
+
+import base64
+import os
+import re
+import threading
+import time
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicNumbers
+from google.auth import exceptions as auth_exceptions
+from google.auth import jwt
+import requests
+
+GOOGLE_JWKS_URL = os.environ.get("GOOGLE_JWKS_URL", "https://www.googleapis.com/oauth2/v3/certs")
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+DEFAULT_MAX_AGE_SECONDS = 3600  # when the key response has no Cache-Control max-age
+MIN_REFRESH_INTERVAL_SECONDS = 60  # unknown key ids may not refetch more often than this
+CLOCK_SKEW_SECONDS = 60
+
+
+def _b64_int(value):
+    return int.from_bytes(base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)), "big")
+
+
+def jwk_to_pem(jwk):
+    """
+    Convert an RSA JSON Web Key to a PEM public key.
+
+    Args:
+        jwk (dict): Key with 'n' and 'e' (base64url)
+
+    Returns:
+        bytes: PEM-encoded public key
+    """
+    public_key = RSAPublicNumbers(_b64_int(jwk["e"]), _b64_int(jwk["n"])).public_key()
+    return public_key.public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+
+
+def fetch_jwks(url):
+    """
+    Download a JWKS key set.
+
+    Args:
+        url (str): JWKS URL
+
+    Returns:
+        tuple: (JWKS dict, max-age seconds from Cache-Control or None)
+
+    Raises:
+        requests.RequestException: When the keys cannot be downloaded
+    """
+    response = requests.get(url, timeout=10)
+    response.raise_for_status()
+    match = re.search(r"max-age=(\d+)", response.headers.get("Cache-Control", ""))
+    return response.json(), int(match.group(1)) if match else None
+
+
+class JWKSCache:
+    """Thread-safe cache of a JWKS key set as PEM public keys by key id."""
+
+    def __init__(self, url=GOOGLE_JWKS_URL, fetch=fetch_jwks, default_max_age=DEFAULT_MAX_AGE_SECONDS,
+                 min_refresh_interval=MIN_REFRESH_INTERVAL_SECONDS, clock=time.monotonic):
+        """
+        Initialize the cache.
+
+        Args:
+            url (str, optional): JWKS URL. Defaults to GOOGLE_JWKS_URL.
+            fetch (callable, optional): fetch(url) -> (jwks, max_age or None)
+            default_max_age (float, optional): Seconds to keep keys without a max-age
+            min_refresh_interval (float, optional): Minimum seconds between refetches
+                triggered by unknown key ids
+            clock (callable, optional): Monotonic clock
+        """
+        self.url = url
+        self.fetch = fetch
+        self.default_max_age = default_max_age
+        self.min_refresh_interval = min_refresh_interval
+        self.clock = clock
+        self._keys = {}  # kid -> PEM bytes
+        self._expires_at = 0.0
+        self._fetched_at = None
+        self._lock = threading.Lock()
+        self.refreshes = 0
+
+    def refresh(self):
+        """
+        Refetch the key set now.
+
+        Returns:
+            tuple: (success, error_message)
+        """
+        with self._lock:
+            return self._refresh_locked()
+
+    def _refresh_locked(self):
+        try:
+            jwks, max_age = self.fetch(self.url)
+            keys = {
+                jwk["kid"]: jwk_to_pem(jwk)
+                for jwk in jwks.get("keys", [])
+                if jwk.get("kty") == "RSA" and jwk.get("kid")
+            }
+        except Exception as e:
+            # Keep serving the keys we have; retry after min_refresh_interval
+            self._fetched_at = self.clock()
+            return False, f"Failed to fetch signing keys from {self.url}: {str(e)}"
+
+        now = self.clock()
+        self._keys = keys
+        self._fetched_at = now
+        self._expires_at = now + (max_age if max_age is not None else self.default_max_age)
+        self.refreshes += 1
+        return True, None
+
+    def keys(self, kid=None):
+        """
+        Get the current keys, refetching when stale or when kid is unknown.
+
+        Args:
+            kid (str, optional): Key id the caller needs
+
+        Returns:
+            tuple: (dict kid -> PEM bytes, error_message of a failed refetch or None)
+        """
+        with self._lock:
+            now = self.clock()
+            stale = now >= self._expires_at
+            rotated = (
+                kid is not None and kid not in self._keys
+                and (self._fetched_at is None or now - self._fetched_at >= self.min_refresh_interval)
+            )
+            error = None
+            if stale or rotated:
+                _, error = self._refresh_locked()
+            return self._keys, error
+
+
+class IDTokenVerifier:
+    """Verifies Google ID tokens issued to one OAuth client."""
+
+    def __init__(self, audience, jwks=None, issuers=GOOGLE_ISSUERS, clock_skew=CLOCK_SKEW_SECONDS):
+        """
+        Initialize the verifier.
+
+        Args:
+            audience (str): OAuth client id the tokens must be issued to
+            jwks (JWKSCache, optional): Signing keys. Defaults to Google's.
+            issuers (iterable, optional): Accepted 'iss' values
+            clock_skew (int, optional): Seconds of tolerance on iat/exp
+        """
+        self.audience = audience
+        self.jwks = jwks or JWKSCache()
+        self.issuers = tuple(issuers)
+        self.clock_skew = clock_skew
+
+    def verify(self, id_token):
+        """
+        Check an ID token's signature, issuer, audience and lifetime.
+
+        Args:
+            id_token (str): Compact JWT
+
+        Returns:
+            tuple: (claims dict, error_message)
+        """
+        try:
+            header = jwt.decode_header(id_token)
+        except Exception as e:
+            return None, f"Malformed ID token: {str(e)}"
+
+        kid = header.get("kid")
+        keys, fetch_error = self.jwks.keys(kid)
+        if kid not in keys:
+            return None, fetch_error or f"ID token signed with unknown key {kid!r}"
+
+        try:
+            claims = jwt.decode(id_token, certs={kid: keys[kid]}, audience=self.audience,
+                                clock_skew_in_seconds=self.clock_skew)
+        except (ValueError, auth_exceptions.GoogleAuthError) as e:
+            return None, f"Invalid ID token: {str(e)}"
+
+        if claims.get("iss") not in self.issuers:
+            return None, f"Invalid ID token: unexpected issuer {claims.get('iss')!r}"
+        return claims, None
+
+    def verify_email(self, id_token):
+        """
+        Get the verified email address an ID token was issued for.
+
+        Args:
+            id_token (str): Compact JWT
+
+        Returns:
+            tuple: (email, error_message)
+        """
+        claims, error = self.verify(id_token)
+        if error:
+            return None, error
+        if not claims.get("email"):
+            return None, "ID token has no email claim; is the email scope granted?"
+        if claims.get("email_verified") is False:
+            return None, f"Email {claims['email']} is not verified"
+        return claims["email"], None
@@ -0,0 +1,277 @@
+"""
+Prometheus-style metrics for ScheduleAI.
+
+A small in-process registry of counters, gauges and histograms rendered in
+the Prometheus text exposition format (version 0.0.4), so the web services
+can serve /metrics without extra dependencies. The metrics below are
+recorded by the shared layers (credential stores, calendar_api, the async
+client), so MultiUserCalendarService and the HTTP services report under
+the same names.
+"""
+
+from bisect import bisect_left
+from contextlib import contextmanager
+import math
+import threading
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds; from a cached DB read up to a slow, backed-off API call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    """Base for labelled metrics; one series per distinct label values tuple."""
+
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._series = {}  # label values tuple -> series state
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        """
+        Render this metric in the text exposition format.
+
+        Returns:
+            list: Lines, starting with HELP and TYPE
+        """
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted(self._series.items())
+            lines.extend(self._render_series(series))
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        """
+        Add to the counter.
+
+        Args:
+            amount (float, optional): Non-negative increment. Defaults to 1.
+            **labels: Value for each label name
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels):
+        """Get the current count for a label set (0 if never incremented)."""
+        with self._lock:
+            return self._series.get(self._key(labels), 0)
+
+    def _render_series(self, series):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in series]
+
+
+class Gauge(Counter):
+    """Value that goes up and down, e.g. requests in flight."""
+
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        """Subtract from the gauge."""
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        """Set the gauge."""
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        """Increment for the duration of a block."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets, with sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        """
+        Record one observation.
+
+        Args:
+            value (float): Observed value, e.g. seconds
+            **labels: Value for each label name
+        """
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket (non-cumulative) counts plus +Inf, then sum
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, **labels):
+        """Get the number of observations for a label set."""
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return sum(series[0]) if series else 0
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a block in seconds, whether or not it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_series(self, series):
+        lines = []
+        for key, (counts, total) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        """Get or create a counter."""
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        """Get or create a gauge."""
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """Get or create a histogram."""
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self):
+        """
+        Render every metric in the text exposition format.
+
+        Returns:
+            str: Exposition text
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+default_registry = MetricsRegistry()
+
+# Shared metric names; record through these rather than creating new ones per module
+TOKEN_REFRESH_SECONDS = default_registry.histogram(
+    "schedulai_token_refresh_seconds", "OAuth access-token refresh latency.", ("source",))
+DB_QUERY_SECONDS = default_registry.histogram(
+    "schedulai_db_query_seconds", "Token database operation latency.", ("operation",))
+CALENDAR_BUILD_SECONDS = default_registry.histogram(
+    "schedulai_calendar_build_seconds", "Calendar API service build() latency.")
+CALENDAR_REQUEST_SECONDS = default_registry.histogram(
+    "schedulai_calendar_request_seconds", "Calendar API request latency, including pacing and retries.",
+    ("method",))
+CALENDAR_REQUESTS_IN_FLIGHT = default_registry.gauge(
+    "schedulai_calendar_requests_in_flight", "Calendar API requests currently running.")
+EVENTS_FETCH_SECONDS = default_registry.histogram(
+    "schedulai_events_fetch_seconds", "MultiUserCalendarService event fetch latency on cache misses, "
+    "including auth and backend reads.", ("mode",))
+HTTP_REQUEST_SECONDS = default_registry.histogram(
+    "schedulai_http_request_seconds", "HTTP request latency by route.", ("endpoint", "method", "status"))
+HTTP_REQUESTS_IN_FLIGHT = default_registry.gauge(
+    "schedulai_http_requests_in_flight", "HTTP requests currently being served.", ("endpoint",))
+ERRORS = default_registry.counter(
+    "schedulai_errors_total", "Failures by operation and error type.", ("operation", "error"))
+
+
+def record_error(operation, error):
+    """
+    Count a failure.
+
+    Args:
+        operation (str): What failed, e.g. 'token_refresh' or 'events.list'
+        error (Exception or str): The exception (counted by class name) or an error type
+    """
+    ERRORS.inc(operation=operation, error=error if isinstance(error, str) else type(error).__name__)
+
+
+@contextmanager
+def timed(histogram, operation, /, **labels):
+    """
+    Observe a block's duration and count the exception type if it raises.
+
+    Args:
+        histogram (Histogram): Where to record the duration
+        operation (str): Operation name for the error counter
+        **labels: Histogram labels
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        record_error(operation, e)
+        raise
+    finally:
+        histogram.observe(time.perf_counter() - started, **labels)
@@ -1,5 +1,5 @@
 # models.py
-from sqlalchemy import Column, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Index
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -10,5 +10,47 @@ class UserToken(Base):
     user_id = Column(String, primary_key=True)  # Google email
     access_token = Column(String, nullable=False)
     refresh_token = Column(String, nullable=False)
-    token_expiry = Column(DateTime, nullable=False)
+    token_expiry = Column(DateTime, nullable=False, index=True)  # scanned by the background refresher
     scopes = Column(String)  # comma-separated list
+    timezone = Column(String)  # IANA zone of the primary calendar, e.g. 'Europe/Berlin'; NULL until looked up
+
+class CalendarEvent(Base):
+    __tablename__ = 'calendar_events'
+    __table_args__ = (
+        Index('ix_calendar_events_user_start', 'user_id', 'start_time'),
+    )
+
+    user_id = Column(String, primary_key=True)
+    calendar_id = Column(String, primary_key=True)
+    event_id = Column(String, primary_key=True)
+    start_time = Column(DateTime, nullable=False)  # naive UTC
+    end_time = Column(DateTime, nullable=False)  # naive UTC
+    all_day = Column(Boolean, default=False)
+    etag = Column(String)
+    payload = Column(Text, nullable=False)  # event resource as returned by the API (JSON)
+
+class CalendarSyncState(Base):
+    __tablename__ = 'calendar_sync_state'
+
+    user_id = Column(String, primary_key=True)
+    calendar_id = Column(String, primary_key=True)
+    sync_token = Column(String)  # nextSyncToken from the last completed sync
+    last_synced = Column(DateTime)
+
+class WatchChannel(Base):
+    __tablename__ = 'watch_channels'
+
+    channel_id = Column(String, primary_key=True)  # id we chose when opening the channel
+    user_id = Column(String, nullable=False, index=True)
+    calendar_id = Column(String, nullable=False)
+    resource_id = Column(String, nullable=False)  # returned by events.watch, needed to stop the channel
+    token = Column(String, nullable=False)  # echoed back in X-Goog-Channel-Token
+    expiration = Column(DateTime, nullable=False, index=True)  # naive UTC; scanned for renewal
+
+class CalendarChange(Base):
+    __tablename__ = 'calendar_changes'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)  # feed position; every process polls past it
+    user_id = Column(String, nullable=False)
+    calendar_id = Column(String, nullable=False)
+    changed_at = Column(DateTime, nullable=False, index=True)  # naive UTC; old rows are pruned
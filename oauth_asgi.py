@@ -0,0 +1,477 @@
+"""
+Async (ASGI) version of the ScheduleAI OAuth and calendar HTTP service.
+
+Serves the same /login, /oauth2callback, /calendar/<email> and /notifications
+routes as Oauth.py, but nothing blocks the event loop: the token exchange
+goes through one pooled httpx client, the user is identified from the
+locally verified ID token, Calendar reads go through the shared
+AsyncCalendarClient (pooled, rate-scheduled, gzip), and tokens are read
+and refreshed through AsyncCredentialStore.
+
+Production runs one worker process by default. /metrics reports the
+in-process registry of whichever worker answers the scrape, so with
+WEB_CONCURRENCY above 1 each scrape sees a different worker's counters;
+scale out with one process per replica (each scraped on its own port)
+rather than several workers behind one port:
+
+    PORT=8000 python oauth_asgi.py
+
+Load benchmark against the local fake Google stand-in:
+
+    python oauth_asgi.py benchmark --workers 2 --concurrency 64 --duration 10
+"""
+
+import argparse
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+import json
+import os
+import time
+import uuid
+from urllib.parse import urlencode
+import httpx
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.responses import PlainTextResponse, RedirectResponse, Response, StreamingResponse
+from starlette.routing import Match, Route
+from async_calendar_client import default_async_client
+from async_credential_store import AsyncCredentialStore
+from calendar_batch import NDJSON_MEDIA_TYPE, parse_batch_request, stream_batch_async
+from calendar_changes import CalendarChangeFeed
+from calendar_watch import WatchManager
+from id_token_verifier import IDTokenVerifier
+from metrics import CONTENT_TYPE, HTTP_REQUEST_SECONDS, HTTP_REQUESTS_IN_FLIGHT, default_registry
+from credential_store import CredentialStore
+from oauth_state import state_signer_for_client
+from response_cache import ResponseCache, etag_matches
+from token_refresher import TokenRefresher
+
+CLIENT_SECRETS_FILE = os.environ.get("GOOGLE_CLIENT_SECRETS", "credentials.json")
+SCOPES = [
+    "https://www.googleapis.com/auth/calendar.readonly",
+    "https://www.googleapis.com/auth/userinfo.email",
+    "https://www.googleapis.com/auth/userinfo.profile",
+    "openid"
+]
+AUTH_URI = "https://accounts.google.com/o/oauth2/auth"
+TOKEN_URI = "https://oauth2.googleapis.com/token"
+USERINFO_URL = os.environ.get("GOOGLE_USERINFO_URL", "https://www.googleapis.com/oauth2/v2/userinfo")
+OUTBOUND_MAX_CONNECTIONS = int(os.environ.get("OUTBOUND_MAX_CONNECTIONS", "100"))
+UPCOMING_EVENTS = 10
+
+# Server settings for __main__
+HOST = os.environ.get("HOST", "127.0.0.1")
+PORT = int(os.environ.get("PORT", "8000"))
+# More than one worker splits /metrics across processes that one port cannot tell apart
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", "1"))
+FORWARDED_ALLOW_IPS = os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1")
+# Run the token refresher and watch-channel renewal in this process; enable on one replica only
+RUN_BACKGROUND_JOBS = os.environ.get("RUN_BACKGROUND_JOBS") == "1"
+
+
+async def login(request):
+    config = request.app.state.config
+    state = request.app.state.state_signer.issue()
+
+    params = {
+        "client_id": config["client_id"],
+        "redirect_uri": str(request.url_for("oauth2callback")),
+        "response_type": "code",
+        "scope": " ".join(SCOPES),
+        "state": state,
+        # PKCE, as in the Flask app: the verifier is derived from the state on any worker
+        "code_challenge": request.app.state.state_signer.code_challenge(state),
+        "code_challenge_method": "S256",
+        "access_type": "offline",
+        "include_granted_scopes": "true",
+        "prompt": "consent",
+    }
+    return RedirectResponse(f"{config['auth_uri']}?{urlencode(params)}", 302)
+
+
+async def oauth2callback(request):
+    state = request.query_params.get("state")
+    code = request.query_params.get("code")
+
+    valid, _ = request.app.state.state_signer.verify(state)
+    if not valid:
+        return PlainTextResponse("Invalid or expired state. Please try logging in again.", 400)
+    if not code:
+        return PlainTextResponse("Token exchange failed: missing authorization code", 400)
+
+    config = request.app.state.config
+    http = request.app.state.http
+    store = request.app.state.credential_store
+    try:
+        token_response = await http.post(config["token_uri"], data={
+            "grant_type": "authorization_code",
+            "code": code,
+            "client_id": config["client_id"],
+            "client_secret": config["client_secret"],
+            "redirect_uri": str(request.url_for("oauth2callback")),
+            "code_verifier": request.app.state.state_signer.code_verifier(state),
+        })
+    except httpx.HTTPError as e:
+        return PlainTextResponse(f"Token exchange failed: {e}", 400)
+    if token_response.status_code != 200:
+        return PlainTextResponse(f"Token exchange failed: {token_response.text}", 400)
+    creds = store.credentials_from_token_response(token_response.json(), scopes=SCOPES)
+
+    if creds.id_token:
+        # Verified locally; only touches the network when the signing keys need refetching
+        user_id, id_error = await asyncio.to_thread(request.app.state.id_token_verifier.verify_email, creds.id_token)
+        if id_error:
+            return PlainTextResponse(f"Failed to verify ID token: {id_error}", 401)
+    else:
+        try:
+            user_info_response = await http.get(USERINFO_URL, headers={"Authorization": f"Bearer {creds.token}"})
+        except httpx.HTTPError as e:
+            return PlainTextResponse(f"Failed to fetch user info: {e}", 401)
+        if user_info_response.status_code != 200:
+            return PlainTextResponse(f"Failed to fetch user info: {user_info_response.text}", 401)
+        user_id = user_info_response.json()["email"]
+
+    await store.save(user_id, creds)
+    print(f"[SUCCESS] Tokens stored for user: {user_id}")
+
+    # Get pushed calendar changes instead of polling (needs CALENDAR_WEBHOOK_URL)
+    watch_manager = request.app.state.watch_manager
+    if watch_manager.address:
+        _, watch_error = await asyncio.to_thread(watch_manager.watch, user_id)
+        if watch_error:
+            print(f"[WATCH] {watch_error}")
+    return PlainTextResponse(f"OAuth completed for {user_id}. You can now use the API.")
+
+
+def calendar_response(request, entry):
+    # no-cache: clients may keep the body but must revalidate with If-None-Match
+    headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        request.app.state.response_cache.record_not_modified()
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type="application/json", headers=headers)
+
+
+async def get_calendar_events(request):
+    email = request.path_params["email"]
+    response_cache = request.app.state.response_cache
+    query = ("primary", UPCOMING_EVENTS)
+    # Unchanged since the last fetch: no credentials or API call needed
+    entry = response_cache.get(email, query)
+    if entry is not None:
+        return calendar_response(request, entry)
+    generation = response_cache.generation(email)
+
+    # Cached lookup; refreshes (under a per-user lock) only if the token has expired
+    creds, error = await request.app.state.credential_store.get_valid(email)
+    if error:
+        return PlainTextResponse(f"Failed to refresh token: {error}", 400)
+
+    if not creds:
+        return PlainTextResponse("No token found for this user. Please login first.", 404)
+
+    events, error = await request.app.state.calendar_client.list_upcoming_events(
+        creds, datetime.utcnow(), UPCOMING_EVENTS, user_id=email)
+    if error:
+        return PlainTextResponse(f"Failed to fetch calendar events: {error}", 500)
+    return calendar_response(request, response_cache.put(email, query, events, generation))
+
+
+async def get_calendar_events_batch(request):
+    # {"emails": [...], "time_min": ..., "time_max": ...} -> one NDJSON line per user as each completes
+    try:
+        payload = await request.json()
+    except ValueError:
+        payload = None
+    batch, error = parse_batch_request(payload)
+    if error:
+        return PlainTextResponse(error, 400)
+
+    try:
+        lines = await stream_batch_async(
+            request.app.state.credential_store, request.app.state.calendar_client,
+            batch["emails"], batch["start"], batch["end"], batch["max_results"])
+    except Exception as e:
+        return PlainTextResponse(f"Failed to load tokens: {e}", 500)
+    return StreamingResponse(lines, media_type=NDJSON_MEDIA_TYPE)
+
+
+async def metrics(request):
+    # Prometheus scrape target; same metric names as MultiUserCalendarService
+    return Response(default_registry.render(), headers={"Content-Type": CONTENT_TYPE})
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency and in-flight requests per route."""
+
+    def __init__(self, app, routes):
+        self.app = app
+        self.routes = routes
+
+    def _endpoint(self, scope):
+        # Route template, not the raw path, so per-user URLs share one series
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match is Match.FULL:
+                return route.path
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = self._endpoint(scope)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        HTTP_REQUESTS_IN_FLIGHT.inc(endpoint=endpoint)
+        try:
+            # Streaming responses are timed until their last chunk is sent
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec(endpoint=endpoint)
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint,
+                                         method=scope["method"], status=status)
+
+
+async def calendar_notification(request):
+    # Push notification from a watch channel; everything is in the X-Goog-* headers
+    status, message = await asyncio.to_thread(request.app.state.watch_manager.handle_notification, request.headers)
+    return PlainTextResponse(message, status)
+
+
+def load_client_config(path=CLIENT_SECRETS_FILE):
+    """
+    Read the OAuth client from a Google client secrets file.
+
+    Args:
+        path (str, optional): Path to credentials.json ('web' client)
+
+    Returns:
+        dict: client_id, client_secret, auth_uri and token_uri
+    """
+    with open(path, "r") as f:
+        client = json.load(f)["web"]
+    return {
+        "client_id": client["client_id"],
+        "client_secret": client["client_secret"],
+        "auth_uri": client.get("auth_uri", AUTH_URI),
+        "token_uri": client.get("token_uri", TOKEN_URI),
+    }
+
+
+def create_app(client_secrets_file=CLIENT_SECRETS_FILE, calendar_client=None, run_background_jobs=RUN_BACKGROUND_JOBS):
+    """
+    Build the ASGI application.
+
+    Args:
+        client_secrets_file (str, optional): Google client secrets file
+        calendar_client (AsyncCalendarClient, optional): Defaults to the shared client
+        run_background_jobs (bool, optional): Start the token refresher, watch-channel
+            renewal and change-feed polling with the app. Defaults to RUN_BACKGROUND_JOBS.
+
+    Returns:
+        Starlette: Application
+    """
+    config = load_client_config(client_secrets_file)
+    http = httpx.AsyncClient(timeout=30, limits=httpx.Limits(
+        max_connections=OUTBOUND_MAX_CONNECTIONS, max_keepalive_connections=OUTBOUND_MAX_CONNECTIONS))
+    credential_store = AsyncCredentialStore(
+        config["client_id"], config["client_secret"], token_uri=config["token_uri"], http_client=http)
+    calendar_client = calendar_client or default_async_client
+    # Notifications reach one worker; the feed carries them to every worker's response cache
+    change_feed = CalendarChangeFeed()
+    watch_manager = WatchManager(CredentialStore(config["client_id"], config["client_secret"], token_uri=config["token_uri"]),
+                                 change_feed=change_feed)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        jobs = []
+        if run_background_jobs:
+            jobs = [
+                TokenRefresher(config["client_id"], config["client_secret"], token_uri=config["token_uri"]).start(),
+                watch_manager.start(),
+                change_feed.start(),
+            ]
+        try:
+            yield
+        finally:
+            for job in jobs:
+                job.stop(timeout=5)
+            await calendar_client.aclose()
+            await http.aclose()
+
+    routes = [
+        Route("/login", login),
+        Route("/oauth2callback", oauth2callback),
+        # Before /calendar/{email}, which would otherwise match "batch"
+        Route("/calendar/batch", get_calendar_events_batch, methods=["POST"]),
+        Route("/calendar/{email}", get_calendar_events),
+        Route("/notifications", calendar_notification, methods=["POST"]),
+        Route("/metrics", metrics),
+    ]
+    app = Starlette(routes=routes, middleware=[Middleware(MetricsMiddleware, routes=routes)], lifespan=lifespan)
+    app.state.config = config
+    app.state.http = http
+    app.state.credential_store = credential_store
+    app.state.calendar_client = calendar_client
+    app.state.watch_manager = watch_manager
+    # Serialized /calendar responses; dropped when a push notification reports a change
+    app.state.response_cache = ResponseCache()
+    watch_manager.add_listener(app.state.response_cache.invalidate)
+    # Signed, expiring state: any worker or replica can finish a login another one started
+    app.state.state_signer = state_signer_for_client(config["client_secret"])
+    app.state.id_token_verifier = IDTokenVerifier(config["client_id"])
+    return app
+
+
+def serve(host=HOST, port=PORT, workers=WEB_CONCURRENCY):
+    """
+    Run the app under uvicorn, in one worker process by default.
+
+    Args:
+        host (str, optional): Interface to bind
+        port (int, optional): Port to bind
+        workers (int, optional): Worker processes. /metrics is per process, so with
+            more than one each scrape reports a single worker.
+    """
+    import uvicorn
+    uvicorn.run(
+        "oauth_asgi:create_app",
+        factory=True,
+        host=host,
+        port=port,
+        workers=workers,
+        # Trust X-Forwarded-* from the reverse proxy so redirect URIs use the public scheme/host
+        proxy_headers=True,
+        forwarded_allow_ips=FORWARDED_ALLOW_IPS,
+        timeout_keep_alive=5,
+        backlog=2048,
+        access_log=False,
+    )
+
+
+def _benchmark(users=200, events=20, concurrency=64, duration=10.0, workers=1, port=8765):
+    """
+    Measure /calendar/<email> requests per second with the app running under
+    uvicorn against FakeCalendarServer, which stands in for Google.
+
+    The Calendar request scheduler is opened up for the run, since the fake
+    server has no quota; the numbers are for the HTTP service itself.
+    """
+    import shutil
+    import subprocess
+    import sys
+    import tempfile
+    import time
+    from datetime import timedelta, timezone
+    from google.oauth2.credentials import Credentials
+    from sqlalchemy.orm import sessionmaker
+    from compact_event import _sample_event
+    from db import async_database_url, create_db_engine
+    from fake_calendar_server import FakeCalendarServer
+    from models import Base
+
+    # Bench users go in a scratch database, never the configured DATABASE_URL
+    scratch = tempfile.mkdtemp()
+    url = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+    bench_engine = create_db_engine(url)
+    Base.metadata.create_all(bench_engine)
+    server = FakeCalendarServer().start()
+    process = None
+    try:
+        now = datetime.now(timezone.utc)
+        for i in range(events):
+            event = _sample_event(i)
+            start = now + timedelta(hours=1, minutes=30 * i)
+            event['start'] = {'dateTime': start.isoformat()}
+            event['end'] = {'dateTime': (start + timedelta(minutes=30)).isoformat()}
+            server.put_event(event)
+
+        secrets_file = os.path.join(scratch, 'credentials.json')
+        with open(secrets_file, 'w') as f:
+            json.dump({"web": {"client_id": "bench", "client_secret": "bench", "token_uri": server.token_uri}}, f)
+        store = CredentialStore("bench", "bench", sessionmaker(bind=bench_engine), token_uri=server.token_uri)
+        user_ids = [f"bench{i}@example.com" for i in range(users)]
+        for user_id in user_ids:
+            store.save(user_id, Credentials(token=uuid.uuid4().hex, refresh_token="bench",
+                                            expiry=datetime.utcnow() + timedelta(hours=2)))
+
+        unlimited = str(10 ** 9)
+        env = dict(os.environ, GOOGLE_CLIENT_SECRETS=secrets_file, CALENDAR_API_ENDPOINT=server.endpoint,
+                   DATABASE_URL=url, ASYNC_DATABASE_URL=async_database_url(url),
+                   CALENDAR_PROJECT_QPS=unlimited, CALENDAR_PROJECT_BURST=unlimited,
+                   CALENDAR_USER_QPS=unlimited, CALENDAR_USER_BURST=unlimited,
+                   WEB_CONCURRENCY=str(workers), PORT=str(port), RUN_BACKGROUND_JOBS="0")
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__)], env=env)
+        base_url = f"http://{HOST}:{port}"
+
+        async def load():
+            latencies = []
+            errors = 0
+            limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+            async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+                for _ in range(300):
+                    try:
+                        if (await client.get(f"/calendar/{user_ids[0]}")).status_code == 200:
+                            break
+                    except httpx.HTTPError:
+                        pass
+                    await asyncio.sleep(0.1)
+                else:
+                    raise RuntimeError("server did not start")
+
+                deadline = time.perf_counter() + duration
+
+                async def worker(offset):
+                    nonlocal errors
+                    i = offset
+                    while time.perf_counter() < deadline:
+                        started = time.perf_counter()
+                        response = await client.get(f"/calendar/{user_ids[i % len(user_ids)]}")
+                        latencies.append(time.perf_counter() - started)
+                        if response.status_code != 200:
+                            errors += 1
+                        i += concurrency
+
+                started = time.perf_counter()
+                await asyncio.gather(*(worker(i) for i in range(concurrency)))
+                return latencies, errors, time.perf_counter() - started
+
+        latencies, errors, elapsed = asyncio.run(load())
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        server.stop()
+        bench_engine.dispose()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    latencies.sort()
+    print(f"{len(latencies) / elapsed:,.0f} req/s with {workers} worker(s), {concurrency} concurrent: "
+          f"p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms, {errors} errors")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the async OAuth/calendar service.")
+    parser.add_argument("command", nargs="?", choices=["serve", "benchmark"], default="serve")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes")
+    parser.add_argument("--users", type=int, default=200, help="benchmark: distinct users")
+    parser.add_argument("--concurrency", type=int, default=64, help="benchmark: concurrent requests")
+    parser.add_argument("--duration", type=float, default=10.0, help="benchmark: seconds of load")
+    args = parser.parse_args()
+
+    if args.command == "benchmark":
+        _benchmark(users=args.users, concurrency=args.concurrency, duration=args.duration,
+                   workers=args.workers or 1)
+    else:
+        serve(workers=args.workers or WEB_CONCURRENCY)
@@ -0,0 +1,141 @@
+"""
+Stateless OAuth state tokens for ScheduleAI.
+
+The state sent to Google on /login is a random nonce plus its issue time,
+signed with HMAC-SHA256. /oauth2callback checks the signature and age, so
+any worker or replica sharing the secret can finish a login started on
+another one, and nothing is stored per pending login.
+
+Replays inside the TTL are refused by a bounded per-process set of used
+nonces; that check is best effort across replicas, since Google only
+hands each authorization code out once anyway.
+"""
+
+import base64
+from collections import OrderedDict
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+
+# Shared signing secret; every worker and replica must use the same one
+STATE_SECRET = os.environ.get("OAUTH_STATE_SECRET")
+STATE_TTL_SECONDS = int(os.environ.get("OAUTH_STATE_TTL", "600"))
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+class OAuthStateSigner:
+    """Issues and verifies HMAC-signed, expiring OAuth state tokens."""
+
+    def __init__(self, secret, ttl=STATE_TTL_SECONDS, max_used=100_000, clock=time.time):
+        """
+        Initialize the signer.
+
+        Args:
+            secret (str or bytes): Signing secret shared by every worker
+            ttl (int, optional): Seconds a state stays valid
+            max_used (int, optional): Used nonces remembered for replay checks
+            clock (callable, optional): Returns the current Unix time
+        """
+        if not secret:
+            raise ValueError("OAuth state secret must not be empty")
+        self._key = secret.encode() if isinstance(secret, str) else secret
+        self.ttl = ttl
+        self.max_used = max_used
+        self.clock = clock
+        self._used = OrderedDict()  # nonce -> expiry, oldest first
+        self._lock = threading.Lock()
+
+    def _sign(self, payload):
+        return _b64(hmac.new(self._key, payload.encode("ascii"), hashlib.sha256).digest())
+
+    def issue(self):
+        """
+        Create a new state token.
+
+        Returns:
+            str: URL-safe "<nonce>.<issued_at>.<signature>" token
+        """
+        payload = f"{secrets.token_urlsafe(16)}.{int(self.clock())}"
+        return f"{payload}.{self._sign(payload)}"
+
+    def verify(self, state, consume=True):
+        """
+        Check a state token returned to the callback.
+
+        Args:
+            state (str): Token from the callback's query string
+            consume (bool, optional): Refuse the same token if it comes back again
+
+        Returns:
+            tuple: (ok, error_message)
+        """
+        try:
+            nonce, issued_at, signature = (state or "").split(".")
+            issued_at = int(issued_at)
+        except ValueError:
+            return False, "malformed state"
+
+        if not hmac.compare_digest(signature, self._sign(f"{nonce}.{issued_at}")):
+            return False, "bad state signature"
+
+        now = self.clock()
+        if not issued_at - 60 <= now <= issued_at + self.ttl:  # allow small clock skew between replicas
+            return False, "state expired"
+
+        if consume:
+            with self._lock:
+                while self._used and next(iter(self._used.values())) < now:
+                    self._used.popitem(last=False)
+                if nonce in self._used:
+                    return False, "state already used"
+                self._used[nonce] = issued_at + self.ttl
+                if len(self._used) > self.max_used:
+                    self._used.popitem(last=False)
+        return True, None
+
+    def code_verifier(self, state):
+        """
+        Derive the PKCE code verifier for a state, so the callback can rebuild
+        it on any worker without storing it.
+
+        Args:
+            state (str): State token from issue()
+
+        Returns:
+            str: 43-character code verifier
+        """
+        return _b64(hmac.new(self._key, b"pkce:" + state.encode("ascii"), hashlib.sha256).digest())
+
+    def code_challenge(self, state):
+        """
+        Get the S256 PKCE code challenge sent with the authorization request for a state.
+
+        Args:
+            state (str): State token from issue()
+
+        Returns:
+            str: Base64url SHA-256 of code_verifier(state)
+        """
+        return _b64(hashlib.sha256(self.code_verifier(state).encode("ascii")).digest())
+
+
+def state_signer_for_client(client_secret, ttl=STATE_TTL_SECONDS):
+    """
+    Create a signer keyed by OAUTH_STATE_SECRET, or by a key derived from the
+    OAuth client secret, which every worker already loads.
+
+    Args:
+        client_secret (str): OAuth client secret
+        ttl (int, optional): Seconds a state stays valid
+
+    Returns:
+        OAuthStateSigner: Signer
+    """
+    secret = STATE_SECRET or hmac.new(client_secret.encode(), b"schedulai-oauth-state", hashlib.sha256).digest()
+    return OAuthStateSigner(secret, ttl)
@@ -0,0 +1,337 @@
+"""
+Local recurrence expansion for ScheduleAI.
+
+Instead of asking the Calendar API to expand recurring events
+(singleEvents=True), which returns every instance of a daily meeting as a
+separate resource, master events are fetched once with their RRULE/EXDATE
+lines, cached per calendar, and expanded locally for any window they cover.
+Expanded instances match the server's: same ids ({master}_{original start}),
+times, and modified or cancelled exceptions applied.
+"""
+
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+import os
+import re
+import threading
+import time
+from zoneinfo import ZoneInfo
+from dateutil.rrule import rrulestr
+from compact_event import COMPACT_EVENT_FIELDS, CompactEvent
+from calendar_api import event_list_fields
+from event_cache import DEFAULT_TTL_SECONDS
+
+PREFETCH_DAYS = int(os.environ.get("CALENDAR_RECURRENCE_PREFETCH_DAYS", "30"))
+MASTER_PAGE_SIZE = 2500  # API maximum for events().list
+MAX_CALENDARS = int(os.environ.get("CALENDAR_RECURRENCE_MAX_CALENDARS", "1024"))
+RECURRENCE_FIELDS = COMPACT_EVENT_FIELDS + ('recurrence', 'recurringEventId', 'originalStartTime')
+
+_UNTIL_DATE = re.compile(r'UNTIL=(\d{8})(?=;|$)')
+_UNTIL_UTC = re.compile(r'UNTIL=(\d{8})T\d{6}Z')
+
+
+def instance_id(master_id, original_start, all_day):
+    """
+    Build the id the API gives an instance of a recurring event.
+
+    Args:
+        master_id (str): Recurring event id
+        original_start (datetime): Occurrence start (aware, or a naive date for all-day)
+        all_day (bool): All-day series
+
+    Returns:
+        str: e.g. "abc123_20260302T140000Z" or "abc123_20260302"
+    """
+    if all_day:
+        return f"{master_id}_{original_start.strftime('%Y%m%d')}"
+    return f"{master_id}_{original_start.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}"
+
+
+def _occurrence_key(value):
+    """Key an originalStartTime object (or occurrence) the same way for matching."""
+    if isinstance(value, dict):
+        if 'date' in value:
+            return value['date']
+        parsed = datetime.fromisoformat(value['dateTime'].replace('Z', '+00:00'))
+        return int(parsed.timestamp())
+    if value.tzinfo is None:
+        return value.date().isoformat()
+    return int(value.timestamp())
+
+
+class RecurringSeries:
+    """A master recurring event parsed once for repeated expansion."""
+
+    def __init__(self, master):
+        """
+        Parse a master event.
+
+        Args:
+            master (dict): Event resource with a 'recurrence' list
+        """
+        self.master = master
+        self.all_day = 'date' in master['start']
+        rules = list(master.get('recurrence', []))
+
+        if self.all_day:
+            dtstart = datetime.fromisoformat(master['start']['date'])
+            end = datetime.fromisoformat(master.get('end', master['start'])['date'])
+            # Naive (floating) DTSTART needs a naive UNTIL
+            rules = [_UNTIL_UTC.sub(r'UNTIL=\1', rule) for rule in rules]
+        else:
+            start = master['start']
+            dtstart = datetime.fromisoformat(start['dateTime'].replace('Z', '+00:00'))
+            if start.get('timeZone'):
+                # Expand in the event's zone so occurrences keep their wall time across DST
+                dtstart = dtstart.astimezone(ZoneInfo(start['timeZone']))
+            end = datetime.fromisoformat(master.get('end', start)['dateTime'].replace('Z', '+00:00'))
+            # An aware DTSTART needs a UTC UNTIL; date-only UNTIL includes that whole day
+            rules = [_UNTIL_DATE.sub(r'UNTIL=\1T235959Z', rule) for rule in rules]
+
+        self.duration = end - dtstart
+        self.rules = rrulestr("\n".join(rules), dtstart=dtstart, forceset=True, cache=True)
+
+    def occurrences(self, window_start, window_end, tz=None):
+        """
+        Get occurrence starts whose instances overlap a window.
+
+        Args:
+            window_start (datetime): Aware window start
+            window_end (datetime): Aware window end
+            tz (tzinfo, optional): Calendar zone all-day dates are days in. Defaults to UTC.
+
+        Returns:
+            list: Occurrence starts (aware, or naive for all-day series)
+        """
+        after = window_start - self.duration
+        before = window_end
+        if self.all_day:
+            # All-day instances are floating dates: compare in the calendar's wall time
+            after = after.astimezone(tz or timezone.utc).replace(tzinfo=None)
+            before = before.astimezone(tz or timezone.utc).replace(tzinfo=None)
+        return self.rules.between(after, before)
+
+    def instance(self, original_start):
+        """
+        Build the instance for one occurrence.
+
+        Args:
+            original_start (datetime): Occurrence start from occurrences()
+
+        Returns:
+            CompactEvent: Instance as the API would return it
+        """
+        master = self.master
+        end = original_start + self.duration
+        if self.all_day:
+            start_epoch = int(original_start.replace(tzinfo=timezone.utc).timestamp())
+            end_epoch = int(end.replace(tzinfo=timezone.utc).timestamp())
+            utc_offset = 0
+        else:
+            start_epoch = int(original_start.timestamp())
+            end_epoch = int(end.timestamp())
+            utc_offset = int(original_start.utcoffset().total_seconds()) // 60
+        return CompactEvent(
+            instance_id(master['id'], original_start, self.all_day),
+            master.get('etag'),
+            start_epoch,
+            end_epoch,
+            utc_offset,
+            self.all_day,
+            master.get('summary'),
+            master.get('location'),
+            master.get('status'),
+            master.get('transparency') == 'transparent',
+        )
+
+
+def expand_events(items, start_date, end_date, tz=None):
+    """
+    Expand a singleEvents=False listing into the instances that overlap a window.
+
+    Args:
+        items (list): Event resources: single events, recurring masters and their
+            exceptions (resources with recurringEventId)
+        start_date (datetime): Window start (naive UTC)
+        end_date (datetime): Window end (naive UTC)
+        tz (tzinfo, optional): Calendar zone all-day dates are days in. Defaults to UTC.
+
+    Returns:
+        list: CompactEvent objects in start-time order, equivalent to singleEvents=True
+    """
+    return expand_partitioned(*partition_events(items), start_date, end_date, tz)
+
+
+def partition_events(items):
+    """
+    Split a listing into parsed series, single events and exceptions by master id.
+
+    The result can be kept and passed to expand_partitioned() for any number of windows.
+
+    Args:
+        items (list): Event resources as for expand_events()
+
+    Returns:
+        tuple: (series, singles, exceptions)
+    """
+    series = []
+    singles = []
+    exceptions = {}  # master id -> {occurrence key: CompactEvent, or None when cancelled}
+    for item in items:
+        cancelled = item.get('status') == 'cancelled'
+        if item.get('recurrence'):
+            if not cancelled:
+                series.append(RecurringSeries(item))
+        elif item.get('recurringEventId'):
+            # from_api() is None for an exception without times; treat it as cancelled
+            exceptions.setdefault(item['recurringEventId'], {})[
+                _occurrence_key(item['originalStartTime'])] = None if cancelled else CompactEvent.from_api(item)
+        elif not cancelled:
+            event = CompactEvent.from_api(item)
+            if event is not None:
+                singles.append(event)
+    return series, singles, exceptions
+
+
+def expand_partitioned(series, singles, exceptions, start_date, end_date, tz=None):
+    """
+    Expand a partition_events() result for one window.
+
+    Args:
+        series, singles, exceptions: As returned by partition_events()
+        start_date (datetime): Window start (naive UTC)
+        end_date (datetime): Window end (naive UTC)
+        tz (tzinfo, optional): Calendar zone all-day dates are days in. Defaults to UTC.
+
+    Returns:
+        list: CompactEvent objects in start-time order
+    """
+    window_start = start_date.replace(tzinfo=timezone.utc)
+    window_end = end_date.replace(tzinfo=timezone.utc)
+    start_epoch = int(window_start.timestamp())
+    end_epoch = int(window_end.timestamp())
+
+    def overlaps(event):
+        start, end = event.interval(tz)
+        return start < end_epoch and end > start_epoch
+
+    events = [event for event in singles if overlaps(event)]
+
+    for recurring in series:
+        overrides = exceptions.get(recurring.master['id'], {})
+        for occurrence in recurring.occurrences(window_start, window_end, tz):
+            if _occurrence_key(occurrence) not in overrides:
+                events.append(recurring.instance(occurrence))
+
+    # Modified instances carry their own (possibly moved) times
+    for overrides in exceptions.values():
+        for event in overrides.values():
+            if event is not None and overlaps(event):
+                events.append(event)
+
+    events.sort(key=lambda event: event.start)
+    return events
+
+
+class RecurrenceExpander:
+    """Caches master events per calendar and expands windows locally."""
+
+    def __init__(self, ttl=DEFAULT_TTL_SECONDS, prefetch_days=PREFETCH_DAYS, max_calendars=MAX_CALENDARS):
+        """
+        Initialize the expander.
+
+        Args:
+            ttl (float, optional): Seconds a calendar's masters are reused
+            prefetch_days (int, optional): Minimum span fetched per listing, so nearby
+                windows are answered without another request
+            max_calendars (int, optional): Calendars whose masters are kept before LRU eviction
+        """
+        self.ttl = ttl
+        self.prefetch = timedelta(days=prefetch_days)
+        self.max_calendars = max_calendars
+        # (user_id, calendar_id) -> (expires, start, end, series, singles, exceptions, tz), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.fetches = 0
+        self.local_hits = 0
+
+    def _fetch(self, service, start_date, end_date, calendar_id):
+        """
+        List masters, single events and exceptions in a window, following pages.
+
+        Returns:
+            tuple: (items, calendar_tz); calendar_tz is None if the listing names no zone
+        """
+        items = []
+        page_token = None
+        while True:
+            result = service.events().list(
+                calendarId=calendar_id,
+                timeMin=start_date.isoformat() + 'Z',
+                timeMax=end_date.isoformat() + 'Z',
+                singleEvents=False,
+                # Cancelled exceptions are only listed with showDeleted
+                showDeleted=True,
+                maxResults=MASTER_PAGE_SIZE,
+                pageToken=page_token,
+                fields=event_list_fields(RECURRENCE_FIELDS) + ',timeZone',
+            ).execute()
+            items.extend(result.get('items', []))
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                zone = result.get('timeZone')
+                return items, ZoneInfo(zone) if zone else None
+
+    def get_events(self, user_id, service, start_date, end_date, calendar_id='primary'):
+        """
+        Get a window's instances, fetching masters only when the cache does not cover it.
+
+        Args:
+            user_id (str): Unique user identifier
+            service (Resource): Calendar API service object authorized for the user
+            start_date (datetime): Start of the window (naive UTC)
+            end_date (datetime): End of the window (naive UTC)
+            calendar_id (str, optional): Calendar to read. Defaults to 'primary'.
+
+        Returns:
+            list: CompactEvent objects in start-time order
+
+        Raises:
+            HttpError: When the API rejects the listing
+        """
+        key = (user_id, calendar_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is not None and entry[1] <= start_date and end_date <= entry[2]:
+                self._entries.move_to_end(key)
+                self.local_hits += 1
+                return expand_partitioned(*entry[3:6], start_date, end_date, entry[6])
+
+        fetch_end = max(end_date, start_date + self.prefetch)
+        items, calendar_tz = self._fetch(service, start_date, fetch_end, calendar_id)
+        series, singles, exceptions = partition_events(items)
+
+        with self._lock:
+            self.fetches += 1
+            self._entries[key] = (time.monotonic() + self.ttl, start_date, fetch_end,
+                                  series, singles, exceptions, calendar_tz)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_calendars:
+                self._entries.popitem(last=False)
+        return expand_partitioned(series, singles, exceptions, start_date, end_date, calendar_tz)
+
+    def invalidate(self, user_id=None, calendar_id=None):
+        """
+        Drop cached masters.
+
+        Args:
+            user_id (str, optional): Only this user's calendars. Defaults to everyone.
+            calendar_id (str, optional): Only this calendar
+        """
+        with self._lock:
+            for key in list(self._entries):
+                if (user_id is None or key[0] == user_id) and (calendar_id is None or key[1] == calendar_id):
+                    del self._entries[key]
@@ -0,0 +1,353 @@
+"""
+Quota-aware scheduling for Google Calendar API requests.
+
+Every Calendar call passes through a shared RequestScheduler: a per-project
+and a per-user token bucket pace requests, waiting callers are served in
+priority order (interactive before background), and rate-limit responses
+(429, 403 rateLimitExceeded) are retried with exponential backoff and jitter
+instead of being surfaced to the user.
+"""
+
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import os
+import random
+import threading
+import time
+import httplib2
+
+INTERACTIVE = 0
+BACKGROUND = 10
+
+PROJECT_QPS = float(os.environ.get("CALENDAR_PROJECT_QPS", "50"))
+PROJECT_BURST = float(os.environ.get("CALENDAR_PROJECT_BURST", "100"))
+USER_QPS = float(os.environ.get("CALENDAR_USER_QPS", "5"))
+USER_BURST = float(os.environ.get("CALENDAR_USER_BURST", "10"))
+# Idle user buckets are dropped once this many exist (and whenever the count doubles after that)
+USER_BUCKETS_PRUNE_AT = 1024
+
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Safe to resend after a server error; anything else (e.g. POST events.watch) may already have taken effect
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+# Raised before any of the request is sent, so every method can be retried
+CONNECT_ERRORS = (ConnectionRefusedError, httplib2.ServerNotFoundError)
+
+_priority = ContextVar("calendar_request_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def request_priority(priority):
+    """
+    Run Calendar calls made in the block at the given priority.
+
+    Args:
+        priority (int): INTERACTIVE, BACKGROUND, or any int (lower runs first)
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate` tokens per second."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, now):
+        """Seconds until one token is available (0 if one is available now)."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def full(self, now):
+        """Whether the bucket has refilled to capacity, i.e. is no different from a new one."""
+        self.wait_time(now)
+        return self.tokens >= self.capacity
+
+
+def is_rate_limited(status, content):
+    """
+    Check whether an API response asks the client to slow down.
+
+    Args:
+        status (int): HTTP status
+        content (bytes or str): Response body
+
+    Returns:
+        bool: True for 429 and 403 rate-limit errors
+    """
+    if status == 429:
+        return True
+    if status != 403:
+        return False
+    try:
+        error = json.loads(content).get("error", {})
+        reasons = {item.get("reason") for item in error.get("errors", [])}
+    except (ValueError, AttributeError, TypeError):
+        return False
+    return bool(reasons & RATE_LIMIT_REASONS)
+
+
+class RequestScheduler:
+    """Token-bucket pacing, priority ordering and backoff for Calendar requests."""
+
+    def __init__(self, project_rate=PROJECT_QPS, project_burst=PROJECT_BURST,
+                 user_rate=USER_QPS, user_burst=USER_BURST,
+                 max_retries=5, base_delay=1.0, max_delay=32.0):
+        """
+        Initialize the scheduler.
+
+        Args:
+            project_rate (float, optional): Requests per second for the whole project
+            project_burst (float, optional): Project bucket capacity
+            user_rate (float, optional): Requests per second per user
+            user_burst (float, optional): Per-user bucket capacity
+            max_retries (int, optional): Retries after rate-limit or server errors
+            base_delay (float, optional): First backoff in seconds
+            max_delay (float, optional): Backoff cap in seconds
+        """
+        self.project = TokenBucket(project_rate, project_burst)
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._users = {}  # user key -> TokenBucket; refilled ones are pruned, see _user_bucket()
+        self._prune_at = USER_BUCKETS_PRUNE_AT
+        self._waiting = []  # sorted [(priority, seq, user key)]
+        self._seq = 0
+        self._cond = threading.Condition()
+        self.requests = 0
+        self.throttled = 0
+        self.throttle_seconds = 0.0
+        self.retries = 0
+        self.backoff_seconds = 0.0
+        self.rate_limited = 0
+        self.max_queue_depth = 0
+
+    def _user_bucket(self, key):
+        bucket = self._users.get(key)
+        if bucket is None:
+            if len(self._users) >= self._prune_at:
+                self._prune_idle_users()
+            bucket = self._users[key] = TokenBucket(self.user_rate, self.user_burst)
+        return bucket
+
+    def _prune_idle_users(self):
+        """Forget user buckets that have refilled; a user who comes back gets an equal, full one."""
+        now = time.monotonic()
+        for key in [key for key, bucket in self._users.items() if bucket.full(now)]:
+            del self._users[key]
+        self._prune_at = max(USER_BUCKETS_PRUNE_AT, 2 * len(self._users))
+
+    def acquire(self, key, priority=None):
+        """
+        Wait for a request slot.
+
+        Waiting callers are granted in (priority, arrival) order, skipping any whose
+        own user bucket is empty so one busy user does not hold up the others.
+
+        Args:
+            key (str): User the request is made for
+            priority (int, optional): Defaults to the request_priority() in effect
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        if priority is None:
+            priority = _priority.get()
+        started = time.monotonic()
+        with self._cond:
+            self._seq += 1
+            ticket = (priority, self._seq, key)
+            self._waiting.append(ticket)
+            self._waiting.sort()
+            self.max_queue_depth = max(self.max_queue_depth, len(self._waiting))
+
+            while True:
+                now = time.monotonic()
+                wait = self.project.wait_time(now)
+                if wait == 0:
+                    wait = None
+                    for waiting in self._waiting:
+                        user_wait = self._user_bucket(waiting[2]).wait_time(now)
+                        if user_wait == 0:
+                            if waiting is ticket:
+                                self.project.take()
+                                self._user_bucket(key).take()
+                                wait = 0
+                            else:
+                                # Someone ahead of us can go; let them, then look again
+                                self._cond.notify_all()
+                            break
+                        wait = user_wait if wait is None else min(wait, user_wait)
+                if wait == 0:
+                    break
+                self._cond.wait(wait if wait is not None else 0.05)
+
+            self._waiting.remove(ticket)
+            self._cond.notify_all()
+
+            waited = time.monotonic() - started
+            self.requests += 1
+            if waited > 0.001:
+                self.throttled += 1
+                self.throttle_seconds += waited
+        return waited
+
+    async def acquire_async(self, key, priority=None):
+        """
+        Async version of acquire(); waits in a worker thread.
+
+        Args:
+            key (str): User the request is made for
+            priority (int, optional): Defaults to the request_priority() in effect
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        if priority is None:
+            priority = _priority.get()
+        with self._cond:
+            # Skip the thread hop when nobody is queued and both buckets have a token
+            now = time.monotonic()
+            if not self._waiting and self.project.wait_time(now) == 0 \
+                    and self._user_bucket(key).wait_time(now) == 0:
+                self.project.take()
+                self._user_bucket(key).take()
+                self.requests += 1
+                return 0.0
+        return await asyncio.to_thread(self.acquire, key, priority)
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """
+        Get the delay before retry number `attempt` (0-based).
+
+        Args:
+            attempt (int): Retry number
+            retry_after (str, optional): Retry-After header value in seconds
+
+        Returns:
+            float: Seconds to sleep (full jitter, honoring Retry-After up to max_delay)
+        """
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.max_delay))
+            except ValueError:
+                pass
+        return delay
+
+    def backoff(self, attempt, retry_after=None):
+        """
+        Sleep before retry number `attempt` and count it.
+
+        Args:
+            attempt (int): Retry number
+            retry_after (str, optional): Retry-After header value in seconds
+
+        Returns:
+            float: Seconds slept
+        """
+        delay = self.backoff_delay(attempt, retry_after)
+        self.record_backoff(delay)
+        time.sleep(delay)
+        return delay
+
+    def record_backoff(self, delay):
+        with self._cond:
+            self.retries += 1
+            self.backoff_seconds += delay
+
+    def record_rate_limited(self):
+        with self._cond:
+            self.rate_limited += 1
+
+    def stats(self):
+        """
+        Get scheduler metrics.
+
+        Returns:
+            dict: queue_depth, max_queue_depth, requests, throttled, throttle_seconds_total,
+                retries, backoff_seconds_total and rate_limited (final rate-limit failures)
+        """
+        with self._cond:
+            return {
+                "queue_depth": len(self._waiting),
+                "max_queue_depth": self.max_queue_depth,
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "throttle_seconds_total": self.throttle_seconds,
+                "retries": self.retries,
+                "backoff_seconds_total": self.backoff_seconds,
+                "rate_limited": self.rate_limited,
+            }
+
+
+class ScheduledHttp(httplib2.Http):
+    """
+    httplib2 transport that sends every request through a RequestScheduler.
+
+    Idempotent requests are retried on rate limits and server errors.
+    Others are retried only when they were certainly not performed: a
+    rate-limit rejection, or a connection that failed before sending.
+    """
+
+    def __init__(self, scheduler, key, paced=True, **kwargs):
+        """
+        Initialize the transport.
+
+        Args:
+            scheduler (RequestScheduler): Scheduler to pace requests with
+            key (str): User the transport's requests are made for
+            paced (bool, optional): Take a token per request. False for batch transports,
+                whose parts the caller charges to their users. Defaults to True.
+            **kwargs: Passed to httplib2.Http
+        """
+        super().__init__(**kwargs)
+        self.scheduler = scheduler
+        self.key = key
+        self.paced = paced
+
+    def request(self, uri, method="GET", body=None, headers=None, *args, **kwargs):
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            if self.paced:
+                self.scheduler.acquire(self.key)
+            try:
+                response, content = super().request(uri, method, body, headers, *args, **kwargs)
+            except CONNECT_ERRORS:
+                if attempt >= self.scheduler.max_retries:
+                    raise
+                self.scheduler.backoff(attempt)
+                attempt += 1
+                continue
+
+            rate_limited = is_rate_limited(response.status, content)
+            retryable = rate_limited or (idempotent and response.status in RETRY_STATUSES)
+            if not retryable:
+                return response, content
+            if attempt >= self.scheduler.max_retries:
+                if rate_limited:
+                    self.scheduler.record_rate_limited()
+                return response, content
+
+            self.scheduler.backoff(attempt, response.get("retry-after"))
+            attempt += 1
+
+
+# Shared scheduler for all Calendar calls in the process
+default_scheduler = RequestScheduler()
@@ -0,0 +1,250 @@
+"""
+HTTP response cache for ScheduleAI's /calendar/<email> endpoint.
+
+Keeps the serialized JSON body and its ETag per (user, query), so repeat
+requests skip credentials, service build and the Calendar API, and clients
+that send If-None-Match get a 304 with no body. Entries are dropped when
+WatchManager reports a change to the user's calendar (register invalidate()
+as a listener), when their TTL runs out, or when the first listed event
+ends, since an "upcoming events" list changes then even if the calendar
+does not.
+
+The cache is per process. Changes reach every worker's copy through the
+CalendarChangeFeed that WatchManager publishes to, within one poll interval;
+if a worker misses one (feed down, notification lost), the TTL, capped at
+MAX_TTL_SECONDS, bounds how long it serves the stale response.
+"""
+
+from collections import OrderedDict
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+from compact_event import parse_events
+
+# Upper bound on staleness when a change notification does not reach this process
+MAX_TTL_SECONDS = 300
+DEFAULT_TTL_SECONDS = min(float(os.environ.get("CALENDAR_RESPONSE_CACHE_TTL", "300")), MAX_TTL_SECONDS)
+DEFAULT_MAX_ENTRIES = int(os.environ.get("CALENDAR_RESPONSE_CACHE_MAX_ENTRIES", "4096"))
+# All-day dates are parsed as UTC midnight; end their entries early enough for any zone
+ALL_DAY_MARGIN_SECONDS = 14 * 3600
+
+
+def make_etag(body):
+    """
+    Get the strong ETag for a response body.
+
+    Args:
+        body (bytes): Response body
+
+    Returns:
+        str: Quoted ETag
+    """
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Check an If-None-Match header against an ETag (weak comparison, as RFC 9110 requires).
+
+    Args:
+        if_none_match (str or None): Header value
+        etag (str): Current quoted ETag
+
+    Returns:
+        bool: True if the client's copy is current
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    current = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == current:
+            return True
+    return False
+
+
+def events_valid_until(events):
+    """
+    Get when an upcoming-events list goes stale because its first event ends.
+
+    Args:
+        events (list): Event resources as returned by the API
+
+    Returns:
+        float or None: Unix time, or None if no event ends
+    """
+    ends = [
+        event.end - (ALL_DAY_MARGIN_SECONDS if event.all_day else 0)
+        for event in parse_events(events)
+    ]
+    return min(ends) if ends else None
+
+
+class CachedResponse:
+    """A cached response body with its ETag."""
+
+    __slots__ = ('body', 'etag', 'expires_at')
+
+    def __init__(self, body, etag, expires_at):
+        self.body = body
+        self.etag = etag
+        self.expires_at = expires_at  # time.monotonic() deadline
+
+
+class ResponseCache:
+    """Thread-safe TTL + LRU cache of serialized per-user responses."""
+
+    def __init__(self, ttl=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        Initialize the cache.
+
+        Args:
+            ttl (float): Seconds an entry stays fresh without a change notification,
+                capped at MAX_TTL_SECONDS
+            max_entries (int): Maximum number of cached responses before LRU eviction
+        """
+        self.ttl = min(ttl, MAX_TTL_SECONDS)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (user_id, query) -> CachedResponse
+        # Invalidation stamps, so a fill that raced an invalidate() is not cached;
+        # users without one share _floor, and the map is reset when it outgrows the cache
+        self._counter = itertools.count(1)
+        self._generations = {}  # user_id -> stamp of the last invalidation
+        self._floor = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+
+    def generation(self, user_id):
+        """
+        Get a user's change counter; pass it to put() so a fetch that started
+        before a change notification is not cached.
+
+        Args:
+            user_id (str): Unique user identifier
+
+        Returns:
+            int: Current generation
+        """
+        with self._lock:
+            return self._generations.get(user_id, self._floor)
+
+    def get(self, user_id, query):
+        """
+        Return the cached response for a user and query, or None if missing or expired.
+
+        Args:
+            user_id (str): Unique user identifier
+            query (tuple): Hashable description of the request parameters
+
+        Returns:
+            CachedResponse or None: Cached response
+        """
+        key = (user_id, query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, user_id, query, events, generation=None):
+        """
+        Serialize and store an events response.
+
+        Args:
+            user_id (str): Unique user identifier
+            query (tuple): Hashable description of the request parameters
+            events (list): Event resources to return
+            generation (int, optional): generation() taken before the fetch; the
+                entry is not stored if the user's calendar changed since
+
+        Returns:
+            CachedResponse: The response, stored or not
+        """
+        body = json.dumps(events, separators=(",", ":")).encode()
+        now = time.time()
+        ttl = self.ttl
+        valid_until = events_valid_until(events)
+        if valid_until is not None:
+            ttl = min(ttl, valid_until - now)
+        entry = CachedResponse(body, make_etag(body), time.monotonic() + ttl)
+
+        with self._lock:
+            if ttl <= 0 or self.max_entries <= 0:
+                return entry
+            if generation is not None and generation != self._generations.get(user_id, self._floor):
+                return entry
+            key = (user_id, query)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, user_id=None, calendar_id=None):
+        """
+        Drop a user's cached responses, or everything. Matches the
+        WatchManager.add_listener() callback signature.
+
+        Args:
+            user_id (str, optional): User whose responses to drop. Defaults to all users.
+            calendar_id (str, optional): Changed calendar; responses are per user, so
+                every calendar's are dropped
+
+        Returns:
+            int: Number of entries removed
+        """
+        with self._lock:
+            self.invalidations += 1
+            if user_id is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                self._generations.clear()
+                self._floor = next(self._counter)
+                return removed
+
+            if len(self._generations) >= self.max_entries:
+                # Raising the floor invalidates every in-flight fill, not just this user's
+                self._generations.clear()
+                self._floor = next(self._counter)
+            self._generations[user_id] = next(self._counter)
+            stale = [key for key in self._entries if key[0] == user_id]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def record_not_modified(self):
+        """Count a 304 answered from this cache."""
+        with self._lock:
+            self.not_modified += 1
+
+    def stats(self):
+        """
+        Get cache counters.
+
+        Returns:
+            dict: hits, misses, 304s sent, invalidations and current size
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "invalidations": self.invalidations,
+                "size": len(self._entries),
+            }
@@ -9,7 +9,7 @@ from google.adk.models.lite_llm import LiteLlm
 
 from pathlib import Path
 import asyncio
-from calendar_service import get_current_schedule
+from calendar_service import get_current_schedule, get_current_schedule_async, find_free_time
 
 SYSTEM_PROMPT_PATH = Path(__file__).parent.parent / "prompts/system_prompt.md"
 with open(SYSTEM_PROMPT_PATH, "r") as f:
@@ -25,7 +25,7 @@ root_agent = Agent(
         "Agent to Plan and schedule tasks based on user input."
     ),
     instruction=SCHEDULER_MODEL_SYSTEM_PROMPT,
-    tools =[get_current_schedule]
+    tools =[get_current_schedule_async, find_free_time]
 
 )
 
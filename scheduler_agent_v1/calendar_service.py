@@ -3,6 +3,7 @@ Google Calendar integration service for ScheduleAI.
 Handles authentication and calendar data retrieval.
 """
 
+import asyncio
 from datetime import datetime, timedelta
 import os.path
 import pickle
@@ -10,10 +11,63 @@ from pathlib import Path
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from event_cache import default_cache, make_cache_key
+from calendar_api import CalendarAccessError, default_pool
+from calendar_backends import GoogleCalendarBackend
+from schedule_formatter import format_schedule
+from free_busy import event_interval, format_free_slots, index_for, to_epoch
 
 SCOPES = ['https://www.googleapis.com/auth/calendar.readonly']
+LOCAL_USER_ID = 'local'  # Cache identity for the single-user token.pickle
+
+# Google Calendar reads, with the optional mirror and expander configured below
+_google_backend = GoogleCalendarBackend(default_pool)
+
+# Optional CalendarBackend replacing Google, see set_calendar_backend()
+_calendar_backend = None
+
+def set_calendar_backend(backend):
+    """
+    Read events from another source, e.g. ICS files or the synthetic generator.
+    
+    Args:
+        backend (CalendarBackend or None): Backend to use, or None for Google Calendar
+    """
+    global _calendar_backend
+    _calendar_backend = backend
+    default_cache.invalidate(LOCAL_USER_ID)
+
+def _backend():
+    return _calendar_backend if _calendar_backend is not None else _google_backend
+
+# Optional CalendarMirror answering window queries locally, see set_event_mirror()
+_event_mirror = None
+
+def set_event_mirror(mirror):
+    """
+    Serve event windows from a local, incrementally synced mirror.
+    
+    Args:
+        mirror (CalendarMirror or None): Mirror to use, or None to query the API directly
+    """
+    global _event_mirror
+    _event_mirror = mirror
+    _google_backend.event_mirror = mirror
+
+# Optional RecurrenceExpander expanding recurring events locally, see set_recurrence_expander()
+_recurrence_expander = None
+
+def set_recurrence_expander(expander):
+    """
+    Expand recurring events locally from cached masters instead of singleEvents=True.
+    
+    Args:
+        expander (RecurrenceExpander or None): Expander to use, or None for server expansion
+    """
+    global _recurrence_expander
+    _recurrence_expander = expander
+    _google_backend.recurrence_expander = expander
 
 def authenticate_google_calendar():
     """
@@ -63,92 +117,232 @@ def authenticate_google_calendar():
     
     return creds, None
 
-def get_calendar_events(start_date=None, end_date=None):
+def get_calendar_events(start_date=None, end_date=None, use_cache=True):
     """
-    Retrieve calendar events from Google Calendar.
+    Retrieve calendar events from Google Calendar (or the configured backend).
+    
+    Results are served from the shared event cache when available, so repeated
+    schedule lookups within the cache TTL do not hit the API.
     
     Args:
         start_date (datetime, optional): Start date for events. Defaults to today's start.
         end_date (datetime, optional): End date for events. Defaults to today's end.
+        use_cache (bool, optional): Read through the shared event cache. Defaults to True.
+    
+    Returns:
+        tuple: (events_list, error_message)
+    """
+    # Set default date range (today)
+    if start_date is None:
+        now = datetime.now()
+        start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    if end_date is None:
+        end_date = start_date + timedelta(days=1)
+    
+    if not use_cache:
+        return _fetch_calendar_events(start_date, end_date)
+    
+    key = make_cache_key(LOCAL_USER_ID, 'primary', start_date, end_date)
+    return default_cache.get_or_fetch(
+        key, lambda: _fetch_calendar_events(start_date, end_date))
+
+def _fetch_calendar_events(start_date, end_date):
+    """
+    Fetch calendar events for a window directly from the calendar backend.
+    
+    Args:
+        start_date (datetime): Start date for events
+        end_date (datetime): End date for events
     
     Returns:
         tuple: (events_list, error_message)
     """
     try:
-        # Authenticate
-        creds, auth_error = authenticate_google_calendar()
-        if auth_error:
-            return None, auth_error
-        
-        if not creds:
-            return None, "Authentication failed - no valid credentials"
-        
-        # Build the service
-        service = build('calendar', 'v3', credentials=creds)
-        
-        # Set default date range (today)
-        if start_date is None:
-            now = datetime.now()
-            start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        if end_date is None:
-            start_date = start_date if start_date else datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-            end_date = start_date + timedelta(days=1)
-        
-        # Call the Calendar API
-        events_result = service.events().list(
-            calendarId='primary',
-            timeMin=start_date.isoformat() + 'Z',
-            timeMax=end_date.isoformat() + 'Z',
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
+        backend = _backend()
+        creds = None
+        if backend.requires_credentials:
+            # Authenticate
+            creds, auth_error = authenticate_google_calendar()
+            if auth_error:
+                return None, auth_error
+            
+            if not creds:
+                return None, "Authentication failed - no valid credentials"
         
-        events = events_result.get('items', [])
-        return events, None
+        return backend.list_events(LOCAL_USER_ID, start_date, end_date, creds), None
         
+    except CalendarAccessError as error:
+        return None, str(error)
     except HttpError as error:
         return None, f"Google Calendar API error: {error}"
     except Exception as e:
         return None, f"Unexpected error: {str(e)}"
 
-def format_calendar_events(events, date_str=None):
+def iter_calendar_events(start_date, end_date, chunk_days=30, max_workers=4):
+    """
+    Stream calendar events in start-time order, page by page.
+    
+    Long ranges are split into chunk_days sub-windows fetched concurrently, so
+    week and month planning keeps memory bounded. Results bypass the event cache.
+    
+    Args:
+        start_date (datetime): Start date for events
+        end_date (datetime): End date for events
+        chunk_days (int, optional): Sub-window length in days. Defaults to 30.
+        max_workers (int, optional): Sub-windows fetched concurrently. Defaults to 4.
+    
+    Yields:
+        CompactEvent: Calendar events
+    
+    Raises:
+        CalendarAccessError: If authentication or an API call fails
+    """
+    backend = _backend()
+    creds = None
+    if backend.requires_credentials:
+        creds, auth_error = authenticate_google_calendar()
+        if auth_error:
+            raise CalendarAccessError(auth_error)
+        
+        if not creds:
+            raise CalendarAccessError("Authentication failed - no valid credentials")
+    
+    try:
+        yield from backend.iter_events(
+            LOCAL_USER_ID, start_date, end_date, creds,
+            chunk_days=chunk_days, max_workers=max_workers)
+    except HttpError as error:
+        raise CalendarAccessError(f"Google Calendar API error: {error}") from error
+
+async def get_calendar_events_async(start_date=None, end_date=None, use_cache=True):
+    """
+    Async version of get_calendar_events() that does not block the event loop.
+    
+    Args:
+        start_date (datetime, optional): Start date for events. Defaults to today's start.
+        end_date (datetime, optional): End date for events. Defaults to today's end.
+        use_cache (bool, optional): Read through the shared event cache. Defaults to True.
+    
+    Returns:
+        tuple: (events_list, error_message)
+    """
+    # Set default date range (today)
+    if start_date is None:
+        now = datetime.now()
+        start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    if end_date is None:
+        end_date = start_date + timedelta(days=1)
+    
+    async def fetch():
+        backend = _backend()
+        creds = None
+        if backend.requires_credentials:
+            creds, auth_error = await asyncio.to_thread(authenticate_google_calendar)
+            if auth_error:
+                return None, auth_error
+            if not creds:
+                return None, "Authentication failed - no valid credentials"
+        
+        try:
+            return await backend.list_events_async(LOCAL_USER_ID, start_date, end_date, creds), None
+        except CalendarAccessError as error:
+            return None, str(error)
+        except HttpError as error:
+            return None, f"Google Calendar API error: {error}"
+        except Exception as e:
+            return None, f"Unexpected error: {str(e)}"
+    
+    if not use_cache:
+        return await fetch()
+    
+    key = make_cache_key(LOCAL_USER_ID, 'primary', start_date, end_date)
+    return await default_cache.get_or_fetch_async(key, fetch)
+
+def format_calendar_events(events, date_str=None, tz=None):
     """
     Format calendar events into a readable string.
     
     Args:
-        events (list): List of calendar events from Google Calendar API
+        events (list): CompactEvent objects (raw API events are parsed on the fly)
         date_str (str, optional): Date string for display. Defaults to today.
+        tz (tzinfo, optional): Display timezone. Defaults to each event's own offset.
     
     Returns:
         str: Formatted schedule string
     """
-    if not events:
-        date_display = date_str or datetime.now().strftime('%Y-%m-%d')
-        return f"No events scheduled for {date_display}."
+    return format_schedule(events, date_str, "Current schedule for", tz)
+
+def find_free_slots(duration_minutes=30, window=None, granularity_minutes=15):
+    """
+    Find free ranges that fit a meeting of the given length.
     
-    schedule_items = []
-    for event in events:
-        start = event['start'].get('dateTime', event['start'].get('date'))
-        summary = event.get('summary', 'No title')
-        location = event.get('location', '')
-        
-        # Format time for display
-        if 'T' in start:  # dateTime format (timed event)
-            start_time = datetime.fromisoformat(start.replace('Z', '+00:00'))
-            time_str = start_time.strftime("%I:%M %p")
-        else:  # all-day event
-            time_str = "All day"
-        
-        # Add location if available
-        event_str = f"{summary} at {time_str}"
-        if location:
-            event_str += f" ({location})"
-        
-        schedule_items.append(event_str)
+    Args:
+        duration_minutes (int, optional): Meeting length. Defaults to 30.
+        window (tuple, optional): (start_date, end_date). Defaults to the rest of today.
+        granularity_minutes (int, optional): Slot alignment. Defaults to 15.
+    
+    Returns:
+        tuple: (list of (start_epoch, end_epoch), error_message)
+    """
+    start_date, end_date = window if window else (None, None)
+    events, error = get_calendar_events(start_date, end_date)
+    if error:
+        return None, error
+    
+    if start_date is None:
+        start_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    if end_date is None:
+        end_date = start_date + timedelta(days=1)
+    
+    window_start = to_epoch(start_date)
+    if window is None:
+        # Only offer time that hasn't passed yet
+        window_start = max(window_start, int(datetime.now().timestamp()))
+    
+    slots = index_for(events).free_slots(
+        window_start, to_epoch(end_date), duration_minutes * 60, granularity_minutes * 60)
+    return slots, None
+
+def find_conflicts(event):
+    """
+    Find calendar events that overlap a proposed event.
+    
+    Args:
+        event (dict): Event with 'start' and 'end' in Calendar API format
+    
+    Returns:
+        tuple: (conflicting_events, error_message)
+    """
+    interval = event_interval(event)
+    if interval is None:
+        return [], None
     
-    date_display = date_str or datetime.now().strftime('%Y-%m-%d')
-    return f"Current schedule for {date_display}:\n" + "\n".join(schedule_items)
+    start_date = datetime.utcfromtimestamp(interval[0])
+    end_date = datetime.utcfromtimestamp(interval[1])
+    events, error = get_calendar_events(start_date, end_date)
+    if error:
+        return None, error
+    return index_for(events).conflicts(event), None
+
+def find_free_time(duration_minutes: int = 30) -> str:
+    """
+    Find free time left today for a task or meeting of the given length.
+    
+    Args:
+        duration_minutes (int): Length of the task or meeting in minutes
+    
+    Returns:
+        str: Free time ranges or error message
+    """
+    try:
+        slots, error = find_free_slots(duration_minutes)
+        if error:
+            return f"Calendar access error: {error}"
+        return format_free_slots(slots, duration_minutes)
+    except Exception as e:
+        return f"Unexpected error finding free time: {str(e)}"
 
 def get_current_schedule():
     """
@@ -171,4 +365,27 @@ def get_current_schedule():
         return format_calendar_events(events)
         
     except Exception as e:
-        return f"Unexpected error retrieving schedule: {str(e)}"
\ No newline at end of file
+        return f"Unexpected error retrieving schedule: {str(e)}"
+
+async def get_current_schedule_async():
+    """
+    Get the current day's schedule from Google Calendar without blocking the event loop.
+    
+    Returns:
+        str: Formatted schedule string or error message
+    """
+    try:
+        # Get today's events
+        events, error = await get_calendar_events_async()
+        
+        if error:
+            return f"Calendar access error: {error}"
+        
+        if events is None:
+            return "Failed to retrieve calendar events."
+        
+        # Format and return the schedule
+        return format_calendar_events(events)
+        
+    except Exception as e:
+        return f"Unexpected error retrieving schedule: {str(e)}"
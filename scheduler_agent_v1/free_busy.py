@@ -0,0 +1,253 @@
+"""
+Free/busy interval index for ScheduleAI.
+Turns fetched calendar events into sorted busy intervals so free-slot and
+conflict queries don't have to scan (or be reasoned out by the LLM) event by event.
+"""
+
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime, timezone
+from compact_event import CompactEvent, parse_events
+
+INDEX_CACHE_SIZE = 256
+
+
+def to_epoch(value):
+    """
+    Convert a datetime to epoch seconds; naive datetimes are UTC, as in API queries.
+
+    Args:
+        value (datetime): Datetime to convert
+
+    Returns:
+        int: Seconds since the epoch
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def event_interval(event, tz=None):
+    """
+    Get the busy interval of an event.
+
+    All-day dates run from midnight to midnight in tz, the user's zone.
+    Cancelled and transparent ("show as available") events do not block time.
+
+    Args:
+        event (CompactEvent or dict): Parsed event, or an event resource in Calendar API format
+        tz (tzinfo, optional): Zone all-day dates are days in. Defaults to UTC.
+
+    Returns:
+        tuple or None: (start_epoch, end_epoch), or None if the event is not busy time
+    """
+    event = CompactEvent.from_api(event)
+    if event is None or not event.busy:
+        return None
+    start, end = event.interval(tz)
+    return (start, end) if end > start else (start, start + 1)
+
+
+class IntervalIndex:
+    """
+    Static index over event intervals.
+
+    Events are sorted by start with a max-end segment tree on top, so overlap
+    queries cost O(log n + k log n); merged busy blocks answer free-slot queries
+    in O(log n + k) for k gaps in the window.
+    """
+
+    def __init__(self, events, tz=None):
+        """
+        Build the index.
+
+        Args:
+            events (list): CompactEvent objects (or event resources); non-busy events are skipped
+            tz (tzinfo, optional): Zone all-day dates are days in. Defaults to UTC.
+        """
+        self.tz = tz
+        items = []
+        for event in parse_events(events):
+            interval = event_interval(event, tz)
+            if interval is not None:
+                items.append((interval[0], interval[1], event))
+        items.sort(key=lambda item: (item[0], item[1]))
+
+        self.starts = [item[0] for item in items]
+        self.ends = [item[1] for item in items]
+        self.events = [item[2] for item in items]
+
+        # Max-end segment tree over the start-sorted intervals
+        self._size = 1
+        while self._size < max(1, len(items)):
+            self._size *= 2
+        self._max_end = [float('-inf')] * (2 * self._size)
+        for i, end in enumerate(self.ends):
+            self._max_end[self._size + i] = end
+        for node in range(self._size - 1, 0, -1):
+            self._max_end[node] = max(self._max_end[2 * node], self._max_end[2 * node + 1])
+
+        # Merged, disjoint busy blocks
+        self.busy_starts = []
+        self.busy_ends = []
+        for start, end in zip(self.starts, self.ends):
+            if self.busy_ends and start <= self.busy_ends[-1]:
+                self.busy_ends[-1] = max(self.busy_ends[-1], end)
+            else:
+                self.busy_starts.append(start)
+                self.busy_ends.append(end)
+
+    def __len__(self):
+        return len(self.events)
+
+    def overlapping(self, start, end):
+        """
+        Get events overlapping [start, end).
+
+        Args:
+            start (int): Epoch seconds
+            end (int): Epoch seconds
+
+        Returns:
+            list: Events in start order
+        """
+        limit = bisect_left(self.starts, end)  # only events starting before `end` can overlap
+        if limit == 0:
+            return []
+
+        found = []
+        stack = [(1, 0, self._size)]
+        while stack:
+            node, lo, hi = stack.pop()
+            if lo >= limit or self._max_end[node] <= start:
+                continue
+            if hi - lo == 1:
+                found.append(lo)
+                continue
+            mid = (lo + hi) // 2
+            stack.append((2 * node + 1, mid, hi))
+            stack.append((2 * node, lo, mid))
+        return [self.events[i] for i in sorted(found)]
+
+    def conflicts(self, event):
+        """
+        Get indexed events that overlap an event.
+
+        Args:
+            event (dict): Event resource (needs 'start' and 'end')
+
+        Returns:
+            list: Conflicting events, excluding the event itself (matched by id)
+        """
+        interval = event_interval(event, self.tz)
+        if interval is None:
+            return []
+        event_id = event.get('id')
+        return [
+            other for other in self.overlapping(*interval)
+            if event_id is None or other.id != event_id
+        ]
+
+    def is_free(self, start, end):
+        """
+        Check whether [start, end) is free of busy time.
+
+        Args:
+            start (int): Epoch seconds
+            end (int): Epoch seconds
+
+        Returns:
+            bool: True if no busy block overlaps
+        """
+        i = bisect_right(self.busy_ends, start)
+        return i >= len(self.busy_starts) or self.busy_starts[i] >= end
+
+    def free_slots(self, window_start, window_end, duration, granularity=900):
+        """
+        Get free ranges inside a window that can fit a meeting.
+
+        Range starts are rounded up and ends rounded down to the granularity.
+
+        Args:
+            window_start (int): Epoch seconds
+            window_end (int): Epoch seconds
+            duration (int): Required length in seconds
+            granularity (int, optional): Alignment in seconds. Defaults to 15 minutes.
+
+        Returns:
+            list: (start_epoch, end_epoch) ranges, each at least `duration` long
+        """
+        granularity = max(1, int(granularity))
+        slots = []
+        cursor = window_start
+        i = bisect_right(self.busy_ends, window_start)
+
+        while cursor < window_end:
+            gap_end = window_end
+            if i < len(self.busy_starts):
+                gap_end = min(window_end, self.busy_starts[i])
+
+            start = -(-cursor // granularity) * granularity
+            end = gap_end // granularity * granularity
+            if end - start >= duration:
+                slots.append((start, end))
+
+            if i >= len(self.busy_starts):
+                break
+            cursor = max(cursor, self.busy_ends[i])
+            i += 1
+
+        return slots
+
+
+_index_cache = OrderedDict()  # (id(events), tz) -> (events, IntervalIndex)
+
+
+def index_for(events, tz=None):
+    """
+    Get an IntervalIndex for an event list, reusing it while the same list is passed.
+
+    Cached event lists are shared objects, so repeated queries on an unchanged
+    schedule skip rebuilding the index.
+
+    Args:
+        events (list): Event resources
+        tz (tzinfo, optional): Zone all-day dates are days in. Defaults to UTC.
+
+    Returns:
+        IntervalIndex: Index over the events
+    """
+    key = (id(events), tz)
+    entry = _index_cache.get(key)
+    if entry is not None and entry[0] is events:
+        _index_cache.move_to_end(key)
+        return entry[1]
+
+    index = IntervalIndex(events, tz)
+    _index_cache[key] = (events, index)
+    while len(_index_cache) > INDEX_CACHE_SIZE:
+        _index_cache.popitem(last=False)
+    return index
+
+
+def format_free_slots(slots, duration_minutes, tz=None):
+    """
+    Format free ranges for the agent.
+
+    Args:
+        slots (list): (start_epoch, end_epoch) ranges
+        duration_minutes (int): Requested meeting length, for the message
+        tz (tzinfo, optional): Display timezone. Defaults to the local timezone.
+
+    Returns:
+        str: Human-readable list of free ranges
+    """
+    if not slots:
+        return f"No free slots of {duration_minutes} minutes found."
+
+    lines = []
+    for start, end in slots:
+        start_time = datetime.fromtimestamp(start, tz).astimezone(tz)
+        end_time = datetime.fromtimestamp(end, tz).astimezone(tz)
+        lines.append(f"{start_time.strftime('%I:%M %p')} - {end_time.strftime('%I:%M %p')}")
+    return f"Free slots for a {duration_minutes}-minute meeting:\n" + "\n".join(lines)
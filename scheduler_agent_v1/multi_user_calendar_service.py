@@ -3,39 +3,95 @@ Multi-user Google Calendar integration service for ScheduleAI.
 Handles per-user authentication and calendar data retrieval.
 """
 
-from datetime import datetime, timedelta
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import contextvars
+from datetime import datetime, time, timedelta, timezone
 import os.path
-import pickle
-import hashlib
 from pathlib import Path
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from compact_event import COMPACT_EVENT_FIELDS, parse_events
+from event_cache import default_cache, make_cache_key
+from calendar_api import CALENDAR_API_ENDPOINT, PAGE_SIZE, CalendarAccessError, default_pool, event_list_fields
+from async_calendar_client import default_async_client
+from calendar_backends import GoogleCalendarBackend
+from schedule_formatter import format_schedule
+from free_busy import event_interval, format_free_slots, index_for, to_epoch
+from group_availability import find_group_slots
+from credential_store import CredentialStore, legacy_token_hash, migrate_pickle_tokens
+from schedule_prewarmer import SchedulePrewarmer
+from calendar_changes import CalendarChangeFeed
+from models import UserToken
+from metrics import EVENTS_FETCH_SECONDS, default_registry, record_error
+from request_scheduler import BACKGROUND, RETRY_STATUSES, is_rate_limited, request_priority
 
 SCOPES = ['https://www.googleapis.com/auth/calendar.readonly']
+BATCH_LIMIT = 50  # Calendar API maximum number of calls per batch request
+BATCH_POOL_KEY = '__batch__'  # Pool key for the unauthenticated batch transport
 
 class MultiUserCalendarService:
     """Handles Google Calendar authentication and access for multiple users."""
     
-    def __init__(self, base_path=None):
+    def __init__(self, base_path=None, event_cache=None, event_mirror=None, service_pool=None,
+                 async_client=None, credential_store=None, recurrence_expander=None, backend=None,
+                 watch_manager=None, change_feed=None):
         """
         Initialize the calendar service.
         
         Args:
-            base_path (str, optional): Base directory for storing user tokens
+            base_path (str, optional): Base directory holding credentials.json and
+                legacy user_tokens/
+            event_cache (EventCache, optional): Event cache to read through. Defaults
+                to the process-wide shared cache.
+            event_mirror (CalendarMirror, optional): Local mirror synced with sync
+                tokens; when set, windows are answered locally after a delta sync.
+            service_pool (CalendarServicePool, optional): Pool of reusable service
+                objects. Defaults to the process-wide shared pool.
+            async_client (AsyncCalendarClient, optional): Client for the *_async methods.
+                Defaults to the process-wide shared client.
+            credential_store (CredentialStore, optional): Where user credentials are
+                kept. Defaults to the UserToken table with this service's client.
+            recurrence_expander (RecurrenceExpander, optional): When set, recurring
+                events are expanded locally from cached masters instead of by the API.
+            backend (CalendarBackend, optional): Where events are read from. Defaults to
+                Google Calendar with the mirror, expander and pools given above.
+            watch_manager (WatchManager, optional): Push channels to stop when a user's
+                access is revoked
+            change_feed (CalendarChangeFeed, optional): Feed of calendar changes reported
+                by push notifications (possibly to another process); each one invalidates
+                this service's cached events and recurrence masters for the user
         """
         self.base_path = Path(base_path) if base_path else Path(__file__).parent
+        self.event_cache = event_cache if event_cache is not None else default_cache
+        self.event_mirror = event_mirror
+        self.service_pool = service_pool if service_pool is not None else default_pool
+        self.async_client = async_client if async_client is not None else default_async_client
+        self.recurrence_expander = recurrence_expander
+        self.watch_manager = watch_manager
+        if change_feed is not None:
+            change_feed.add_listener(self.invalidate_user)
+        if backend is None:
+            backend = GoogleCalendarBackend(self.service_pool, event_mirror, recurrence_expander, self.async_client)
+        self.backend = backend
+        self._timezones = {}  # user_id -> ZoneInfo, or None for server-local days
         self.credentials_path = self.base_path / "credentials.json"
-        self.tokens_dir = self.base_path / "user_tokens"
+        self.tokens_dir = self.base_path / "user_tokens"  # legacy pickle tokens, see migrate_legacy_tokens()
         
-        # Create tokens directory if it doesn't exist
-        self.tokens_dir.mkdir(exist_ok=True)
+        if credential_store is not None:
+            self.credential_store = credential_store
+        elif self.credentials_path.exists():
+            self.credential_store = CredentialStore.from_client_secrets_file(self.credentials_path)
+        else:
+            # Stored tokens can still be read; refreshing needs credentials.json
+            self.credential_store = CredentialStore(None, None)
     
     def _get_user_token_path(self, user_id):
         """
-        Get the token file path for a specific user.
+        Get the legacy pickle token file path for a specific user.
         
         Args:
             user_id (str): Unique user identifier
@@ -44,115 +100,514 @@ class MultiUserCalendarService:
             Path: Path to user's token file
         """
         # Hash user_id for privacy and filename safety
-        user_hash = hashlib.sha256(user_id.encode()).hexdigest()[:16]
-        return self.tokens_dir / f"token_{user_hash}.pickle"
+        return self.tokens_dir / f"token_{legacy_token_hash(user_id)}.pickle"
     
-    def authenticate_user(self, user_id):
+    def migrate_legacy_tokens(self, user_ids, delete=False):
+        """
+        Import this service's legacy token_<hash>.pickle files into the credential store.
+        
+        Args:
+            user_ids (iterable): Known user identifiers (file names only carry a hash)
+            delete (bool, optional): Remove each pickle file after importing it
+            
+        Returns:
+            dict: 'migrated' user ids, 'unmatched' file names and 'failed' messages
+        """
+        return migrate_pickle_tokens(self.credential_store, self.tokens_dir, user_ids, delete=delete)
+    
+    def authenticate_user(self, user_id, allow_oauth_flow=True):
         """
         Authenticate a specific user with Google Calendar API.
         
         Args:
             user_id (str): Unique user identifier
+            allow_oauth_flow (bool, optional): Start the interactive OAuth flow when the
+                user has no stored token. Defaults to True.
             
         Returns:
             tuple: (credentials, error_message)
         """
-        creds = None
-        token_path = self._get_user_token_path(user_id)
+        # Load (and refresh if needed) this user's stored credentials
+        try:
+            creds, error = self.credential_store.get_valid(user_id)
+        except Exception as e:
+            return None, f"Failed to load user token: {str(e)}"
         
-        # Load existing token for this user
-        if token_path.exists():
-            try:
-                with open(token_path, 'rb') as token:
-                    creds = pickle.load(token)
-            except Exception as e:
-                return None, f"Failed to load user token: {str(e)}"
+        if error:
+            return None, error
         
-        # Check if credentials are valid or need refresh
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                try:
-                    creds.refresh(Request())
-                except Exception as e:
-                    return None, f"Failed to refresh credentials for user {user_id}: {str(e)}"
-            else:
-                # Check if credentials.json exists
-                if not self.credentials_path.exists():
-                    return None, (
-                        f"Google Calendar credentials.json not found at {self.credentials_path}. "
-                        "Please download from Google Cloud Console."
-                    )
-                
-                try:
-                    # Run OAuth flow for this user
-                    flow = InstalledAppFlow.from_client_secrets_file(
-                        str(self.credentials_path), SCOPES)
-                    
-                    # Use different port for each user to avoid conflicts
-                    port = hash(user_id) % 1000 + 8000  # Port range: 8000-8999
-                    creds = flow.run_local_server(port=port)
-                    
-                except Exception as e:
-                    return None, f"OAuth flow failed for user {user_id}: {str(e)}"
+        if creds:
+            return creds, None
+        
+        if not allow_oauth_flow:
+            return None, f"No stored credentials for user {user_id}"
+        
+        # Check if credentials.json exists
+        if not self.credentials_path.exists():
+            return None, (
+                f"Google Calendar credentials.json not found at {self.credentials_path}. "
+                "Please download from Google Cloud Console."
+            )
+        
+        try:
+            # Run OAuth flow for this user
+            flow = InstalledAppFlow.from_client_secrets_file(
+                str(self.credentials_path), SCOPES)
             
-            # Save credentials for this user
-            try:
-                with open(token_path, 'wb') as token:
-                    pickle.dump(creds, token)
-            except Exception as e:
-                return None, f"Failed to save credentials for user {user_id}: {str(e)}"
+            # Use different port for each user to avoid conflicts
+            port = hash(user_id) % 1000 + 8000  # Port range: 8000-8999
+            creds = flow.run_local_server(port=port)
+            
+        except Exception as e:
+            return None, f"OAuth flow failed for user {user_id}: {str(e)}"
+        
+        # Save credentials for this user
+        try:
+            self.credential_store.save(user_id, creds)
+        except Exception as e:
+            return None, f"Failed to save credentials for user {user_id}: {str(e)}"
         
         return creds, None
     
-    def get_user_calendar_events(self, user_id, start_date=None, end_date=None):
+    def user_timezone(self, user_id):
+        """
+        Get a user's timezone, which defines their "today".
+        
+        Args:
+            user_id (str): Unique user identifier
+            
+        Returns:
+            ZoneInfo or None: Stored zone, or None to use the server's local day
+        """
+        if user_id in self._timezones:
+            return self._timezones[user_id]
+        
+        session = self.credential_store.session_factory()
+        try:
+            name = session.query(UserToken.timezone).filter_by(user_id=user_id).scalar()
+        finally:
+            session.close()
+        
+        try:
+            tz = ZoneInfo(name) if name else None
+        except (ZoneInfoNotFoundError, ValueError):
+            tz = None
+        self._timezones[user_id] = tz
+        return tz
+    
+    def set_user_timezone(self, user_id, name):
+        """
+        Store a user's timezone.
+        
+        Args:
+            user_id (str): Unique user identifier
+            name (str): IANA zone name, e.g. 'Europe/Berlin'
+            
+        Returns:
+            tuple: (success, error_message)
+        """
+        try:
+            tz = ZoneInfo(name)
+        except (ZoneInfoNotFoundError, ValueError):
+            return False, f"Unknown timezone {name!r} for user {user_id}"
+        
+        session = self.credential_store.session_factory()
+        try:
+            updated = session.query(UserToken).filter_by(user_id=user_id).update({'timezone': name})
+            session.commit()
+        finally:
+            session.close()
+        if not updated:
+            return False, f"No stored credentials for user {user_id}"
+        self._timezones[user_id] = tz
+        return True, None
+    
+    def lookup_user_timezone(self, user_id):
+        """
+        Read a user's timezone from their primary calendar and store it.
+        
+        Args:
+            user_id (str): Unique user identifier
+            
+        Returns:
+            tuple: (ZoneInfo or None, error_message)
+        """
+        try:
+            creds = None
+            if self.backend.requires_credentials:
+                creds, auth_error = self.authenticate_user(user_id, allow_oauth_flow=False)
+                if auth_error:
+                    return None, auth_error
+            name = self.backend.get_timezone(user_id, creds)
+        except HttpError as error:
+            return None, f"Google Calendar API error for user {user_id}: {error}"
+        except Exception as e:
+            return None, f"Unexpected error for user {user_id}: {str(e)}"
+        
+        if not name:
+            return None, None
+        success, error = self.set_user_timezone(user_id, name)
+        return (self._timezones[user_id], None) if success else (None, error)
+    
+    def day_window(self, user_id, day):
+        """
+        Get the UTC window covering one of the user's local days.
+        
+        Args:
+            user_id (str): Unique user identifier
+            day (date): Local calendar date
+            
+        Returns:
+            tuple: (start_date, end_date) as naive UTC datetimes
+        """
+        tz = self.user_timezone(user_id)
+        if tz is None:
+            start_date = datetime.combine(day, time())
+            return start_date, start_date + timedelta(days=1)
+        
+        # Computed per end so days with a DST change are 23 or 25 hours long
+        start, end = (
+            datetime.combine(local_day, time(), tz).astimezone(timezone.utc).replace(tzinfo=None)
+            for local_day in (day, day + timedelta(days=1))
+        )
+        return start, end
+    
+    def today_window(self, user_id):
+        """
+        Get the UTC window covering the user's local today.
+        
+        Args:
+            user_id (str): Unique user identifier
+            
+        Returns:
+            tuple: (start_date, end_date) as naive UTC datetimes
+        """
+        return self.day_window(user_id, datetime.now(self.user_timezone(user_id)).date())
+    
+    def _window_or_today(self, user_id, window):
+        """Fill in a (start_date, end_date) window, defaulting to the user's local today."""
+        start_date, end_date = window if window else (None, None)
+        if start_date is None:
+            start_date, today_end = self.today_window(user_id)
+            end_date = end_date or today_end
+        if end_date is None:
+            end_date = start_date + timedelta(days=1)
+        return start_date, end_date
+    
+    def get_user_calendar_events(self, user_id, start_date=None, end_date=None, use_cache=True):
         """
         Retrieve calendar events for a specific user.
         
         Args:
             user_id (str): Unique user identifier
-            start_date (datetime, optional): Start date for events
+            start_date (datetime, optional): Start date for events. Defaults to the start
+                of the user's local today.
             end_date (datetime, optional): End date for events
+            use_cache (bool, optional): Read through the event cache. Defaults to True.
             
         Returns:
             tuple: (events_list, error_message)
         """
-        try:
-            # Authenticate user
+        # Set default date range (the user's local today)
+        start_date, end_date = self._window_or_today(user_id, (start_date, end_date))
+        
+        if not use_cache:
+            return self._fetch_user_calendar_events(user_id, start_date, end_date)
+        
+        key = make_cache_key(user_id, 'primary', start_date, end_date)
+        return self.event_cache.get_or_fetch(
+            key, lambda: self._fetch_user_calendar_events(user_id, start_date, end_date))
+    
+    def _fetch_user_calendar_events(self, user_id, start_date, end_date, allow_oauth_flow=True):
+        """
+        Fetch a user's events for a window directly from the calendar backend.
+        
+        Args:
+            user_id (str): Unique user identifier
+            start_date (datetime): Start date for events
+            end_date (datetime): End date for events
+            allow_oauth_flow (bool, optional): Start the OAuth flow for users without a
+                stored token. Defaults to True.
+            
+        Returns:
+            tuple: (events_list, error_message)
+        """
+        with EVENTS_FETCH_SECONDS.time(mode='sync'):
+            try:
+                creds = None
+                if self.backend.requires_credentials:
+                    # Authenticate user
+                    creds, auth_error = self.authenticate_user(user_id, allow_oauth_flow=allow_oauth_flow)
+                    if auth_error:
+                        record_error('events_fetch', 'auth')
+                        return None, auth_error
+                    
+                    if not creds:
+                        record_error('events_fetch', 'auth')
+                        return None, f"Authentication failed for user {user_id}"
+                
+                return self.backend.list_events(user_id, start_date, end_date, creds), None
+                
+            except CalendarAccessError as error:
+                record_error('events_fetch', error)
+                return None, str(error)
+            except HttpError as error:
+                record_error('events_fetch', error)
+                return None, f"Google Calendar API error for user {user_id}: {error}"
+            except Exception as e:
+                record_error('events_fetch', e)
+                return None, f"Unexpected error for user {user_id}: {str(e)}"
+    
+    def iter_user_calendar_events(self, user_id, start_date, end_date, chunk_days=30, max_workers=4):
+        """
+        Stream a user's events in start-time order, page by page.
+        
+        Long ranges are split into chunk_days sub-windows fetched concurrently, so
+        week and month planning keeps memory bounded. Results bypass the event cache.
+        
+        Args:
+            user_id (str): Unique user identifier
+            start_date (datetime): Start date for events
+            end_date (datetime): End date for events
+            chunk_days (int, optional): Sub-window length in days. Defaults to 30.
+            max_workers (int, optional): Sub-windows fetched concurrently. Defaults to 4.
+            
+        Yields:
+            CompactEvent: Calendar events
+            
+        Raises:
+            CalendarAccessError: If authentication or an API call fails
+        """
+        creds = None
+        if self.backend.requires_credentials:
             creds, auth_error = self.authenticate_user(user_id)
             if auth_error:
-                return None, auth_error
+                raise CalendarAccessError(auth_error)
             
             if not creds:
-                return None, f"Authentication failed for user {user_id}"
+                raise CalendarAccessError(f"Authentication failed for user {user_id}")
+        
+        try:
+            yield from self.backend.iter_events(
+                user_id, start_date, end_date, creds, chunk_days=chunk_days, max_workers=max_workers)
+        except HttpError as error:
+            raise CalendarAccessError(f"Google Calendar API error for user {user_id}: {error}") from error
+    
+    def get_schedules_bulk(self, user_ids, window=None, max_workers=8, use_batch=True, batch_size=BATCH_LIMIT):
+        """
+        Fetch the same window for many users, yielding each result as it completes.
+        
+        Users are authenticated and fetched on a bounded worker pool. With use_batch,
+        each worker sends up to batch_size users' list calls as one Calendar batch HTTP
+        request; every call still carries its own user's credentials. Users without
+        stored tokens are reported as errors instead of starting an OAuth flow.
+        
+        Args:
+            user_ids (iterable): User identifiers
+            window (tuple, optional): (start_date, end_date). Defaults to each user's
+                local today.
+            max_workers (int, optional): Maximum concurrent workers. Defaults to 8.
+            use_batch (bool, optional): Group calls into batch requests. Ignored for
+                non-Google backends, when an event mirror or recurrence expander is
+                configured, since those read per user, or when CALENDAR_API_ENDPOINT
+                points elsewhere. Defaults to True.
+            batch_size (int, optional): Users per batch request, at most 50
             
-            # Build the service
-            service = build('calendar', 'v3', credentials=creds)
+        Yields:
+            tuple: (user_id, events_list, error_message)
+        """
+        # Serve what we can from the cache before touching the network; misses are
+        # grouped by window, since users in different zones have different todays
+        pending = {}  # (start_date, end_date) -> [user_id, ...]
+        generations = {}  # user_id -> cache generation before the fetch
+        for user_id in dict.fromkeys(user_ids):
+            user_window = self._window_or_today(user_id, window)
+            events, generations[user_id] = self.event_cache.lookup(make_cache_key(user_id, 'primary', *user_window))
+            if events is not None:
+                yield user_id, events, None
+            else:
+                pending.setdefault(user_window, []).append(user_id)
+        
+        if not pending:
+            return
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}  # future -> window
+            # Batch requests always go to Google's batch URI, so skip them for custom endpoints
+            batched = (use_batch and isinstance(self.backend, GoogleCalendarBackend)
+                       and not self.backend.reads_per_user and not CALENDAR_API_ENDPOINT)
+            batch_size = max(1, min(batch_size, BATCH_LIMIT))
+            for (start_date, end_date), window_users in pending.items():
+                # Workers run in the caller's context so they keep its request priority
+                if batched:
+                    for i in range(0, len(window_users), batch_size):
+                        futures[executor.submit(contextvars.copy_context().run, self._fetch_batch,
+                                                window_users[i:i + batch_size], start_date, end_date)] = (start_date, end_date)
+                else:
+                    for user_id in window_users:
+                        futures[executor.submit(contextvars.copy_context().run, self._fetch_one,
+                                                user_id, start_date, end_date)] = (start_date, end_date)
             
-            # Set default date range (today)
-            if start_date is None:
-                now = datetime.now()
-                start_date = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            for future in as_completed(futures):
+                for user_id, events, error in future.result():
+                    if error is None:
+                        self.event_cache.put(make_cache_key(user_id, 'primary', *futures[future]), events,
+                                             generation=generations[user_id])
+                    yield user_id, events, error
+
+    
+    def _fetch_one(self, user_id, start_date, end_date):
+        """
+        Fetch one user's window for get_schedules_bulk().
+        
+        Returns:
+            list: [(user_id, events_list, error_message)]
+        """
+        events, error = self._fetch_user_calendar_events(user_id, start_date, end_date, allow_oauth_flow=False)
+        return [(user_id, events, error)]
+    
+    def _fetch_batch(self, user_ids, start_date, end_date):
+        """
+        Fetch several users' windows with a single Calendar batch HTTP request.
+        
+        Google counts each part against its user's and the project's quota, so each
+        part takes a token from both scheduler buckets. Parts that come back
+        rate-limited or with a server error are sent again, in a smaller batch,
+        after a backoff. A user whose window spans several pages has the next
+        page requested in the following batch round.
+        
+        Returns:
+            list: [(user_id, events_list, error_message), ...]
+        """
+        results = []
+        pending = {}  # request id -> (user_id, creds, page_token)
+        items = {}  # request id -> event resources of the pages received so far
+        
+        for user_id in user_ids:
+            creds, auth_error = self.authenticate_user(user_id, allow_oauth_flow=False)
+            if auth_error:
+                results.append((user_id, None, auth_error))
+            else:
+                request_id = str(len(pending))
+                pending[request_id] = (user_id, creds, None)
+                items[request_id] = []
+        
+        scheduler = self.service_pool.scheduler
+        attempt = 0
+        while pending:
+            retry = {}
+            retry_after = []
+            next_pages = {}
             
-            if end_date is None:
-                start_date = start_date if start_date else datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-                end_date = start_date + timedelta(days=1)
+            def on_response(request_id, response, exception):
+                user_id = pending[request_id][0]
+                if exception is not None:
+                    if isinstance(exception, HttpError):
+                        status = exception.resp.status
+                        rate_limited = is_rate_limited(status, exception.content)
+                        if rate_limited or status in RETRY_STATUSES:
+                            if attempt < scheduler.max_retries:
+                                retry[request_id] = pending[request_id]
+                                retry_after.append(exception.resp.get('retry-after'))
+                                return
+                            if rate_limited:
+                                scheduler.record_rate_limited()
+                        results.append((user_id, None, f"Google Calendar API error for user {user_id}: {exception}"))
+                    else:
+                        results.append((user_id, None, f"Unexpected error for user {user_id}: {str(exception)}"))
+                else:
+                    items[request_id].extend(response.get('items', []))
+                    if response.get('nextPageToken'):
+                        next_pages[request_id] = pending[request_id][:2] + (response['nextPageToken'],)
+                    else:
+                        results.append((user_id, parse_events(items.pop(request_id)), None))
             
-            # Call the Calendar API
-            events_result = service.events().list(
-                calendarId='primary',
-                timeMin=start_date.isoformat() + 'Z',
-                timeMax=end_date.isoformat() + 'Z',
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
+            try:
+                # The pooled batch transport is unauthenticated and unpaced; each part
+                # carries its user's token and is charged to its user here
+                with self.service_pool.service(BATCH_POOL_KEY, None) as service:
+                    batch = service.new_batch_http_request(callback=on_response)
+                    for request_id, (user_id, creds, page_token) in pending.items():
+                        scheduler.acquire(user_id)
+                        request = service.events().list(
+                            calendarId='primary',
+                            timeMin=start_date.isoformat() + 'Z',
+                            timeMax=end_date.isoformat() + 'Z',
+                            singleEvents=True,
+                            orderBy='startTime',
+                            maxResults=PAGE_SIZE,
+                            pageToken=page_token,
+                            fields=event_list_fields(COMPACT_EVENT_FIELDS),
+                        )
+                        request.http = AuthorizedHttp(creds, http=request.http)
+                        batch.add(request, request_id=request_id)
+                    
+                    batch.execute()
+                
+            except Exception as e:
+                answered = {result[0] for result in results}
+                for user_id, _, _ in pending.values():
+                    if user_id not in answered:
+                        results.append((user_id, None, f"Batch request failed for user {user_id}: {str(e)}"))
+                return results
             
-            events = events_result.get('items', [])
-            return events, None
+            if retry:
+                scheduler.backoff(attempt, next((value for value in retry_after if value), None))
+                attempt += 1
+            pending = {**retry, **next_pages}
+        
+        return results
+    
+    async def get_user_calendar_events_async(self, user_id, start_date=None, end_date=None, use_cache=True):
+        """
+        Async version of get_user_calendar_events() that does not block the event loop.
+        
+        Token loading and refresh run in a worker thread; the API call goes through the
+        shared httpx connection pool. With an event mirror or recurrence expander
+        configured, or a backend without an async client, the blocking fetch path is
+        used in a worker thread instead.
+        
+        Args:
+            user_id (str): Unique user identifier
+            start_date (datetime, optional): Start date for events
+            end_date (datetime, optional): End date for events
+            use_cache (bool, optional): Read through the event cache. Defaults to True.
             
-        except HttpError as error:
-            return None, f"Google Calendar API error for user {user_id}: {error}"
-        except Exception as e:
-            return None, f"Unexpected error for user {user_id}: {str(e)}"
+        Returns:
+            tuple: (events_list, error_message)
+        """
+        # Set default date range (the user's local today)
+        start_date, end_date = self._window_or_today(user_id, (start_date, end_date))
+        
+        async def fetch():
+            with EVENTS_FETCH_SECONDS.time(mode='async'):
+                creds = None
+                if self.backend.requires_credentials:
+                    creds, auth_error = await asyncio.to_thread(self.authenticate_user, user_id)
+                    if auth_error:
+                        record_error('events_fetch', 'auth')
+                        return None, auth_error
+                    if not creds:
+                        record_error('events_fetch', 'auth')
+                        return None, f"Authentication failed for user {user_id}"
+                
+                try:
+                    return await self.backend.list_events_async(user_id, start_date, end_date, creds), None
+                except CalendarAccessError as error:
+                    record_error('events_fetch', error)
+                    return None, str(error)
+                except HttpError as error:
+                    record_error('events_fetch', error)
+                    return None, f"Google Calendar API error for user {user_id}: {error}"
+                except Exception as e:
+                    record_error('events_fetch', e)
+                    return None, f"Unexpected error for user {user_id}: {str(e)}"
+        
+        if not use_cache:
+            return await fetch()
+        
+        key = make_cache_key(user_id, 'primary', start_date, end_date)
+        return await self.event_cache.get_or_fetch_async(key, fetch)
     
     def get_user_schedule(self, user_id):
         """
@@ -167,43 +622,190 @@ class MultiUserCalendarService:
         try:
             # Get today's events for this user
             events, error = self.get_user_calendar_events(user_id)
+            return self._format_user_schedule(user_id, events, error)
             
-            if error:
-                return f"Calendar access error for user {user_id}: {error}"
+        except Exception as e:
+            return f"Unexpected error retrieving schedule for user {user_id}: {str(e)}"
+    
+    async def get_user_schedule_async(self, user_id):
+        """
+        Async version of get_user_schedule(), suitable for registering as an ADK tool.
+        
+        Args:
+            user_id (str): Unique user identifier
             
-            if events is None:
-                return f"Failed to retrieve calendar events for user {user_id}."
+        Returns:
+            str: Formatted schedule string or error message
+        """
+        try:
+            events, error = await self.get_user_calendar_events_async(user_id)
+            return self._format_user_schedule(user_id, events, error)
             
-            # Format events
-            if not events:
-                date_display = datetime.now().strftime('%Y-%m-%d')
-                return f"No events scheduled for {date_display}."
+        except Exception as e:
+            return f"Unexpected error retrieving schedule for user {user_id}: {str(e)}"
+    
+    def _format_user_schedule(self, user_id, events, error):
+        """
+        Format a user's fetched events (or fetch error) into the schedule string.
+        
+        Args:
+            user_id (str): Unique user identifier
+            events (list): Events from get_user_calendar_events()
+            error (str): Error message from get_user_calendar_events()
             
-            schedule_items = []
-            for event in events:
-                start = event['start'].get('dateTime', event['start'].get('date'))
-                summary = event.get('summary', 'No title')
-                location = event.get('location', '')
-                
-                # Format time for display
-                if 'T' in start:  # dateTime format (timed event)
-                    start_time = datetime.fromisoformat(start.replace('Z', '+00:00'))
-                    time_str = start_time.strftime("%I:%M %p")
-                else:  # all-day event
-                    time_str = "All day"
-                
-                # Add location if available
-                event_str = f"{summary} at {time_str}"
-                if location:
-                    event_str += f" ({location})"
-                
-                schedule_items.append(event_str)
+        Returns:
+            str: Formatted schedule string or error message
+        """
+        if error:
+            return f"Calendar access error for user {user_id}: {error}"
+        
+        if events is None:
+            return f"Failed to retrieve calendar events for user {user_id}."
+        
+        return format_schedule(events, title="Schedule for", tz=self.user_timezone(user_id))
+    
+    def warm_user_schedule(self, user_id, day=None, ttl=None):
+        """
+        Fetch and format a user's day ahead of time so the first request is a cache hit.
+        
+        Runs at background priority and never starts an OAuth flow.
+        
+        Args:
+            user_id (str): Unique user identifier
+            day (date, optional): Local day to warm. Defaults to the user's today.
+            ttl (float, optional): Seconds to keep the events. Defaults to the cache TTL.
             
-            date_display = datetime.now().strftime('%Y-%m-%d')
-            return f"Schedule for {date_display}:\n" + "\n".join(schedule_items)
+        Returns:
+            tuple: (events_list, error_message)
+        """
+        if day is None:
+            day = datetime.now(self.user_timezone(user_id)).date()
+        start_date, end_date = self.day_window(user_id, day)
+        generation = self.event_cache.generation(user_id)
+        
+        with request_priority(BACKGROUND):
+            [(_, events, error)] = self._fetch_one(user_id, start_date, end_date)
+        if error:
+            return None, error
+        
+        self.event_cache.put(make_cache_key(user_id, 'primary', start_date, end_date), events, ttl,
+                             generation=generation)
+        # Renders each event's line into the shared formatter's cache
+        self._format_user_schedule(user_id, events, None)
+        return events, None
+    
+    def find_free_slots(self, user_id, duration_minutes=30, window=None, granularity_minutes=15):
+        """
+        Find free ranges in a user's calendar that fit a meeting of the given length.
+        
+        Args:
+            user_id (str): Unique user identifier
+            duration_minutes (int, optional): Meeting length. Defaults to 30.
+            window (tuple, optional): (start_date, end_date). Defaults to the rest of the
+                user's local today.
+            granularity_minutes (int, optional): Slot alignment. Defaults to 15.
             
-        except Exception as e:
-            return f"Unexpected error retrieving schedule for user {user_id}: {str(e)}"
+        Returns:
+            tuple: (list of (start_epoch, end_epoch), error_message)
+        """
+        start_date, end_date = self._window_or_today(user_id, window)
+        
+        events, error = self.get_user_calendar_events(user_id, start_date, end_date)
+        if error:
+            return None, error
+        
+        window_start = to_epoch(start_date)
+        if window is None:
+            # Only offer time that hasn't passed yet
+            window_start = max(window_start, int(datetime.now().timestamp()))
+        
+        # All-day events block the user's local day, not the UTC one
+        slots = index_for(events, self.user_timezone(user_id)).free_slots(
+            window_start, to_epoch(end_date), duration_minutes * 60, granularity_minutes * 60)
+        return slots, None
+    
+    def find_conflicts(self, user_id, event):
+        """
+        Find events in a user's calendar that overlap a proposed event.
+        
+        Args:
+            user_id (str): Unique user identifier
+            event (dict): Event with 'start' and 'end' in Calendar API format
+            
+        Returns:
+            tuple: (conflicting_events, error_message)
+        """
+        tz = self.user_timezone(user_id)
+        interval = event_interval(event, tz)
+        if interval is None:
+            return [], None
+        
+        start_date = datetime.utcfromtimestamp(interval[0])
+        end_date = datetime.utcfromtimestamp(interval[1])
+        events, error = self.get_user_calendar_events(user_id, start_date, end_date)
+        if error:
+            return None, error
+        return index_for(events, tz).conflicts(event), None
+    
+    def find_group_slots(self, user_ids, duration_minutes=30, window=None, slot_minutes=15,
+                         quorum=None, top=10, max_workers=8):
+        """
+        Rank meeting slots that the most attendees can make.
+        
+        Schedules are fetched with get_schedules_bulk(); attendees whose calendars
+        could not be read are left out of the ranking and reported separately.
+        
+        Args:
+            user_ids (list): Attendee user identifiers
+            duration_minutes (int, optional): Meeting length. Defaults to 30.
+            window (tuple, optional): (start_date, end_date). Defaults to the first
+                attendee's (the organizer's) local today.
+            slot_minutes (int, optional): Slot resolution. Defaults to 15.
+            quorum (int, optional): Minimum attendees free throughout. Defaults to everyone reachable.
+            top (int, optional): Number of candidates to return. Defaults to 10.
+            max_workers (int, optional): Concurrent fetches. Defaults to 8.
+            
+        Returns:
+            tuple: (candidate slots, {user_id: error_message})
+        """
+        if not user_ids:
+            return [], {}
+        # One window for everyone, so slots are comparable across attendees
+        start_date, end_date = self._window_or_today(user_ids[0], window)
+        
+        attendee_ids = []
+        busy_intervals = []
+        errors = {}
+        for user_id, events, error in self.get_schedules_bulk(user_ids, (start_date, end_date), max_workers=max_workers):
+            if error:
+                errors[user_id] = error
+                continue
+            attendee_ids.append(user_id)
+            # Each attendee's all-day events block their own local day
+            tz = self.user_timezone(user_id)
+            busy_intervals.append([
+                interval for interval in (event_interval(event, tz) for event in events) if interval is not None
+            ])
+        
+        if not attendee_ids:
+            return [], errors
+        
+        candidates = find_group_slots(
+            busy_intervals, to_epoch(start_date), to_epoch(end_date), duration_minutes,
+            slot_minutes=slot_minutes, quorum=quorum, top=top, attendee_ids=attendee_ids)
+        return candidates, errors
+    
+    def invalidate_user(self, user_id, calendar_id=None):
+        """
+        Drop a user's cached events and recurrence masters after their calendar changed.
+        
+        Args:
+            user_id (str): Unique user identifier
+            calendar_id (str, optional): Changed calendar. Defaults to all of the user's calendars.
+        """
+        self.event_cache.invalidate(user_id, calendar_id)
+        if self.recurrence_expander is not None:
+            self.recurrence_expander.invalidate(user_id, calendar_id)
     
     def revoke_user_access(self, user_id):
         """
@@ -216,23 +818,29 @@ class MultiUserCalendarService:
             tuple: (success, message)
         """
         try:
-            token_path = self._get_user_token_path(user_id)
+            # While the token still works, so the channels are stopped with Google too
+            if self.watch_manager is not None:
+                self.watch_manager.unwatch_user(user_id)
+            creds = self.credential_store.get(user_id)
             
-            if token_path.exists():
-                # Load and revoke the token
+            if creds is not None:
+                # Revoke the token with Google
                 try:
-                    with open(token_path, 'rb') as token:
-                        creds = pickle.load(token)
-                    
-                    # Revoke the token with Google
-                    if creds and creds.valid:
+                    if creds.valid:
                         creds.revoke(Request())
                 except Exception as e:
                     # Continue with deletion even if revocation fails
                     pass
                 
-                # Delete the token file
-                token_path.unlink()
+                # Delete the stored credentials and any cached events
+                self.credential_store.delete(user_id)
+                self.event_cache.invalidate(user_id)
+                self.service_pool.discard(user_id)
+                if self.event_mirror is not None:
+                    self.event_mirror.forget_user(user_id)
+                if self.recurrence_expander is not None:
+                    self.recurrence_expander.invalidate(user_id)
+                self._timezones.pop(user_id, None)
                 return True, f"Access revoked for user {user_id}"
             else:
                 return True, f"No stored credentials found for user {user_id}"
@@ -255,6 +863,93 @@ def get_user_schedule(user_id):
     """
     return _calendar_service.get_user_schedule(user_id)
 
+async def get_user_schedule_async(user_id):
+    """
+    Async wrapper to get schedule for a specific user, for use as an ADK tool.
+    
+    Args:
+        user_id (str): Unique user identifier
+        
+    Returns:
+        str: Formatted schedule string
+    """
+    return await _calendar_service.get_user_schedule_async(user_id)
+
+def find_user_free_time(user_id: str, duration_minutes: int = 30) -> str:
+    """
+    Find free time left today in a user's calendar for a task or meeting.
+    
+    Args:
+        user_id (str): Unique user identifier
+        duration_minutes (int): Length of the task or meeting in minutes
+        
+    Returns:
+        str: Free time ranges or error message
+    """
+    try:
+        slots, error = _calendar_service.find_free_slots(user_id, duration_minutes)
+        if error:
+            return f"Calendar access error for user {user_id}: {error}"
+        return format_free_slots(slots, duration_minutes, _calendar_service.user_timezone(user_id))
+    except Exception as e:
+        return f"Unexpected error finding free time for user {user_id}: {str(e)}"
+
+def get_cache_stats():
+    """
+    Get hit/miss/eviction counters for the shared event cache.
+    
+    Returns:
+        dict: Cache statistics
+    """
+    return _calendar_service.event_cache.stats()
+
+def get_scheduler_stats():
+    """
+    Get queue depth, throttling delay and backoff counters for Calendar requests.
+    
+    Returns:
+        dict: Request scheduler metrics
+    """
+    return _calendar_service.service_pool.scheduler.stats()
+
+def get_metrics():
+    """
+    Get latency histograms, error counters and gauges in the Prometheus text format.
+    
+    Shares metric names with the web services' /metrics endpoint.
+    
+    Returns:
+        str: Exposition text
+    """
+    return default_registry.render()
+
+def start_schedule_prewarmer(**kwargs):
+    """
+    Warm the shared service's schedules ahead of each user's local day start.
+    
+    Args:
+        **kwargs: Passed to SchedulePrewarmer
+        
+    Returns:
+        SchedulePrewarmer: The running pre-warmer
+    """
+    return SchedulePrewarmer(_calendar_service, **kwargs).start()
+
+def start_change_listener(**kwargs):
+    """
+    Invalidate the shared service's caches when push notifications (received by
+    the web service) report a calendar change.
+    
+    Args:
+        **kwargs: Passed to CalendarChangeFeed
+        
+    Returns:
+        CalendarChangeFeed: The running feed
+    """
+    change_feed = CalendarChangeFeed(**kwargs)
+    change_feed.add_listener(_calendar_service.invalidate_user)
+    return change_feed.start()
+
 def get_current_schedule(user_id="default"):
     """
     Backward compatibility wrapper.
@@ -0,0 +1,142 @@
+"""
+Schedule text formatter shared by the ScheduleAI calendar services.
+
+Each event's line is rendered once and cached by event id and etag, so a
+schedule where only a few events changed re-renders only those lines, and an
+unchanged (cached) event list is answered from a memoized result.
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+import threading
+from compact_event import parse_events
+
+LINE_CACHE_SIZE = 8192
+RENDER_CACHE_SIZE = 256
+
+
+class ScheduleFormatter:
+    """Renders event lists as schedule text with per-event line caching."""
+
+    def __init__(self, line_cache_size=LINE_CACHE_SIZE, render_cache_size=RENDER_CACHE_SIZE):
+        """
+        Initialize the formatter.
+
+        Args:
+            line_cache_size (int, optional): Formatted event lines kept
+            render_cache_size (int, optional): Whole rendered event lists kept
+        """
+        self.line_cache_size = line_cache_size
+        self.render_cache_size = render_cache_size
+        self._lines = OrderedDict()  # (event key, tz) -> line
+        self._renders = OrderedDict()  # (id(events), tz) -> (events, lines)
+        self._lock = threading.Lock()
+        self.line_hits = 0
+        self.line_misses = 0
+
+    @staticmethod
+    def _event_key(event):
+        # The etag changes whenever the event does; without one, key on the fields shown
+        if event.etag:
+            return event.id, event.etag
+        return event.id, event.start, event.utc_offset, event.all_day, event.summary, event.location
+
+    @staticmethod
+    def render_line(event, tz=None):
+        """
+        Render one event as a schedule line.
+
+        Args:
+            event (CompactEvent): Event to render
+            tz (tzinfo, optional): Display timezone. Defaults to the event's own offset.
+
+        Returns:
+            str: e.g. "Standup at 09:00 AM (Room 4A)"
+        """
+        if event.all_day:
+            time_str = "All day"
+        elif tz is None:
+            time_str = event.start_datetime().strftime("%I:%M %p")
+        else:
+            time_str = datetime.fromtimestamp(event.start, tz).strftime("%I:%M %p")
+
+        line = f"{event.summary or 'No title'} at {time_str}"
+        if event.location:
+            line += f" ({event.location})"
+        return line
+
+    def lines(self, events, tz=None):
+        """
+        Get the schedule lines for a list of events.
+
+        Args:
+            events (list): CompactEvent objects (raw API events are parsed on the fly)
+            tz (tzinfo, optional): Display timezone. Defaults to each event's own offset.
+
+        Returns:
+            list: One line per event, in order
+        """
+        render_key = (id(events), tz)
+        with self._lock:
+            entry = self._renders.get(render_key)
+            if entry is not None and entry[0] is events and len(entry[1]) == len(events):
+                self._renders.move_to_end(render_key)
+                return entry[1]
+
+        rendered = []
+        with self._lock:
+            for event in parse_events(events):
+                key = (self._event_key(event), tz)
+                line = self._lines.get(key)
+                if line is None:
+                    line = self._lines[key] = self.render_line(event, tz)
+                    self.line_misses += 1
+                else:
+                    self._lines.move_to_end(key)
+                    self.line_hits += 1
+                rendered.append(line)
+            while len(self._lines) > self.line_cache_size:
+                self._lines.popitem(last=False)
+
+            self._renders[render_key] = (events, rendered)
+            while len(self._renders) > self.render_cache_size:
+                self._renders.popitem(last=False)
+        return rendered
+
+    def format(self, events, date_str=None, title="Current schedule for", tz=None):
+        """
+        Format events into the schedule string the agent tools return.
+
+        Args:
+            events (list): Events to format
+            date_str (str, optional): Date string for display. Defaults to today.
+            title (str, optional): Heading before the date
+            tz (tzinfo, optional): Display timezone. Defaults to each event's own offset.
+
+        Returns:
+            str: Formatted schedule string
+        """
+        date_display = date_str or datetime.now(tz).strftime('%Y-%m-%d')
+        if not events:
+            return f"No events scheduled for {date_display}."
+        return f"{title} {date_display}:\n" + "\n".join(self.lines(events, tz))
+
+    def clear(self):
+        """Drop all cached lines and renders."""
+        with self._lock:
+            self._lines.clear()
+            self._renders.clear()
+
+
+# Shared formatter used by both calendar services
+default_formatter = ScheduleFormatter()
+
+
+def format_schedule(events, date_str=None, title="Current schedule for", tz=None):
+    """
+    Format events with the shared formatter. See ScheduleFormatter.format().
+
+    Returns:
+        str: Formatted schedule string
+    """
+    return default_formatter.format(events, date_str, title, tz)
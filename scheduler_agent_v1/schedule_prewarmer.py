@@ -0,0 +1,184 @@
+"""
+Schedule pre-warming for ScheduleAI.
+
+Shortly before each active user's local day starts, fetches and formats
+that day's schedule through MultiUserCalendarService and keeps it in the
+event cache, so the first "plan my day" request is a cache hit instead of
+paying for token refresh, service build and the API call.
+
+The cache is in-process, so the pre-warmer must run in the process that
+serves schedule requests. Size CALENDAR_CACHE_MAX_ENTRIES to the number of
+active users, and enable push notifications (calendar_watch) so a warmed
+day is dropped when the calendar changes.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+from datetime import datetime, time, timedelta, timezone
+import random
+import threading
+from sqlalchemy import or_
+from models import UserToken
+
+
+class SchedulePrewarmer:
+    """Warms each active user's schedule ahead of their local day start."""
+
+    def __init__(self, calendar_service, session_factory=None, day_start=time(7, 0),
+                 lead=timedelta(minutes=30), hold=timedelta(hours=3), interval=300, jitter=0.2,
+                 max_workers=8, lookup_timezones=True):
+        """
+        Initialize the pre-warmer.
+
+        Args:
+            calendar_service (MultiUserCalendarService): Service whose cache is filled
+            session_factory (callable, optional): SQLAlchemy session factory. Defaults to
+                the one behind the service's credential store.
+            day_start (time, optional): Local time each user's day starts
+            lead (timedelta, optional): Warm this long before the day starts
+            hold (timedelta, optional): Keep warmed schedules until this long after the
+                day starts; users whose day started longer ago are not warmed
+            interval (float, optional): Seconds between scans; keep it well under lead
+            jitter (float, optional): Fraction of the interval to randomize each sleep by
+            max_workers (int, optional): Users warmed concurrently
+            lookup_timezones (bool, optional): Read missing timezones from each user's
+                primary calendar before warming
+        """
+        self.calendar_service = calendar_service
+        self.session_factory = session_factory or calendar_service.credential_store.session_factory
+        self.day_start = day_start
+        self.lead = lead
+        self.hold = hold
+        self.interval = interval
+        self.jitter = jitter
+        self.max_workers = max_workers
+        self.lookup_timezones = lookup_timezones
+        self._warmed = {}  # user_id -> local date last warmed
+        self._looked_up = set()  # users whose missing timezone was already requested
+        self._stop = threading.Event()
+        self._thread = None
+
+    def active_users(self, now=None):
+        """
+        Get users whose stored token is usable: refreshable, or not yet expired.
+
+        Args:
+            now (datetime, optional): Current naive UTC time. Defaults to utcnow().
+
+        Returns:
+            list: (user_id, timezone name or None) tuples
+        """
+        now = now or datetime.utcnow()
+        session = self.session_factory()
+        try:
+            return [
+                tuple(row) for row in
+                session.query(UserToken.user_id, UserToken.timezone)
+                .filter(or_(UserToken.refresh_token != '', UserToken.token_expiry > now))
+                .all()
+            ]
+        finally:
+            session.close()
+
+    def _due_day(self, user_id, now):
+        """Get the local day to warm for a user, or None if nothing is due."""
+        tz = self.calendar_service.user_timezone(user_id)
+        local_now = now.astimezone(tz).replace(tzinfo=None) if tz else now.astimezone().replace(tzinfo=None)
+        # Today's start may still be ahead, or tomorrow's may be within the lead
+        for day in (local_now.date(), local_now.date() + timedelta(days=1)):
+            day_start = datetime.combine(day, self.day_start)
+            if day_start - self.lead <= local_now < day_start + self.hold and self._warmed.get(user_id) != day:
+                return day, (day_start + self.hold - local_now).total_seconds()
+        return None
+
+    def due_users(self, now=None):
+        """
+        Get users whose day starts within the lead and who are not warmed for it yet.
+
+        Args:
+            now (datetime, optional): Current aware time. Defaults to now.
+
+        Returns:
+            list: (user_id, local day, seconds to keep the schedule) tuples
+        """
+        now = now or datetime.now(timezone.utc)
+        due = []
+        for user_id, tz_name in self.active_users(now.astimezone(timezone.utc).replace(tzinfo=None)):
+            if tz_name is None and self.lookup_timezones and user_id not in self._looked_up:
+                self._looked_up.add(user_id)
+                _, error = self.calendar_service.lookup_user_timezone(user_id)
+                if error:
+                    print(f"[PREWARM] timezone lookup failed for {user_id}: {error}")
+            entry = self._due_day(user_id, now)
+            if entry is not None:
+                due.append((user_id,) + entry)
+        return due
+
+    def _warm(self, user_id, day, ttl):
+        _, error = self.calendar_service.warm_user_schedule(user_id, day, ttl)
+        return user_id, day, error
+
+    def run_once(self, now=None):
+        """
+        Warm every due user once.
+
+        Args:
+            now (datetime, optional): Current aware time. Defaults to now.
+
+        Returns:
+            dict: 'warmed' count, 'failed' count and 'errors' messages
+        """
+        result = {"warmed": 0, "failed": 0, "errors": []}
+        due = self.due_users(now)
+        if not due:
+            return result
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="prewarm") as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, self._warm, *entry)
+                for entry in due
+            ]
+            for future in futures:
+                user_id, day, error = future.result()
+                if error:
+                    result["failed"] += 1
+                    result["errors"].append(error)
+                else:
+                    self._warmed[user_id] = day
+                    result["warmed"] += 1
+        return result
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                result = self.run_once()
+                if result["warmed"] or result["failed"]:
+                    print(f"[PREWARM] warmed={result['warmed']} failed={result['failed']}")
+            except Exception as e:
+                print(f"[PREWARM] scan failed: {e}")
+            delay = self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+            self._stop.wait(delay)
+
+    def start(self):
+        """
+        Run the pre-warmer on a daemon thread.
+
+        Returns:
+            SchedulePrewarmer: self
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="schedule-prewarmer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """
+        Stop the background thread.
+
+        Args:
+            timeout (float, optional): Seconds to wait for it to exit
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
@@ -0,0 +1,41 @@
+"""
+Shared fixtures for the ScheduleAI tests: a fake Calendar API server and a
+scratch SQLite database per test, so nothing talks to Google or touches
+database.db.
+"""
+
+import os
+from pathlib import Path
+import sys
+import tempfile
+
+ROOT = Path(__file__).resolve().parent.parent
+# Modules import each other by flat name, as when run from the repo root with the agent on PYTHONPATH
+sys.path[:0] = [str(ROOT), str(ROOT / "scheduler_agent_v1")]
+# db.py creates its default engine on import; keep it out of the working tree
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "schedulai-test.db"))
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+import calendar_api
+from db import create_db_engine
+from fake_calendar_server import FakeCalendarServer
+from models import Base
+
+
+@pytest.fixture
+def fake_server(monkeypatch):
+    """A running FakeCalendarServer that calendar_api builds services against."""
+    server = FakeCalendarServer().start()
+    monkeypatch.setattr(calendar_api, "CALENDAR_API_ENDPOINT", server.endpoint)
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """Session factory for an empty database with every table created."""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
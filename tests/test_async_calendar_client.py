@@ -0,0 +1,73 @@
+"""Tests for the asyncio Calendar client against the fake Calendar API."""
+
+import asyncio
+from datetime import datetime, timedelta
+
+from google.oauth2.credentials import Credentials
+import httpx
+import pytest
+
+from async_calendar_client import AsyncCalendarClient
+from request_scheduler import RequestScheduler
+
+WINDOW = (datetime(2026, 3, 2), datetime(2026, 3, 3))
+
+
+def _event(event_id, hour):
+    return {
+        "id": event_id,
+        "summary": "Meeting",
+        "start": {"dateTime": f"2026-03-02T{hour:02d}:00:00Z"},
+        "end": {"dateTime": f"2026-03-02T{hour:02d}:30:00Z"},
+    }
+
+
+@pytest.fixture
+def creds():
+    return Credentials(token="token", expiry=datetime.utcnow() + timedelta(hours=1))
+
+
+def test_client_survives_repeated_event_loops(fake_server, creds):
+    """Each asyncio.run() gets a connection pool of its own loop, not a closed loop's."""
+    fake_server.put_event(_event("e1", 9))
+    client = AsyncCalendarClient(api_endpoint=fake_server.endpoint)
+
+    async def list_ids():
+        events, error = await client.list_events(creds, *WINDOW, user_id="alice")
+        assert error is None
+        return [event.id for event in events], client._get_client()
+
+    first_ids, first_pool = asyncio.run(list_ids())
+    second_ids, second_pool = asyncio.run(list_ids())
+
+    assert first_ids == second_ids == ["e1"]
+    assert second_pool is not first_pool
+
+
+def test_list_events_follows_every_page(monkeypatch):
+    """Events past the first page are returned, and a 401 on a later page refreshes and retries it."""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        page_token = request.url.params.get("pageToken")
+        if page_token is None:
+            return httpx.Response(200, json={"items": [_event("e1", 9)], "nextPageToken": "page-2"})
+        if request.headers["Authorization"] == "Bearer token":
+            return httpx.Response(401, json={"error": {"code": 401}})
+        return httpx.Response(200, json={"items": [_event("e2", 11)]})
+
+    def refresh(request):
+        creds.token = "refreshed"
+        creds.expiry = datetime.utcnow() + timedelta(hours=1)
+
+    creds = Credentials(token="token", refresh_token="refresh", expiry=datetime.utcnow() + timedelta(hours=1))
+    monkeypatch.setattr(creds, "refresh", refresh)
+    client = AsyncCalendarClient(api_endpoint="https://calendar.test/", scheduler=RequestScheduler(),
+                                 transport=httpx.MockTransport(handler))
+
+    events, error = asyncio.run(client.list_events(creds, *WINDOW, user_id="alice"))
+
+    assert error is None
+    assert [event.id for event in events] == ["e1", "e2"]
+    assert [request.url.params.get("pageToken") for request in requests] == [None, "page-2", "page-2"]
@@ -0,0 +1,34 @@
+"""Tests for streaming split-window event reads against the fake Calendar API."""
+
+from datetime import datetime, timedelta
+
+from google.oauth2.credentials import Credentials
+import pytest
+
+from calendar_api import CalendarServicePool, iter_events
+
+
+@pytest.fixture
+def creds():
+    return Credentials(token="token", expiry=datetime.utcnow() + timedelta(hours=1))
+
+
+@pytest.mark.parametrize("time_zone, window_start", [
+    # Listed by both sub-windows, though its UTC-midnight start is after the boundary
+    ("Pacific/Auckland", datetime(2026, 3, 1)),
+    # Listed only by the second, though its UTC-midnight start is before the boundary
+    ("America/New_York", datetime(2026, 3, 1, 3)),
+])
+def test_all_day_event_at_split_boundary_is_yielded_once(fake_server, creds, time_zone, window_start):
+    """An all-day event near a sub-window boundary is streamed exactly once in any zone."""
+    fake_server.time_zones["primary"] = time_zone
+    fake_server.put_event({"id": "holiday", "summary": "Holiday",
+                           "start": {"date": "2026-03-02"}, "end": {"date": "2026-03-03"}})
+    fake_server.put_event({"id": "standup", "summary": "Standup",
+                           "start": {"dateTime": "2026-03-01T23:30:00Z"},
+                           "end": {"dateTime": "2026-03-02T04:00:00Z"}})
+
+    events = iter_events(CalendarServicePool(), "alice", creds, window_start, window_start + timedelta(days=3),
+                         chunk=timedelta(days=1))
+
+    assert sorted(event.id for event in events) == ["holiday", "standup"]
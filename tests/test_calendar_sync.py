@@ -0,0 +1,115 @@
+"""Tests for the sync-token driven event mirror against the fake Calendar API."""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from google.oauth2.credentials import Credentials
+import pytest
+
+from calendar_api import CalendarServicePool
+from calendar_sync import CalendarMirror
+from models import CalendarSyncState
+
+WINDOW = (datetime(2026, 3, 1), datetime(2026, 3, 8))
+
+
+def _event(event_id, day, summary="Meeting"):
+    return {
+        "id": event_id,
+        "summary": summary,
+        "start": {"dateTime": f"2026-03-0{day}T10:00:00Z"},
+        "end": {"dateTime": f"2026-03-0{day}T11:00:00Z"},
+    }
+
+
+@pytest.fixture
+def service(fake_server):
+    creds = Credentials(token="token", expiry=datetime.utcnow() + timedelta(hours=1))
+    with CalendarServicePool().service("alice", creds) as service:
+        yield service
+
+
+@pytest.fixture
+def mirror(session_factory):
+    return CalendarMirror(session_factory)
+
+
+def test_first_sync_is_full_then_incremental(fake_server, service, mirror):
+    """Only events changed since the stored sync token are pulled after the first sync."""
+    fake_server.put_event(_event("e1", 2))
+    fake_server.put_event(_event("e2", 3))
+
+    assert mirror.sync("alice", service) == (2, None)
+
+    fake_server.put_event(_event("e2", 4, summary="Moved"))
+    fake_server.put_event(_event("e3", 5))
+    fake_server.delete_event("e1")
+
+    changed, error = mirror.sync("alice", service)
+    assert error is None
+    assert changed == 3  # e2 moved, e3 added, e1 cancelled
+
+    events = mirror.query("alice", *WINDOW)
+    assert [(event.id, event.summary) for event in events] == [("e2", "Moved"), ("e3", "Meeting")]
+
+
+def test_unchanged_calendar_pulls_nothing(fake_server, service, mirror):
+    """A sync with nothing new transfers no events."""
+    fake_server.put_event(_event("e1", 2))
+    mirror.sync("alice", service)
+
+    assert mirror.sync("alice", service) == (0, None)
+    assert [event.id for event in mirror.query("alice", *WINDOW)] == ["e1"]
+
+
+def test_expired_sync_token_triggers_full_resync(fake_server, service, mirror, session_factory):
+    """A 410 for the stored token wipes the mirror and re-lists the whole calendar."""
+    fake_server.put_event(_event("e1", 2))
+    fake_server.put_event(_event("e2", 3))
+    mirror.sync("alice", service)
+
+    # Google forgets the token, and e2 disappears without a tombstone reaching us
+    session = session_factory()
+    session.get(CalendarSyncState, ("alice", "primary")).sync_token = "expired"
+    session.commit()
+    session.close()
+    del fake_server.calendars["primary"]["e2"]
+
+    changed, error = mirror.sync("alice", service)
+    assert error is None
+    assert changed == 1
+    assert [event.id for event in mirror.query("alice", *WINDOW)] == ["e1"]
+
+    session = session_factory()
+    assert session.get(CalendarSyncState, ("alice", "primary")).sync_token.isdigit()
+    session.close()
+
+
+def test_sync_errors_are_reported_not_raised(fake_server, service, mirror):
+    """API failures come back as an error message and leave the mirror untouched."""
+    fake_server.inject_errors(1, status=403, reason="forbidden")
+
+    changed, error = mirror.sync("alice", service)
+    assert changed == 0
+    assert "403" in error
+    assert mirror.query("alice", *WINDOW) == []
+
+
+def test_concurrent_syncs_of_one_user_are_serialized(fake_server, mirror):
+    """Overlapping syncs of the same user all succeed and agree on the result."""
+    for day in range(1, 8):
+        fake_server.put_event(_event(f"e{day}", day))
+    creds = Credentials(token="token", expiry=datetime.utcnow() + timedelta(hours=1))
+    pool = CalendarServicePool()
+
+    def sync():
+        with pool.service("alice", creds) as service:
+            return mirror.sync("alice", service)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda _: sync(), range(4)))
+
+    assert all(error is None for _, error in results)
+    # The first sync is full, the others find nothing new
+    assert sorted(changed for changed, _ in results) == [0, 0, 0, 7]
+    assert len(mirror.query("alice", *WINDOW)) == 7
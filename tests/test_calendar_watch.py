@@ -0,0 +1,124 @@
+"""Tests for push notifications reaching another process's cached schedules."""
+
+from datetime import datetime, timedelta
+import threading
+
+from flask import Flask, request
+from google.oauth2.credentials import Credentials
+import pytest
+from werkzeug.serving import make_server
+
+from calendar_api import CalendarServicePool
+from calendar_changes import CalendarChangeFeed
+from calendar_watch import WatchManager
+from credential_store import CredentialStore
+from event_cache import EventCache
+from models import WatchChannel
+from multi_user_calendar_service import MultiUserCalendarService
+
+WINDOW = (datetime(2026, 3, 2), datetime(2026, 3, 3))
+
+
+def _event(event_id, hour, summary="Meeting"):
+    return {
+        "id": event_id,
+        "summary": summary,
+        "start": {"dateTime": f"2026-03-02T{hour:02d}:00:00Z"},
+        "end": {"dateTime": f"2026-03-02T{hour + 1:02d}:00:00Z"},
+    }
+
+
+@pytest.fixture
+def store(session_factory, fake_server):
+    store = CredentialStore("client", "secret", session_factory, token_uri=fake_server.token_uri)
+    store.save("alice", Credentials(token="token", refresh_token="refresh",
+                                    expiry=datetime.utcnow() + timedelta(hours=1)))
+    return store
+
+
+@pytest.fixture
+def watch_manager(store, session_factory):
+    """WatchManager of a web worker, with its webhook served on a local port."""
+    manager = WatchManager(store, address=None, session_factory=session_factory, event_cache=EventCache(),
+                           service_pool=CalendarServicePool(), change_feed=CalendarChangeFeed(session_factory))
+    app = Flask(__name__)
+
+    @app.route("/notifications", methods=["POST"])
+    def notifications():
+        status, message = manager.handle_notification(request.headers)
+        return message, status
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    manager.address = f"http://127.0.0.1:{server.port}/notifications"
+    yield manager
+    server.shutdown()
+
+
+@pytest.fixture
+def agent_feed(session_factory):
+    feed = CalendarChangeFeed(session_factory)
+    feed.poll_once()
+    return feed
+
+
+@pytest.fixture
+def agent(store, watch_manager, agent_feed):
+    """The agent's service, in effect another process: it only shares the database."""
+    return MultiUserCalendarService(credential_store=store, event_cache=EventCache(),
+                                    service_pool=CalendarServicePool(), watch_manager=watch_manager,
+                                    change_feed=agent_feed)
+
+
+def test_notification_refetches_cached_schedule(fake_server, watch_manager, agent, agent_feed):
+    """A signed notification to the web worker makes the agent refetch the changed calendar."""
+    fake_server.put_event(_event("e1", 9))
+    _, error = watch_manager.watch("alice")
+    assert error is None
+
+    events, _ = agent.get_user_calendar_events("alice", *WINDOW)
+    assert [event.id for event in events] == ["e1"]
+    requests_before = fake_server.request_count
+    agent.get_user_calendar_events("alice", *WINDOW)
+    assert fake_server.request_count == requests_before
+
+    # put_event() posts the channel's notification to the webhook
+    fake_server.put_event(_event("e2", 11))
+    assert watch_manager.notifications == 1
+    assert agent_feed.poll_once() == 1
+
+    events, _ = agent.get_user_calendar_events("alice", *WINDOW)
+    assert [event.id for event in events] == ["e1", "e2"]
+    assert fake_server.request_count == requests_before + 1
+
+
+def test_notification_with_wrong_token_is_rejected(fake_server, watch_manager, agent_feed, session_factory):
+    """A forged (even non-ASCII) channel token is refused without invalidating anything."""
+    channel_id, _ = watch_manager.watch("alice")
+    session = session_factory()
+    resource_id = session.get(WatchChannel, channel_id).resource_id
+    session.close()
+
+    for token in ("forged", "förged"):
+        status, _ = watch_manager.handle_notification({
+            "X-Goog-Channel-ID": channel_id,
+            "X-Goog-Channel-Token": token,
+            "X-Goog-Resource-ID": resource_id,
+            "X-Goog-Resource-State": "exists",
+        })
+        assert status == 403
+    assert agent_feed.poll_once() == 0
+
+
+def test_revoke_stops_watch_channels(fake_server, store, agent, watch_manager, session_factory):
+    """Revoking a user's access stops their channels with Google and forgets them."""
+    watch_manager.watch("alice")
+    assert len(fake_server.channels) == 1
+
+    success, _ = agent.revoke_user_access("alice")
+
+    assert success
+    assert fake_server.channels == {}
+    session = session_factory()
+    assert session.query(WatchChannel).count() == 0
+    session.close()
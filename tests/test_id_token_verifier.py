@@ -0,0 +1,113 @@
+"""Tests for local ID-token verification against the fake server's signing keys."""
+
+import uuid
+
+from cryptography.hazmat.primitives.asymmetric import rsa
+import pytest
+
+from id_token_verifier import IDTokenVerifier, JWKSCache
+
+CLIENT_ID = "client.apps.googleusercontent.com"
+
+
+class _Clock:
+    """Monotonic clock the tests move by hand."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _rotate(server):
+    server.signing_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    server.signing_key_id = uuid.uuid4().hex
+
+
+@pytest.fixture
+def clock():
+    return _Clock()
+
+
+@pytest.fixture
+def jwks(fake_server, clock):
+    return JWKSCache(fetch=lambda url: (fake_server.jwks(), 3600), clock=clock)
+
+
+@pytest.fixture
+def verifier(jwks):
+    return IDTokenVerifier(CLIENT_ID, jwks=jwks)
+
+
+def test_valid_token_yields_email(fake_server, verifier):
+    """A token signed by a published key for this client gives its verified email."""
+    email, error = verifier.verify_email(fake_server.id_token("alice@example.com", CLIENT_ID))
+
+    assert error is None
+    assert email == "alice@example.com"
+
+
+def test_bad_signature_is_rejected(fake_server, verifier):
+    """A token signed by another key under a published key id is refused."""
+    verifier.jwks.refresh()
+    kid = fake_server.signing_key_id
+    _rotate(fake_server)
+    fake_server.signing_key_id = kid
+
+    email, error = verifier.verify_email(fake_server.id_token("alice@example.com", CLIENT_ID))
+
+    assert email is None
+    assert error.startswith("Invalid ID token")
+
+
+def test_wrong_audience_is_rejected(fake_server, verifier):
+    """A token issued to another OAuth client is refused."""
+    email, error = verifier.verify_email(fake_server.id_token("alice@example.com", "other-client"))
+
+    assert email is None
+    assert error.startswith("Invalid ID token")
+
+
+def test_wrong_issuer_is_rejected(fake_server, verifier):
+    """A correctly signed token from an issuer other than Google is refused."""
+    token = fake_server.id_token("alice@example.com", CLIENT_ID, iss="https://issuer.example.com")
+
+    email, error = verifier.verify_email(token)
+
+    assert email is None
+    assert "unexpected issuer" in error
+
+
+def test_expired_token_is_rejected(fake_server, verifier):
+    """A token past its expiry, beyond the allowed clock skew, is refused."""
+    token = fake_server.id_token("alice@example.com", CLIENT_ID, lifetime=-2 * verifier.clock_skew)
+
+    email, error = verifier.verify_email(token)
+
+    assert email is None
+    assert error.startswith("Invalid ID token")
+
+
+def test_key_rotation_refetches_once(fake_server, verifier, jwks, clock):
+    """An unknown key id refetches the keys, but at most once per refresh interval."""
+    assert verifier.verify_email(fake_server.id_token("alice@example.com", CLIENT_ID))[1] is None
+    assert jwks.refreshes == 1
+
+    _rotate(fake_server)
+    clock.now += jwks.min_refresh_interval
+    email, error = verifier.verify_email(fake_server.id_token("alice@example.com", CLIENT_ID))
+    assert error is None
+    assert email == "alice@example.com"
+    assert jwks.refreshes == 2
+
+    # Another new key id within the interval is not fetched, so forged kids cannot flood Google
+    _rotate(fake_server)
+    token = fake_server.id_token("alice@example.com", CLIENT_ID)
+    _, error = verifier.verify_email(token)
+    assert "unknown key" in error
+    assert jwks.refreshes == 2
+
+    clock.now += jwks.min_refresh_interval
+    assert verifier.verify_email(token)[1] is None
+    assert jwks.refreshes == 3
@@ -0,0 +1,86 @@
+"""
+Local recurrence expansion checked against recorded singleEvents=True listings.
+
+Each fixture in fixtures/recurrence holds a singleEvents=False listing
+('items', as RecurrenceExpander requests it) and the instances the API
+returns for the same window with singleEvents=True ('singleEvents').
+"""
+
+from datetime import datetime
+import json
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from compact_event import CompactEvent
+from recurrence import RecurrenceExpander, expand_events
+
+FIXTURES = sorted((Path(__file__).parent / "fixtures" / "recurrence").glob("*.json"))
+
+
+def _load(path):
+    fixture = json.loads(path.read_text())
+    window = tuple(datetime.fromisoformat(fixture[key].replace("Z", "")) for key in ("timeMin", "timeMax"))
+    return fixture, window, ZoneInfo(fixture["timeZone"])
+
+
+def _instances(events, tz):
+    """Reduce events to comparable (id, start, end, summary), resolving all-day dates in tz."""
+    return sorted((event.id, *event.interval(tz), event.summary) for event in events)
+
+
+class _ListingService:
+    """Stands in for a Calendar service that returns one recorded events().list page."""
+
+    def __init__(self, fixture):
+        self.fixture = fixture
+        self.requests = []
+
+    def events(self):
+        return self
+
+    def list(self, **params):
+        self.requests.append(params)
+        return self
+
+    def execute(self):
+        return {"timeZone": self.fixture["timeZone"], "items": self.fixture["items"]}
+
+
+@pytest.mark.parametrize("path", FIXTURES, ids=lambda path: path.stem)
+def test_expansion_matches_single_events(path):
+    """Expanding the masters gives the server's instances: ids, times and exceptions."""
+    fixture, (start, end), tz = _load(path)
+    expected = [CompactEvent.from_api(item) for item in fixture["singleEvents"]]
+
+    assert _instances(expand_events(fixture["items"], start, end, tz), tz) == _instances(expected, tz)
+
+
+@pytest.mark.parametrize("path", FIXTURES, ids=lambda path: path.stem)
+def test_expander_uses_listing_time_zone(path):
+    """RecurrenceExpander resolves all-day instances in the zone the listing reports."""
+    fixture, (start, end), tz = _load(path)
+    expected = [CompactEvent.from_api(item) for item in fixture["singleEvents"]]
+    service = _ListingService(fixture)
+    expander = RecurrenceExpander()
+
+    first = expander.get_events("alice", service, start, end)
+    cached = expander.get_events("alice", service, start, end)
+
+    assert _instances(first, tz) == _instances(cached, tz) == _instances(expected, tz)
+    assert len(service.requests) == 1
+    assert "timeZone" in service.requests[0]["fields"]
+
+
+def test_expander_keeps_at_most_max_calendars():
+    """Masters of the least recently used calendar are evicted once max_calendars is reached."""
+    fixture, (start, end), _ = _load(FIXTURES[0])
+    service = _ListingService(fixture)
+    expander = RecurrenceExpander(max_calendars=2)
+
+    for user_id in ("alice", "bob", "alice", "carol", "alice", "bob"):
+        expander.get_events(user_id, service, start, end)
+
+    # alice stays cached as the most recently used; bob is refetched after carol evicted him
+    assert len(service.requests) == 4
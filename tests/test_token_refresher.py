@@ -0,0 +1,62 @@
+"""Tests for the background token refresher against the fake OAuth token endpoint."""
+
+from datetime import datetime, timedelta
+
+from google.oauth2.credentials import Credentials
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from credential_store import CredentialStore
+from db import TokenWriteQueue
+from models import UserToken
+from token_refresher import TokenRefresher
+
+
+class _FlakySessions:
+    """Session factory that fails every session while `broken` is set, like a locked database."""
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self.broken = True
+
+    def __call__(self):
+        if self.broken:
+            raise OperationalError("UPDATE user_tokens", {}, Exception("database is locked"))
+        return self.session_factory()
+
+
+@pytest.fixture
+def store(session_factory, fake_server):
+    fake_server.refresh_tokens["refresh-alice"] = "alice@example.com"
+    store = CredentialStore("client", "secret", session_factory, token_uri=fake_server.token_uri)
+    store.save("alice", Credentials(token="old", refresh_token="refresh-alice",
+                                    expiry=datetime.utcnow() + timedelta(minutes=1)))
+    return store
+
+
+def _access_token(session_factory):
+    session = session_factory()
+    try:
+        return session.get(UserToken, "alice").access_token
+    finally:
+        session.close()
+
+
+def test_failed_write_keeps_refreshed_token(fake_server, store, session_factory):
+    """A database error during the write keeps the new token queued instead of losing it."""
+    sessions = _FlakySessions(session_factory)
+    refresher = TokenRefresher("client", "secret", session_factory, token_uri=fake_server.token_uri,
+                               write_queue=TokenWriteQueue(sessions))
+
+    assert refresher.run_once()["refreshed"] == 1
+    requests_after_refresh = fake_server.request_count
+    assert _access_token(session_factory) == "old"
+
+    # Still unwritten: the queued token is kept, not refreshed a second time
+    assert refresher.run_once()["refreshed"] == 0
+    assert fake_server.request_count == requests_after_refresh
+
+    sessions.broken = False
+    assert refresher.run_once()["refreshed"] == 0
+    assert _access_token(session_factory) not in ("old", None)
+    assert fake_server.request_count == requests_after_refresh
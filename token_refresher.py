@@ -0,0 +1,248 @@
+"""
+Background OAuth token refresher for ScheduleAI.
+Refreshes stored UserToken rows shortly before they expire so request paths
+find a valid access token instead of paying for an inline refresh. New
+tokens are written through a TokenWriteQueue, so a failed write is retried
+rather than losing them (Google's rotated refresh tokens are single-use).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import json
+import random
+import threading
+from google.auth import exceptions as auth_exceptions
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from sqlalchemy import update
+from db import DBSession, TokenWriteQueue, session_scope
+from metrics import DB_QUERY_SECONDS, TOKEN_REFRESH_SECONDS, timed
+from models import UserToken
+
+TOKEN_URI = "https://oauth2.googleapis.com/token"
+
+
+class TokenRefresher:
+    """Periodically refreshes access tokens that expire within a horizon."""
+
+    def __init__(self, client_id, client_secret, session_factory=DBSession,
+                 horizon=timedelta(minutes=10), interval=60, jitter=0.2,
+                 max_workers=8, batch_size=100, token_uri=TOKEN_URI,
+                 retry_after=timedelta(minutes=5), max_retry_after=timedelta(hours=6), write_queue=None):
+        """
+        Initialize the refresher.
+
+        Args:
+            client_id (str): OAuth client id the tokens were issued to
+            client_secret (str): OAuth client secret
+            session_factory (callable, optional): SQLAlchemy session factory. Defaults to db.DBSession.
+            horizon (timedelta, optional): Refresh tokens expiring within this window
+            interval (float, optional): Seconds between scans
+            jitter (float, optional): Fraction of the interval to randomize each sleep by,
+                so replicas do not scan in lockstep
+            max_workers (int, optional): Concurrent refresh calls
+            batch_size (int, optional): Refreshed tokens written per commit
+            token_uri (str, optional): OAuth token endpoint
+            retry_after (timedelta, optional): Wait before retrying a failed refresh,
+                doubled on each further failure
+            max_retry_after (timedelta, optional): Longest wait between retries
+            write_queue (TokenWriteQueue, optional): Queue to write refreshed tokens through,
+                e.g. the one the app's CredentialStore uses. Defaults to a private queue
+                flushed every batch_size tokens.
+        """
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.session_factory = session_factory
+        self.horizon = horizon
+        self.interval = interval
+        self.jitter = jitter
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.token_uri = token_uri
+        self.retry_after = retry_after
+        self.max_retry_after = max_retry_after
+        self.write_queue = write_queue if write_queue is not None else \
+            TokenWriteQueue(session_factory, max_batch=batch_size)
+        self._failures = {}  # user_id -> (consecutive failures, naive UTC time of the next attempt)
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_client_secrets_file(cls, path, **kwargs):
+        """
+        Create a refresher from a Google client secrets file.
+
+        Args:
+            path (str): Path to credentials.json ('web' or 'installed' client)
+            **kwargs: Passed to the constructor
+
+        Returns:
+            TokenRefresher: New refresher
+        """
+        with open(path, "r") as f:
+            secrets = json.load(f)
+        client = secrets.get("web") or secrets.get("installed")
+        return cls(client["client_id"], client["client_secret"], **kwargs)
+
+    def due_tokens(self, now=None):
+        """
+        Get refreshable tokens that expire within the horizon, soonest first.
+
+        Rows without a refresh token (never granted, or revoked) and rows
+        backing off after a failed refresh are skipped.
+
+        Args:
+            now (datetime, optional): Current naive UTC time. Defaults to utcnow().
+
+        Returns:
+            list: (user_id, refresh_token, scopes) tuples
+        """
+        now = now or datetime.utcnow()
+        session = self.session_factory()
+        try:
+            with timed(DB_QUERY_SECONDS, 'token_scan', operation='token_scan'):
+                rows = (
+                    session.query(UserToken.user_id, UserToken.refresh_token, UserToken.scopes)
+                    .filter(UserToken.token_expiry <= now + self.horizon)
+                    .filter(UserToken.refresh_token.isnot(None), UserToken.refresh_token != '')
+                    .order_by(UserToken.token_expiry)
+                    .all()
+                )
+        finally:
+            session.close()
+        return [row for row in rows if self._failures.get(row.user_id, (0, now))[1] <= now]
+
+    def _record_failure(self, user_id, now):
+        """Back off a user's refreshes exponentially after a failure."""
+        failures = self._failures.get(user_id, (0, now))[0] + 1
+        delay = min(self.retry_after * 2 ** (failures - 1), self.max_retry_after)
+        self._failures[user_id] = (failures, now + delay)
+
+    def _mark_revoked(self, user_id, refresh_token):
+        """
+        Clear a refresh token Google rejected with invalid_grant, so scans skip
+        the row until the user logs in again.
+        """
+        with timed(DB_QUERY_SECONDS, 'token_revoke', operation='token_revoke'), \
+                session_scope(self.session_factory) as session:
+            # Only if unchanged: a new login may have stored a fresh token meanwhile
+            session.execute(
+                update(UserToken)
+                .where(UserToken.user_id == user_id, UserToken.refresh_token == refresh_token)
+                .values(refresh_token='')
+            )
+
+    def _refresh_one(self, user_id, refresh_token, scopes):
+        """
+        Refresh a single token.
+
+        Returns:
+            tuple: (user_id, values_to_store, error_message, revoked)
+        """
+        creds = Credentials(
+            token=None,
+            refresh_token=refresh_token,
+            token_uri=self.token_uri,
+            client_id=self.client_id,
+            client_secret=self.client_secret,
+            scopes=scopes.split(",") if scopes else None,
+        )
+        try:
+            with timed(TOKEN_REFRESH_SECONDS, 'token_refresh', source='background'):
+                creds.refresh(Request())
+        except Exception as e:
+            # invalid_grant: the refresh token was revoked or has expired, so retrying cannot help
+            revoked = isinstance(e, auth_exceptions.RefreshError) and 'invalid_grant' in str(e)
+            return user_id, None, f"Failed to refresh token for {user_id}: {str(e)}", revoked
+
+        values = {"user_id": user_id, "access_token": creds.token, "token_expiry": creds.expiry}
+        # Google may rotate the refresh token
+        if creds.refresh_token and creds.refresh_token != refresh_token:
+            values["refresh_token"] = creds.refresh_token
+        return user_id, values, None, False
+
+    def run_once(self, now=None):
+        """
+        Refresh every due token once. Writes that fail stay queued and are
+        retried on the next flush, so a database error loses no tokens.
+
+        Args:
+            now (datetime, optional): Current naive UTC time. Defaults to utcnow().
+
+        Returns:
+            dict: Counts of refreshed, failed and revoked tokens and the failure messages
+        """
+        now = now or datetime.utcnow()
+        # Rows left over from a failed write go first, so the scan sees any rotated refresh tokens;
+        # users whose write still fails already hold a fresh token in the queue
+        self.write_queue.flush()
+        queued = self.write_queue.pending_user_ids()
+        due = [row for row in self.due_tokens(now) if row.user_id not in queued]
+        refresh_tokens = {row.user_id: row.refresh_token for row in due}
+        refreshed = 0
+        revoked = 0
+        errors = []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for user_id, values, error, is_revoked in executor.map(lambda row: self._refresh_one(*row), due):
+                if error:
+                    errors.append(error)
+                    if is_revoked:
+                        try:
+                            self._mark_revoked(user_id, refresh_tokens[user_id])
+                        except Exception as e:
+                            # Still refreshable in the database, so the next scan tries again
+                            print(f"[REFRESHER] failed to clear revoked token for {user_id}: {e}")
+                        self._failures.pop(user_id, None)
+                        revoked += 1
+                    else:
+                        self._record_failure(user_id, now)
+                    continue
+                self._failures.pop(user_id, None)
+                self.write_queue.put(values)
+                refreshed += 1
+                if refreshed % self.batch_size == 0:
+                    self.write_queue.flush()
+
+        self.write_queue.flush()
+
+        return {"refreshed": refreshed, "failed": len(errors), "revoked": revoked, "errors": errors}
+
+    def _run(self):
+        # Start at a random point in the interval so replicas spread their scans
+        if self._stop.wait(random.uniform(0, self.interval * self.jitter)):
+            return
+        while not self._stop.is_set():
+            try:
+                result = self.run_once()
+                if result["refreshed"] or result["failed"]:
+                    print(f"[REFRESHER] refreshed={result['refreshed']} failed={result['failed']} "
+                          f"revoked={result['revoked']}")
+            except Exception as e:
+                print(f"[REFRESHER] scan failed: {e}")
+            delay = self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+            self._stop.wait(delay)
+
+    def start(self):
+        """
+        Run the refresher on a daemon thread.
+
+        Returns:
+            TokenRefresher: self
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="token-refresher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """
+        Stop the background thread.
+
+        Args:
+            timeout (float, optional): Seconds to wait for it to exit
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)